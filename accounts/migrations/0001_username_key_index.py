@@ -0,0 +1,24 @@
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+# Sign-in looks accounts up by LOWER(username), see accounts.views.find_user
+USERNAME_KEY_INDEX = models.Index(Lower('username'), name='auth_user_username_key_idx')
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('auth', 'User'), USERNAME_KEY_INDEX)
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('auth', 'User'), USERNAME_KEY_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
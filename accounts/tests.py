@@ -1,3 +1,41 @@
+from datetime import date
+
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Department, Designation, Staff
+
+
+class SignInTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(
+            first_name='Wanjiru', last_name='Test', email='wanjiru@example.com', phone='0700000000',
+            gender='F', date_of_birth=date(1990, 1, 1), national_id='12345678', address='Nairobi',
+            department=Department.objects.create(name='Pharmacy', code='PHA'),
+            designation=Designation.objects.create(name='Pharmacist'),
+            employment_date=date(2024, 1, 1), employment_category='CASUAL',
+        )
+
+    def sign_in(self, password):
+        return self.client.post(reverse('accounts:signin'), {'staff_id': 'mlkh123456782024', 'password': password})
+
+    def test_default_password_forces_change_until_changed(self):
+        self.assertIs(self.staff.default_password, True)
+        self.assertRedirects(self.sign_in('12345678'), reverse('accounts:change_password'), fetch_redirect_response=False)
+
+        self.client.post(reverse('accounts:change_password'), {'new_password': 'a-new-secret', 'confirm_password': 'a-new-secret'})
+        self.staff.refresh_from_db()
+        self.assertIs(self.staff.default_password, False)
+        self.assertRedirects(self.sign_in('a-new-secret'), reverse('core:casuals'), fetch_redirect_response=False)
+
+    def test_unknown_flag_is_checked_once(self):
+        Staff.objects.filter(pk=self.staff.pk).update(default_password=None)
+        self.sign_in('12345678')
+        self.staff.refresh_from_db()
+        self.assertIs(self.staff.default_password, True)
 
-# Create your tests here.
+    def test_wrong_password(self):
+        response = self.sign_in('nope')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
@@ -3,6 +3,7 @@ from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib.auth import authenticate, login, logout
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.db.models.functions import Lower
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from core.models import Staff
@@ -10,8 +11,10 @@ import re
 from django.views.decorators.csrf import csrf_protect
 from django.contrib.auth.decorators import login_required
 
-def is_admin(user):
-    return user.groups.filter(name='Admin').exists()
+
+def find_user(staff_id):
+    """Case-insensitive username lookup through the LOWER(username) index"""
+    return User.objects.annotate(username_key=Lower('username')).get(username_key=staff_id.strip().lower())
 
 
 @csrf_protect
@@ -31,7 +34,7 @@ def signin(request):
             request.session.set_expiry(1200)  # 20 minutes
 
         try:
-            user = User.objects.get(username__iexact=staff_id)
+            user = find_user(staff_id)
             user = authenticate(request, username=user.username, password=password)
         except User.DoesNotExist:
             user = None
@@ -41,8 +44,13 @@ def signin(request):
                 staff = Staff.objects.get(user=user)
                 login(request, user)
 
+                # Only accounts provisioned before the flag existed pay for a second hash, once
+                if staff.default_password is None:
+                    staff.default_password = user.check_password(staff.national_id)
+                    Staff.objects.filter(pk=staff.pk).update(default_password=staff.default_password)
+
                 # Force password change if still defaulting to national_id
-                if user.check_password(staff.national_id):
+                if staff.default_password:
                     change_password_url = reverse('accounts:change_password')
                     if next_url:
                         change_password_url += f'?next={next_url}'
@@ -105,7 +113,7 @@ def signup(request):
             messages.error(request, 'You must agree to the Terms and Conditions')
             return render(request, 'sign-up.html')
 
-        if User.objects.filter(username__iexact=staff_id).exists():
+        if User.objects.annotate(username_key=Lower('username')).filter(username_key=staff_id).exists():
             messages.error(request, 'Staff ID already exists')
             return render(request, 'sign-up.html')
 
@@ -152,6 +160,7 @@ def change_password(request):
             user = request.user
             user.set_password(new_password)
             user.save()
+            Staff.objects.filter(user=user).update(default_password=False)
             messages.success(request, 'Password updated successfully! Please log in again.')
             logout(request)
             return redirect('accounts:signin')
@@ -1,6 +1,13 @@
-from django.contrib import admin
+from django import forms
+from django.core.exceptions import PermissionDenied
+from django.contrib import admin, messages
+from django.template.response import TemplateResponse
+from django.urls import path
 from .models import Department, Staff, Contract, ContractRenewal, Designation
+from .counters import CONTRACT_COUNTER, update_counted
+from .imports import ImportFileError, import_staff
 from django.utils.html import format_html
+from django.utils import timezone
 
 
 @admin.register(Department)
@@ -24,8 +31,14 @@ class DesignationAdmin(admin.ModelAdmin):
         return obj.staff_designation.count()
     staff_count.short_description = 'Staff Count'
     
+class StaffImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX with a header row; department by code or name, designation by name")
+    dry_run = forms.BooleanField(required=False, help_text="Only validate the file")
+
+
 # Add a custom method for full_name
 class StaffAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/core/staff/change_list.html'
     list_display = [
         'unique_id', 'full_name', 'department', 'designation', 
         'employment_category', 'employment_status', 'employment_date', 
@@ -84,6 +97,35 @@ class StaffAdmin(admin.ModelAdmin):
         return 0
     years_of_service.short_description = 'Years of Service'
 
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='core_staff_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Upload a staff file, hashed in this process; large files go through the import_staff command"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        report = None
+        form = StaffImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = import_staff(upload.file, upload.name, workers=0, dry_run=form.cleaned_data['dry_run'])
+            except ImportFileError as e:
+                form.add_error('file', str(e))
+            else:
+                level = messages.WARNING if report.errors else messages.SUCCESS
+                self.message_user(request, f"{'Dry run: ' if form.cleaned_data['dry_run'] else ''}{report}", level)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import staff',
+            'form': form,
+            'report': report,
+        }
+        return TemplateResponse(request, 'admin/core/staff/import.html', context)
+
 admin.site.register(Staff, StaffAdmin)
 
 
@@ -138,7 +180,7 @@ class ContractAdmin(admin.ModelAdmin):
     send_renewal_reminders.short_description = "Send renewal reminders"
     
     def mark_as_renewed(self, request, queryset):
-        updated = queryset.update(status='RENEWED')
+        updated = update_counted(CONTRACT_COUNTER, queryset, status='RENEWED', updated_at=timezone.now())
         self.message_user(request, f"{updated} contracts marked as renewed")
     mark_as_renewed.short_description = "Mark selected as renewed"
 
@@ -0,0 +1,145 @@
+"""
+Streaming staff export for the v2 staff API.
+
+Rows are read with .values().iterator() and encoded one at a time as
+NDJSON lines or pieces of a JSON array, so a response never holds more
+than one iterator chunk of staff in memory. Pages are keyset-paginated on
+unique_id with the same cursors as the dashboards (core.pagination).
+"""
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .pagination import encode_cursor, decode_cursor, seek_filter, STAFF_ORDERING
+
+# API field -> ORM path; 'name' is derived from the name parts
+STAFF_API_FIELDS = {
+    'id': 'unique_id',
+    'first_name': 'first_name',
+    'middle_name': 'middle_name',
+    'last_name': 'last_name',
+    'email': 'email',
+    'phone': 'phone',
+    'gender': 'gender',
+    'department': 'department__name',
+    'department_id': 'department_id',
+    'designation': 'designation__name',
+    'category': 'employment_category',
+    'status': 'employment_status',
+    'employment_date': 'employment_date',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+NAME_PARTS = ('first_name', 'middle_name', 'last_name')
+DEFAULT_FIELDS = ('id', 'name', 'department', 'designation', 'status', 'employment_date')
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+ITERATOR_CHUNK_SIZE = 2000
+STREAM_CHUNK_SIZE = 64 * 1024  # bytes of encoded rows per write
+
+
+class StaffApiError(ValueError):
+    pass
+
+
+def parse_fields(value):
+    if not value:
+        return list(DEFAULT_FIELDS)
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f != 'name' and f not in STAFF_API_FIELDS]
+    if unknown:
+        raise StaffApiError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_updated_since(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise StaffApiError("updated_since must be an ISO date or datetime")
+        moment = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_limit(value):
+    try:
+        limit = int(value) if value else DEFAULT_LIMIT
+    except ValueError:
+        raise StaffApiError("limit must be an integer")
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def filter_staff(queryset, params):
+    """Apply the department/status/category/updated_since/after filters from the query string"""
+    if params.get('department'):
+        queryset = queryset.filter(department_id=params['department'])
+    if params.get('status'):
+        queryset = queryset.filter(employment_status=params['status'])
+    if params.get('category'):
+        queryset = queryset.filter(employment_category=params['category'])
+    if params.get('updated_since'):
+        queryset = queryset.filter(updated_at__gte=parse_updated_since(params['updated_since']))
+    if params.get('after'):
+        try:
+            values = decode_cursor(params['after'], len(STAFF_ORDERING))
+        except ValueError as e:
+            raise StaffApiError(f"Invalid cursor: {e}")
+        queryset = queryset.filter(seek_filter(STAFF_ORDERING, values))
+    return queryset.order_by(*STAFF_ORDERING)
+
+
+def next_cursor(queryset, limit):
+    """Cursor for the page after this one, or None; a short index-only probe"""
+    boundary = list(queryset.values_list('unique_id', flat=True)[limit - 1:limit + 1])
+    return encode_cursor([boundary[0]]) if len(boundary) == 2 else None
+
+
+def staff_rows(queryset, fields, limit):
+    paths = {STAFF_API_FIELDS[f] for f in fields if f != 'name'}
+    if 'name' in fields:
+        paths.update(NAME_PARTS)
+    for row in queryset.values(*paths)[:limit].iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        record = {}
+        for field in fields:
+            if field == 'name':
+                record['name'] = ' '.join(row[part] for part in NAME_PARTS if row[part])
+            else:
+                record[field] = row[STAFF_API_FIELDS[field]]
+        yield record
+
+
+def encode(record):
+    return json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+def buffered(pieces, size=STREAM_CHUNK_SIZE):
+    """Join small string pieces into writes of roughly size characters"""
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_ndjson(rows):
+    return buffered(encode(record) + '\n' for record in rows)
+
+
+def stream_json(rows, cursor):
+    """A {"results": [...], "next": cursor} document"""
+    def pieces():
+        yield '{"results":['
+        for i, record in enumerate(rows):
+            yield (',' if i else '') + encode(record)
+        yield '],"next":' + json.dumps(cursor) + '}'
+    return buffered(pieces())
@@ -0,0 +1,93 @@
+"""
+Versioned cache entries for reference data read on every page.
+
+Entries are keyed on a version token per model. A token that is not
+cached yet is the model's watermark, its latest updated_at plus its row
+count, so saves, bulk_create, deletes and QuerySet.update() calls that
+stamp updated_at all move it. The tokens are cached for VERSION_TIMEOUT;
+the receivers in core.signals, and bulk writers that bypass them, call
+refresh_version(), which replaces the token once the transaction commits. Entries under an old token are never looked up again
+and expire on their own.
+
+With a per-process cache (locmem) a refresh only reaches the process that
+made the change; the others pick the new watermark up when their token
+expires.
+"""
+import uuid
+from functools import partial
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import Department, Designation, Staff
+from .stats import with_staff_counts
+
+VERSION_KEY = 'core:cache_version:{}'
+VERSION_TIMEOUT = 60
+CACHE_TIMEOUT = 3600
+PENDING_ATTR = 'pending_cache_versions'
+
+
+def watermark(model):
+    """Token that changes whenever a row of model is written or deleted"""
+    mark = model.objects.aggregate(latest=Max('updated_at'), rows=Count('pk'))
+    return f"{mark['latest'].timestamp() if mark['latest'] else 0}.{mark['rows']}"
+
+
+def model_versions(*models):
+    keys = {VERSION_KEY.format(model._meta.label_lower): model for model in models}
+    versions = cache.get_many(keys)
+    for key, model in keys.items():
+        if key not in versions:
+            versions[key] = watermark(model)
+            # add, not set: a refresh that committed meanwhile wins
+            cache.add(key, versions[key], VERSION_TIMEOUT)
+    return [versions[key] for key in keys]
+
+
+def versioned(name, models, compute, timeout=CACHE_TIMEOUT):
+    """compute() cached under name until any of models changes"""
+    key = ':'.join(['core', name, *model_versions(*models)])
+    return cache.get_or_set(key, compute, timeout)
+
+
+def flush_versions(using=None):
+    connection = transaction.get_connection(using)
+    labels = connection.__dict__.pop(PENDING_ATTR, None)
+    for label in labels or ():
+        # Two commits can leave the same latest updated_at, so make each refresh unique
+        version = f"{watermark(apps.get_model(label))}.{uuid.uuid4().hex[:8]}"
+        cache.set(VERSION_KEY.format(label), version, VERSION_TIMEOUT)
+
+
+def refresh_version(model, using=None):
+    """Give model a new version token once the current transaction commits (once per model)"""
+    connection = transaction.get_connection(using)
+    connection.__dict__.setdefault(PENDING_ATTR, set()).add(model._meta.label_lower)
+    transaction.on_commit(partial(flush_versions, using), using=using)
+
+
+def department_list():
+    """Every department, in name order"""
+    return versioned('departments', [Department], lambda: list(Department.objects.all()))
+
+
+def departments_with_counts(category=None):
+    """department_list() with staff_count set, for the dashboard filter dropdowns"""
+    return versioned(
+        f"departments:{category or 'all'}:counts", [Department, Staff],
+        lambda: with_staff_counts(department_list(), category),
+    )
+
+
+def department_choices():
+    return [(department.pk, str(department)) for department in department_list()]
+
+
+def designation_choices():
+    return versioned(
+        'designation_choices', [Designation],
+        lambda: [(designation.pk, str(designation)) for designation in Designation.objects.all()],
+    )
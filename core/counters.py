@@ -0,0 +1,238 @@
+"""
+Materialized dashboard counters.
+
+DashboardCounter keeps one row per (scope, category, status, department,
+pay month) bucket with the number of Staff, Contract or Payroll rows in it.
+The post_init/post_save/post_delete receivers in core.signals and
+payroll.signals move a record between buckets as it is created, changed or
+deleted, inside the same transaction as the write, so the dashboards read
+a handful of counter rows instead of counting the tables.
+
+QuerySet.update() and bulk_create() bypass signals, so callers that use
+them adjust the counters themselves (see payroll.runs). The
+reconcile_dashboard_counters command rebuilds every bucket from the source
+tables to fix any drift.
+"""
+from collections import Counter
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import DashboardCounter
+
+
+class CounterSpec:
+    """Which attributes of a model place a row in a dashboard bucket"""
+
+    def __init__(self, scope, model, status, category=None, department=None, pay_month=None):
+        self.scope = scope
+        self.model = model  # app label, resolved lazily to avoid import cycles
+        self.status = status
+        self.category = category
+        self.department = department
+        self.pay_month = pay_month
+
+    @property
+    def fields(self):
+        return [f for f in (self.category, self.status, self.department, self.pay_month) if f]
+
+    def get_model(self, registry=apps):
+        return registry.get_model(self.model)
+
+    def bucket(self, values):
+        """(scope, category, status, department_id, pay_month) for a dict of field values"""
+        return (
+            self.scope,
+            (values[self.category] or '') if self.category else '',
+            values[self.status] or '',
+            values[self.department] if self.department else None,
+            values[self.pay_month] if self.pay_month else None,
+        )
+
+    def loaded_values(self, instance):
+        # Only attributes already on the instance, so deferred fields never cost a query
+        return {f: instance.__dict__[f] for f in self.fields if f in instance.__dict__}
+
+    def bucket_for(self, instance):
+        return self.bucket(self.loaded_values(instance))
+
+    def remember(self, instance):
+        """post_init: note which bucket a freshly loaded instance is in"""
+        values = self.loaded_values(instance)
+        instance._counter_values = values if len(values) == len(self.fields) else None
+
+    def prepare(self, instance):
+        """pre_save: read the stored bucket for instances loaded with deferred fields"""
+        if instance._state.adding or getattr(instance, '_counter_values', None) is not None:
+            return
+        instance._counter_values = self.get_model().objects.filter(pk=instance.pk).values(*self.fields).first()
+
+    def saved(self, instance, created, update_fields=None):
+        """post_save: move the instance to its new bucket"""
+        old = None if created else getattr(instance, '_counter_values', None)
+        loaded = self.loaded_values(instance)
+        if old is None:
+            new = loaded
+        else:
+            # Only the saved fields reached the database
+            new = dict(old)
+            for field, value in loaded.items():
+                if update_fields is None or field in update_fields or field.removesuffix('_id') in update_fields:
+                    new[field] = value
+
+        if old is None or self.bucket(old) != self.bucket(new):
+            if old is not None:
+                adjust_counter(self.bucket(old), -1)
+            adjust_counter(self.bucket(new), 1)
+        instance._counter_values = new
+
+    def deleted(self, instance):
+        """post_delete: take the instance out of its bucket"""
+        values = getattr(instance, '_counter_values', None) or self.loaded_values(instance)
+        if len(values) == len(self.fields):
+            adjust_counter(self.bucket(values), -1)
+
+    def count_buckets(self, registry=apps):
+        rows = self.get_model(registry).objects.values(*self.fields).annotate(n=Count('pk')).order_by()
+        return Counter({self.bucket(row): row['n'] for row in rows})
+
+
+def bucket_key(bucket):
+    scope, category, status, department_id, pay_month = bucket
+    month = pay_month.isoformat() if pay_month else ''
+    return f"{scope}|{category}|{status}|{department_id or ''}|{month}"
+
+
+def adjust_counter(bucket, delta):
+    key = bucket_key(bucket)
+    if DashboardCounter.objects.filter(key=key).update(count=F('count') + delta):
+        return
+    scope, category, status, department_id, pay_month = bucket
+    counter, created = DashboardCounter.objects.get_or_create(key=key, defaults={
+        'scope': scope,
+        'category': category,
+        'status': status,
+        'department_id': department_id,
+        'pay_month': pay_month,
+        'count': delta,
+    })
+    if not created:
+        DashboardCounter.objects.filter(pk=counter.pk).update(count=F('count') + delta)
+
+
+def adjust_counters(buckets, delta=1):
+    """Apply delta once per occurrence of each bucket, e.g. after a bulk_create"""
+    for bucket, n in Counter(buckets).items():
+        adjust_counter(bucket, delta * n)
+
+
+def update_counted(spec, queryset, **changes):
+    """
+    QuerySet.update() that also moves the affected rows between buckets.
+
+    changes are keyed by attname (department_id, not department).
+    """
+    with transaction.atomic():
+        rows = list(queryset.select_for_update().values('pk', *spec.fields))
+        updated = spec.get_model().objects.filter(pk__in=[row['pk'] for row in rows]).update(**changes)
+        adjust_counters((spec.bucket(row) for row in rows), -1)
+        adjust_counters(spec.bucket({**row, **changes}) for row in rows)
+    return updated
+
+
+def move_counted(spec, queryset, **changes):
+    """
+    Set-based update_counted() for sweeps over many rows.
+
+    Counts the rows per bucket with one GROUP BY and changes them with one
+    UPDATE instead of loading them. changes must be plain values. A row
+    changed by another transaction between the two statements can leave a
+    bucket off by one until reconcile_dashboard_counters runs.
+    """
+    with transaction.atomic():
+        rows = list(queryset.values(*spec.fields).annotate(n=Count('pk')).order_by())
+        updated = queryset.update(**changes)
+        deltas = Counter()
+        for row in rows:
+            deltas[spec.bucket(row)] -= row['n']
+            deltas[spec.bucket({**row, **changes})] += row['n']
+        for bucket, delta in deltas.items():
+            if delta:
+                adjust_counter(bucket, delta)
+    return updated
+
+
+def status_counts(scope, category=None, pay_month=None, department=None):
+    """{status: count} for a scope, summed over the remaining dimensions"""
+    counters = DashboardCounter.objects.filter(scope=scope)
+    if category:
+        counters = counters.filter(category=category)
+    if pay_month:
+        counters = counters.filter(pay_month=pay_month)
+    if department:
+        counters = counters.filter(department_id=department)
+    rows = counters.values('status').annotate(n=Sum('count')).order_by()
+    return {row['status']: row['n'] for row in rows}
+
+
+def department_counts(scope, category=None):
+    """{department_id: count} for a scope"""
+    counters = DashboardCounter.objects.filter(scope=scope)
+    if category:
+        counters = counters.filter(category=category)
+    rows = counters.values('department_id').annotate(n=Sum('count')).order_by()
+    return {row['department_id']: row['n'] for row in rows}
+
+
+def rebuild_counters(specs=None, registry=apps):
+    """
+    Recount every bucket from the source tables.
+
+    Returns the number of buckets whose stored count was wrong. registry
+    lets migrations pass their historical app registry.
+    """
+    specs = specs or COUNTER_SPECS
+    counter_model = registry.get_model('core', 'DashboardCounter')
+    expected = Counter()
+    for spec in specs:
+        expected.update(spec.count_buckets(registry))
+
+    scopes = [spec.scope for spec in specs]
+    with transaction.atomic():
+        stored = {
+            c.key: c for c in counter_model.objects.select_for_update().filter(scope__in=scopes)
+        }
+        wanted = {bucket_key(bucket): (bucket, n) for bucket, n in expected.items() if n}
+        drifted = 0
+
+        stale = [c.pk for key, c in stored.items() if key not in wanted and c.count]
+        drifted += len(stale)
+        counter_model.objects.filter(scope__in=scopes).exclude(key__in=list(wanted)).delete()
+
+        missing = []
+        for key, (bucket, n) in wanted.items():
+            counter = stored.get(key)
+            if counter is None:
+                scope, category, status, department_id, pay_month = bucket
+                missing.append(counter_model(
+                    key=key, scope=scope, category=category, status=status,
+                    department_id=department_id, pay_month=pay_month, count=n,
+                ))
+            elif counter.count != n:
+                counter_model.objects.filter(pk=counter.pk).update(count=n)
+                drifted += 1
+        counter_model.objects.bulk_create(missing)
+        drifted += len(missing)
+    return drifted
+
+
+STAFF_COUNTER = CounterSpec(
+    'staff', 'core.Staff', status='employment_status', category='employment_category', department='department_id'
+)
+CONTRACT_COUNTER = CounterSpec(
+    'contract', 'core.Contract', status='status', category='contract_type', department='department_id'
+)
+PAYROLL_COUNTER = CounterSpec('payroll', 'payroll.Payroll', status='status', pay_month='pay_month')
+
+COUNTER_SPECS = [STAFF_COUNTER, CONTRACT_COUNTER, PAYROLL_COUNTER]
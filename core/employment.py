@@ -0,0 +1,150 @@
+"""
+Staff employment status derived from contracts, applied in bulk.
+
+A staff member is ACTIVE with any active contract, INACTIVE with none but
+an expired casual contract, and EXPIRED otherwise.
+
+Contract saves and deletes do not recompute their staff on the spot: the
+receivers in core.signals call defer_status_recompute(), which collects
+staff ids on the connection until the transaction commits and then
+recomputes them all with one annotated query, writing only the rows whose
+status changed. recompute_employment_status() applies the same rule to a
+whole Staff queryset without loading it, for expire_contracts(), the
+hourly sweep behind the check_contract_expiry command.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .counters import CONTRACT_COUNTER, STAFF_COUNTER, adjust_counters, move_counted
+from .models import Contract, Staff
+
+ACTIVE_STATUSES = {'ACTIVE', 'PERMANENT'}  # adjust to your enum/choices
+BATCH_SIZE = 500
+PENDING_ATTR = 'pending_status_recompute'
+SWEPT_STATUSES = ('ACTIVE', 'PENDING')  # contract statuses the expiry sweep moves to EXPIRED
+
+
+def contract_flags():
+    """(has an active contract, has an expired casual contract) as Exists() on Staff"""
+    has_active = Exists(Contract.objects.filter(staff=OuterRef('pk'), status__in=ACTIVE_STATUSES))
+    casual_expired = Exists(Contract.objects.filter(staff=OuterRef('pk'), contract_type='CASUAL', status='EXPIRED'))
+    return has_active, casual_expired
+
+
+def employment_status_for(has_active, casual_expired):
+    if has_active:
+        return 'ACTIVE'
+    return 'INACTIVE' if casual_expired else 'EXPIRED'  # adjust if you have other states
+
+
+def status_conditions():
+    """employment_status -> filter() conditions selecting the staff who should have it"""
+    has_active, casual_expired = contract_flags()
+    return {
+        'ACTIVE': (has_active,),
+        'INACTIVE': (~has_active, casual_expired),
+        'EXPIRED': (~has_active, ~casual_expired),
+    }
+
+
+def recompute_employment_status(staff):
+    """Bring employment_status in line with the contracts for a Staff queryset; returns the number changed"""
+    now = timezone.now()
+    changed = 0
+    with transaction.atomic():
+        for status, conditions in status_conditions().items():
+            stale = staff.filter(*conditions).exclude(employment_status=status)
+            changed += move_counted(STAFF_COUNTER, stale, employment_status=status, updated_at=now)
+    return changed
+
+
+def recompute_staff_ids(staff_ids, batch_size=BATCH_SIZE):
+    """
+    Recompute the given staff with one annotated read per batch; returns the number changed.
+
+    Only rows whose status changed are written, one UPDATE per new status.
+    """
+    staff_ids = list(staff_ids)
+    has_active, casual_expired = contract_flags()
+    now = timezone.now()
+    changed = 0
+    with transaction.atomic():
+        for start in range(0, len(staff_ids), batch_size):
+            rows = (
+                Staff.objects.filter(pk__in=staff_ids[start:start + batch_size])
+                .annotate(has_active=has_active, casual_expired=casual_expired)
+                .select_for_update(of=('self',))
+                .values('pk', 'has_active', 'casual_expired', *STAFF_COUNTER.fields)
+            )
+            moves = defaultdict(list)
+            for row in rows:
+                status = employment_status_for(row['has_active'], row['casual_expired'])
+                if row['employment_status'] != status:
+                    moves[status].append(row)
+
+            for status, moved in moves.items():
+                Staff.objects.filter(pk__in=[row['pk'] for row in moved]).update(employment_status=status, updated_at=now)
+                adjust_counters((STAFF_COUNTER.bucket(row) for row in moved), -1)
+                adjust_counters(STAFF_COUNTER.bucket({**row, 'employment_status': status}) for row in moved)
+                changed += len(moved)
+    return changed
+
+
+def flush_status_recompute(using=None):
+    connection = transaction.get_connection(using)
+    staff_ids = connection.__dict__.pop(PENDING_ATTR, None)
+    if staff_ids:
+        recompute_staff_ids(staff_ids)
+
+
+def defer_status_recompute(staff_id, using=None):
+    """
+    Recompute staff_id once the current transaction commits.
+
+    Ids are collected per connection, so a staff member whose contracts
+    change many times in one transaction is recomputed once. Every call
+    registers a flush, so ids left behind by a rolled-back savepoint still
+    go out with the next one; extra flushes find nothing to do.
+    """
+    connection = transaction.get_connection(using)
+    connection.__dict__.setdefault(PENDING_ATTR, set()).add(staff_id)
+    transaction.on_commit(partial(flush_status_recompute, using), using=using)
+
+
+def expiring_contracts(today, days=30):
+    """Active contracts ending within days that have not had a reminder"""
+    return Contract.objects.filter(
+        status='ACTIVE',
+        end_date__gte=today,
+        end_date__lte=today + timedelta(days=days),
+        renewal_reminder_sent=False,
+    )
+
+
+def expire_contracts(today=None):
+    """
+    Mark active and pending-renewal contracts past their end date EXPIRED
+    and recompute their staff.
+
+    Returns (contracts expired, staff whose status changed). Already
+    expired, renewed or terminated contracts are left alone.
+    """
+    today = today or timezone.localdate()
+    swept_at = timezone.now()
+    with transaction.atomic():
+        expired = move_counted(
+            CONTRACT_COUNTER,
+            Contract.objects.filter(status__in=SWEPT_STATUSES, end_date__lt=today),
+            status='EXPIRED', updated_at=swept_at,
+        )
+        if not expired:
+            return 0, 0
+        # The rows this sweep touched, found again through the updated_at it stamped
+        swept = Contract.objects.filter(status='EXPIRED', updated_at=swept_at).values('staff_id')
+        changed = recompute_employment_status(Staff.objects.filter(pk__in=swept))
+    return expired, changed
@@ -1,9 +1,29 @@
 from django import forms
 from django.utils import timezone
 from .models import Staff, Department, Contract
+from .caching import department_choices, designation_choices
 import re
 from django.contrib.auth.models import User
 
+PHONE_RE = re.compile(r'^\+?1?\d{9,15}$')
+
+
+def validate_national_id(national_id):
+    clean_id = ''.join(c for c in national_id if c.isalnum())
+    if len(clean_id) < 6:
+        raise forms.ValidationError("National ID must be at least 6 characters long")
+
+
+def validate_phone(phone):
+    if not PHONE_RE.match(phone):
+        raise forms.ValidationError("Phone number must be 9 to 15 digits, optionally starting with a '+'")
+
+
+def use_cached_choices(field, choices):
+    """Render a ModelChoiceField from cached (pk, label) pairs; its queryset still validates"""
+    field.choices = ([('', field.empty_label)] if field.empty_label is not None else []) + choices
+
+
 class StaffForm(forms.ModelForm):
     class Meta:
         model = Staff
@@ -23,6 +43,8 @@ class StaffForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['department'].queryset = Department.objects.all()
+        use_cached_choices(self.fields['department'], department_choices())
+        use_cached_choices(self.fields['designation'], designation_choices())
         self.fields['employment_date'].initial = timezone.now().date()
         self.fields['employment_status'].required = False
         self.fields['user'].queryset = User.objects.all()  # Now User is defined
@@ -41,17 +63,14 @@ class StaffForm(forms.ModelForm):
         """Validate national ID format and uniqueness"""
         national_id = self.cleaned_data.get('national_id')
         if national_id:
-            clean_id = ''.join(c for c in national_id if c.isalnum())
-            if len(clean_id) < 6:
-                raise forms.ValidationError("National ID must be at least 6 characters long")
+            validate_national_id(national_id)
         return national_id
 
     def clean_phone(self):
         """Validate phone number format"""
         phone = self.cleaned_data.get('phone')
         if phone:
-            if not re.match(r'^\+?1?\d{9,15}$', phone):
-                raise forms.ValidationError("Phone number must be 9 to 15 digits, optionally starting with a '+'")
+            validate_phone(phone)
         return phone
 
     def clean(self):
@@ -99,6 +118,7 @@ class ContractForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Set department queryset to ensure dropdown is populated
         self.fields['department'].queryset = Department.objects.all()
+        use_cached_choices(self.fields['department'], department_choices())
         # Add empty choice for contract_type to make it initially blank
         self.fields['contract_type'].choices = [('', 'Select Contract Type')] + list(self.fields['contract_type'].choices)
         self.fields['contract_type'].required = True
@@ -0,0 +1,303 @@
+"""
+Bulk staff import from CSV or XLSX files.
+
+Rows are streamed from the file and handled chunk_size at a time. Each
+chunk is validated with the same rules as StaffForm and checked for
+duplicates, both against earlier rows of the file and against the
+database (one query per unique column). The valid rows are then written
+with bulk_create, Users first, then Staff. Departments (by code or name)
+and designations (by name) are resolved once up front. The initial
+passwords (the national ID, as in Staff.save) are hashed in a process
+pool, since PBKDF2 is what dominates a large import. Invalid rows are
+skipped and listed in the ImportReport with their line number.
+
+bulk_create bypasses the Staff signals, so the dashboard counters, the
+search index, the typeahead and the cached dropdowns are updated here
+directly.
+
+XLSX files need openpyxl.
+"""
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import chain, islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .caching import refresh_version
+from .counters import STAFF_COUNTER, adjust_counters
+from .forms import validate_national_id, validate_phone
+from .models import Department, Designation, Staff, admin_group_id
+from .search import index_new_staff
+from .typeahead import invalidate_typeahead
+
+CHUNK_SIZE = 500
+REQUIRED_COLUMNS = (
+    'first_name', 'last_name', 'email', 'phone', 'gender', 'date_of_birth', 'national_id',
+    'address', 'department', 'designation', 'employment_date', 'employment_category',
+)
+OPTIONAL_COLUMNS = (
+    'middle_name', 'emergency_contact_name', 'emergency_contact_phone',
+    'emergency_contact_relationship', 'is_admin',
+)
+UNIQUE_COLUMNS = ('email', 'national_id', 'unique_id')
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be imported (format, missing columns)"""
+
+
+class ImportReport:
+    """Outcome of an import: rows created and, per rejected row, what was wrong"""
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # (line, field, message)
+
+    def reject(self, line, errors):
+        for field, messages in errors.items():
+            for message in messages:
+                self.errors.append((line, field, message))
+
+    @property
+    def rejected(self):
+        return len({line for line, _, _ in self.errors})
+
+    def write_csv(self, file):
+        writer = csv.writer(file)
+        writer.writerow(['line', 'field', 'error'])
+        writer.writerows(self.errors)
+
+    def __str__(self):
+        return f"Imported {self.created} staff ({self.rejected} rows rejected)"
+
+
+def column_name(header):
+    return str(header or '').strip().lower().replace(' ', '_')
+
+
+def read_csv(file):
+    reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    header = [column_name(h) for h in next(reader, [])]
+    for values in reader:
+        if any(values):
+            yield dict(zip(header, values))
+
+
+def read_xlsx(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError("Reading .xlsx files needs openpyxl (pip install openpyxl)")
+    rows = load_workbook(file, read_only=True, data_only=True).active.iter_rows(values_only=True)
+    header = [column_name(h) for h in next(rows, [])]
+    for values in rows:
+        if any(value not in (None, '') for value in values):
+            yield dict(zip(header, values))
+
+
+def read_rows(file, filename):
+    """Stream the rows of an uploaded or opened (binary) file as dicts keyed by column name"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return read_csv(file)
+    if extension == '.xlsx':
+        return read_xlsx(file)
+    raise ImportFileError(f"Unsupported file type {extension or filename!r}, use .csv or .xlsx")
+
+
+def check_columns(row):
+    missing = [column for column in REQUIRED_COLUMNS if column not in row]
+    if missing:
+        raise ImportFileError(f"Missing columns: {', '.join(missing)}")
+
+
+def cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # spreadsheet numbers such as national IDs
+    if isinstance(value, (str, int)):
+        return str(value).strip()
+    return value
+
+
+class Lookups:
+    """Departments by code or name and designations by name, one query each"""
+
+    def __init__(self):
+        self.departments = {}
+        for pk, code, name in Department.objects.values_list('pk', 'code', 'name'):
+            self.departments[code.lower()] = pk
+            self.departments[name.lower()] = pk
+        self.designations = {name.lower(): pk for pk, name in Designation.objects.values_list('pk', 'name')}
+
+
+def build_staff(row, lookups):
+    """(Staff instance, {field: [messages]}) for one row"""
+    values = {column: cell(row.get(column)) for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+    errors = {column: ['This field is required.'] for column in REQUIRED_COLUMNS if values[column] == ''}
+
+    department = str(values.pop('department')).lower()
+    designation = str(values.pop('designation')).lower()
+    is_admin = str(values.pop('is_admin')).lower() in TRUE_VALUES
+    staff = Staff(
+        department_id=lookups.departments.get(department),
+        designation_id=lookups.designations.get(designation),
+        is_admin=is_admin,
+        **{column: value if value != '' else None for column, value in values.items()},
+    )
+    if department and staff.department_id is None:
+        errors['department'] = [f"Unknown department {row.get('department')!r}"]
+    if designation and staff.designation_id is None:
+        errors['designation'] = [f"Unknown designation {row.get('designation')!r}"]
+
+    try:
+        # The foreign keys were resolved above; uniqueness is checked per chunk
+        staff.full_clean(
+            exclude=['user', 'unique_id', 'department', 'designation', *errors],
+            validate_unique=False, validate_constraints=False,
+        )
+    except ValidationError as e:
+        errors.update(e.message_dict)
+    for field, validate in (('national_id', validate_national_id), ('phone', validate_phone)):
+        if field not in errors:
+            try:
+                validate(staff.__dict__[field])
+            except ValidationError as e:
+                errors[field] = e.messages
+
+    if not errors:
+        staff.unique_id = Staff.build_unique_id(staff.national_id, staff.employment_date)
+    return staff, errors
+
+
+def existing_values(chunk):
+    """{column: values already taken in the database} for the unique columns of a chunk"""
+    taken = {}
+    for column in UNIQUE_COLUMNS:
+        values = {getattr(staff, column) for _, staff in chunk}
+        taken[column] = set(Staff.objects.filter(**{f'{column}__in': values}).values_list(column, flat=True))
+    # An account named after the staff ID that already belongs to someone else
+    taken['unique_id'].update(User.objects.filter(
+        username__in=[staff.unique_id for _, staff in chunk], staff__isnull=False,
+    ).values_list('username', flat=True))
+    return taken
+
+
+def validate_chunk(rows, lookups, seen, report):
+    """The (line, Staff) pairs of a chunk that can be inserted; rejects the rest into report"""
+    built = []
+    for line, row in rows:
+        staff, errors = build_staff(row, lookups)
+        if errors:
+            report.reject(line, errors)
+        else:
+            built.append((line, staff))
+    if not built:
+        return []
+
+    taken = existing_values(built)
+    valid = []
+    for line, staff in built:
+        errors = {}
+        for column in UNIQUE_COLUMNS:
+            value = getattr(staff, column)
+            if value in taken[column]:
+                errors[column] = [f"Staff with this {column.replace('_', ' ')} already exists."]
+            elif value in seen[column]:
+                errors[column] = [f"Duplicate {column.replace('_', ' ')} earlier in the file."]
+        if errors:
+            report.reject(line, errors)
+            continue
+        for column in UNIQUE_COLUMNS:
+            seen[column].add(getattr(staff, column))
+        valid.append((line, staff))
+    return valid
+
+
+def hash_passwords(passwords, pool=None):
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 32)))
+
+
+def insert_staff(staff_list, pool=None):
+    """bulk_create the Users and Staff for validated rows, with the side effects Staff.save would have had"""
+    usernames = [staff.unique_id for staff in staff_list]
+    # Like Staff.save, reuse an existing account with the staff's username
+    existing = dict(
+        User.objects.filter(username__in=usernames, staff__isnull=True).values_list('username', 'pk')
+    )
+    new = [staff for staff in staff_list if staff.unique_id not in existing]
+    hashes = hash_passwords([staff.national_id for staff in new], pool)
+
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(
+                username=staff.unique_id, email=User.objects.normalize_email(staff.email),
+                first_name=staff.first_name, last_name=staff.last_name, password=password,
+            )
+            for staff, password in zip(new, hashes)
+        ])
+        user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        for staff in staff_list:
+            staff.user_id = user_ids[staff.unique_id]
+            staff.default_password = True if staff.unique_id not in existing else None
+
+        Staff.objects.bulk_create(staff_list)
+        staff_ids = dict(Staff.objects.filter(unique_id__in=usernames).values_list('unique_id', 'pk'))
+        for staff in staff_list:
+            staff.pk = staff_ids[staff.unique_id]
+
+        admins = [staff.user_id for staff in staff_list if staff.is_admin]
+        if admins:
+            User.groups.through.objects.bulk_create(
+                [User.groups.through(user_id=user_id, group_id=admin_group_id()) for user_id in admins],
+                ignore_conflicts=True,
+            )
+
+        adjust_counters(STAFF_COUNTER.bucket_for(staff) for staff in staff_list)
+        index_new_staff(staff_list)
+        transaction.on_commit(invalidate_typeahead)
+        refresh_version(Staff)
+
+
+def import_staff(file, filename, chunk_size=CHUNK_SIZE, workers=None, dry_run=False):
+    """
+    Import every valid row of a staff file; returns an ImportReport.
+
+    workers is the number of password hashing processes (default: one
+    per CPU, 0 to hash in this process). dry_run validates without
+    writing anything.
+    """
+    rows = read_rows(file, filename)
+    first = next(rows, None)
+    if first is None:
+        return ImportReport()
+    check_columns(first)
+
+    numbered = enumerate(chain([first], rows), start=2)  # line 1 is the header
+    lookups = Lookups()
+    seen = {column: set() for column in UNIQUE_COLUMNS}
+    report = ImportReport()
+    workers = os.cpu_count() if workers is None else workers
+    pool = ProcessPoolExecutor(workers) if workers > 1 and not dry_run else None
+    try:
+        while chunk := list(islice(numbered, chunk_size)):
+            valid = validate_chunk(chunk, lookups, seen, report)
+            if valid and not dry_run:
+                insert_staff([staff for _, staff in valid], pool)
+            report.created += len(valid)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return report
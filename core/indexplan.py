@@ -0,0 +1,85 @@
+"""
+Query plans for the hot dashboard and batch queries.
+
+HOT_QUERIES lists the filters the dashboards, the payroll run and the
+hourly contract jobs put on Staff, Contract, Payroll and Deduction, built
+the same way the views build them. explain_hot_queries() runs EXPLAIN on
+each one and reports any table it reads end to end; the explain_queries
+command prints the report and fails when a query has lost its index.
+
+SQLite plans count as indexed when every table step is a SEARCH.
+PostgreSQL plans are taken with enable_seqscan off, so on a small
+database they show whether an index can serve the query rather than
+whether the planner would pick one over a scan of a few pages.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connections, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .pagination import DEFAULT_PAGE_SIZE, STAFF_ORDERING, CONTRACT_ORDERING, PAYROLL_ORDERING
+
+HotQuery = namedtuple('HotQuery', ['name', 'queryset'])
+QueryPlan = namedtuple('QueryPlan', ['name', 'plan', 'full_scans'])
+
+SQLITE_SCAN = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def hot_queries(today=None):
+    from django.contrib.auth.models import User
+    from payroll.models import Deduction, Payroll
+    from payroll.runs import get_run_contracts
+    from .employment import SWEPT_STATUSES, expiring_contracts
+    from .models import Contract, Staff
+
+    today = today or timezone.now().date()
+    pay_month = today.replace(day=1)
+    page = DEFAULT_PAGE_SIZE + 1
+    return [
+        HotQuery('locum dashboard',
+                 Staff.objects.filter(employment_category='LOCUM').order_by(*STAFF_ORDERING)[:page]),
+        HotQuery('casual dashboard',
+                 Staff.objects.filter(employment_category='CASUAL').order_by(*STAFF_ORDERING)[:page]),
+        HotQuery('staff by status',
+                 Staff.objects.filter(employment_status='ACTIVE').order_by(*STAFF_ORDERING)[:page]),
+        HotQuery('contracts by status',
+                 Contract.objects.filter(status='ACTIVE').order_by(*CONTRACT_ORDERING)[:page]),
+        HotQuery('contracts expiring soon', expiring_contracts(today)),
+        HotQuery('contracts past end date',
+                 Contract.objects.filter(status__in=SWEPT_STATUSES, end_date__lt=today)),
+        HotQuery('payroll run contracts', get_run_contracts(pay_month)),
+        HotQuery('payroll month by status', Payroll.objects.filter(pay_month=pay_month, status='PENDING')),
+        HotQuery('payroll by status',
+                 Payroll.objects.filter(status='PENDING').order_by(*PAYROLL_ORDERING)[:page]),
+        HotQuery('mandatory deductions', Deduction.objects.filter(deduction_type='MANDATORY', is_active=True)),
+        HotQuery('sign-in username',
+                 User.objects.annotate(username_key=Lower('username')).filter(username_key='mlkh12345672024')),
+    ]
+
+
+def full_scans(plan, vendor):
+    """Tables the plan reads without an index seek"""
+    pattern = {'sqlite': SQLITE_SCAN, 'postgresql': POSTGRES_SCAN}.get(vendor)
+    return pattern.findall(plan) if pattern else []
+
+
+def explain(queryset, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def explain_hot_queries(using='default', today=None):
+    vendor = connections[using].vendor
+    plans = []
+    for query in hot_queries(today):
+        plan = explain(query.queryset.using(using), using)
+        plans.append(QueryPlan(query.name, plan, full_scans(plan, vendor)))
+    return plans
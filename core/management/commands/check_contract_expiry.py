@@ -4,46 +4,34 @@ from django.utils import timezone
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
-from datetime import timedelta
-from core.models import Contract
+import time
+from core.employment import expire_contracts, expiring_contracts
 
 class Command(BaseCommand):
     help = 'Check for expiring contracts and send notifications'
     
     def handle(self, *args, **options):
+        today = timezone.localdate()
+        started = time.monotonic()
+
         # Contracts expiring in the next 30 days
-        warning_date = timezone.now().date() + timedelta(days=30)
-        expiring_contracts = Contract.objects.filter(
-            end_date__lte=warning_date,
-            end_date__gte=timezone.now().date(),
-            status='ACTIVE',
-            renewal_reminder_sent=False
-        )
+        expiring_count = expiring_contracts(today).count()
         
-        #for contract in expiring_contracts:
+        #for contract in expiring_contracts(today).select_related('staff'):
           #  self.send_renewal_reminder(contract)
           #  contract.renewal_reminder_sent = True
            # contract.save()
-            
-        # Mark expired contracts
-        expired_contracts = Contract.objects.filter(
-            end_date__lt=timezone.now().date()
-        )
-        
-        for contract in expired_contracts:
-            contract.status = 'EXPIRED'
-            if contract.contract_type == "CASUAL":
-                contract.staff.employment_status = "INACTIVE"
-            elif contract.contract_type == "LOCUM":
-                contract.staff.employment_status = "EXPIRED"
-            else:
-                contract.staff.employment_status = "EXPIRED"
-            contract.save()
+        counted = time.monotonic()
+
+        # Mark newly expired contracts and recompute their staff, set-based
+        expired_count, staff_count = expire_contracts(today)
+        finished = time.monotonic()
             
         self.stdout.write(
             self.style.SUCCESS(
-                f"Checked contracts: {len(expiring_contracts)} expiring soon, "
-                f"{len(expired_contracts)} marked as expired"
+                f"Checked contracts: {expiring_count} expiring soon, "
+                f"{expired_count} marked as expired, {staff_count} staff statuses updated "
+                f"(expiring {counted - started:.2f}s, sweep {finished - counted:.2f}s)"
             )
         )
     
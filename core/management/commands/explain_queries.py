@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.indexplan import explain_hot_queries
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot dashboard and batch queries and fail if any of them scans a whole table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to explain against')
+
+    def handle(self, *args, **options):
+        plans = explain_hot_queries(options['database'])
+        for plan in plans:
+            if plan.full_scans:
+                self.stdout.write(self.style.ERROR(f"SCAN  {plan.name}: {', '.join(plan.full_scans)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"INDEX {plan.name}"))
+            if options['verbosity'] > 1 or plan.full_scans:
+                for line in plan.plan.splitlines():
+                    self.stdout.write(f"      {line}")
+
+        scanned = [plan.name for plan in plans if plan.full_scans]
+        if scanned:
+            raise CommandError(f"{len(scanned)} of {len(plans)} queries scan a whole table: {', '.join(scanned)}")
+        self.stdout.write(self.style.SUCCESS(f"All {len(plans)} queries use an index"))
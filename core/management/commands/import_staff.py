@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import CHUNK_SIZE, ImportFileError, import_staff
+
+
+class Command(BaseCommand):
+    help = 'Bulk import staff from a CSV or XLSX file, one row per staff member with a header row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='.csv or .xlsx file')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows validated and inserted per batch')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: one per CPU, 0 for none)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without importing anything')
+        parser.add_argument('--report', help='Write the rejected rows to this CSV file instead of stdout')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_staff(
+                    file, options['path'], chunk_size=options['chunk_size'],
+                    workers=options['workers'], dry_run=options['dry_run'],
+                )
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        if report.errors:
+            if options['report']:
+                with open(options['report'], 'w', newline='') as file:
+                    report.write_csv(file)
+            else:
+                report.write_csv(self.stdout)
+
+        summary = f"{report} in {time.monotonic() - started:.1f}s"
+        if options['dry_run']:
+            summary = f"Dry run: {summary.replace('Imported', 'would import', 1)}"
+        style = self.style.WARNING if report.errors else self.style.SUCCESS
+        self.stdout.write(style(summary))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.search import get_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the staff search documents (and the FTS5 table on SQLite) from the Staff table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index(batch_size=options['batch_size'])
+        backend = type(get_backend()).__name__
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} staff members ({backend})"))
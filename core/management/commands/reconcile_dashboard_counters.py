@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import COUNTER_SPECS, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the dashboard counters from the Staff, Contract and Payroll tables (schedule periodically to fix drift)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scope', action='append', choices=[spec.scope for spec in COUNTER_SPECS],
+            help='Only rebuild this scope (repeatable); defaults to all',
+        )
+
+    def handle(self, *args, **options):
+        specs = [spec for spec in COUNTER_SPECS if not options['scope'] or spec.scope in options['scope']]
+        drifted = rebuild_counters(specs)
+        if drifted:
+            self.stdout.write(self.style.WARNING(f"Fixed {drifted} drifted dashboard counters"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Dashboard counters are in sync"))
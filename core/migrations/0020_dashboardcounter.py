@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:38
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+# The counted buckets as core.counters defined them when this migration was
+# written: (scope, model, category, status, department, pay month) fields
+COUNTED = [
+    ('staff', 'core.Staff', 'employment_category', 'employment_status', 'department_id', None),
+    ('contract', 'core.Contract', 'contract_type', 'status', 'department_id', None),
+    ('payroll', 'payroll.Payroll', None, 'status', None, 'pay_month'),
+]
+
+
+def populate_counters(apps, schema_editor):
+    DashboardCounter = apps.get_model('core', 'DashboardCounter')
+    counts = Counter()
+    for scope, model, category, status, department, pay_month in COUNTED:
+        fields = [f for f in (category, status, department, pay_month) if f]
+        for row in apps.get_model(model).objects.values(*fields).annotate(n=Count('pk')).order_by():
+            counts[(
+                scope,
+                (row[category] or '') if category else '',
+                row[status] or '',
+                row[department] if department else None,
+                row[pay_month] if pay_month else None,
+            )] += row['n']
+
+    counters = []
+    for (scope, category, status, department_id, month), n in counts.items():
+        key = f"{scope}|{category}|{status}|{department_id or ''}|{month.isoformat() if month else ''}"
+        counters.append(DashboardCounter(
+            key=key, scope=scope, category=category, status=status,
+            department_id=department_id, pay_month=month, count=n,
+        ))
+    DashboardCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_remove_contract_is_active'),
+        ('payroll', '0005_payroll_pdf_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True)),
+                ('scope', models.CharField(max_length=20)),
+                ('category', models.CharField(blank=True, default='', max_length=20)),
+                ('status', models.CharField(blank=True, default='', max_length=20)),
+                ('pay_month', models.DateField(blank=True, null=True)),
+                ('count', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.department')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'category', 'status'], name='core_dashbo_scope_9fb40c_idx')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
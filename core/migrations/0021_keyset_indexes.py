@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['start_date', 'id'], name='contract_start_seek_idx'),
+        ),
+    ]
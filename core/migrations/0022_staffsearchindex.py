@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:44
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'core_staff_fts'
+SEARCH_FIELDS = ('first_name', 'middle_name', 'last_name', 'unique_id', 'email')
+
+
+def create_search_backend(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(document, tokenize='trigram')")
+        except OperationalError:
+            pass  # SQLite without FTS5/trigram (< 3.34): core.search falls back to LIKE
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX core_staffsearch_trgm_idx ON core_staffsearchindex USING gin (document gin_trgm_ops)"
+        )
+
+
+def drop_search_backend(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS core_staffsearch_trgm_idx")
+
+
+def normalize(text):
+    # As core.search.normalize when this migration was written
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def search_document(staff):
+    return ' '.join(normalize(getattr(staff, field)) for field in SEARCH_FIELDS if getattr(staff, field))
+
+
+def populate_search_index(apps, schema_editor):
+    Staff = apps.get_model('core', 'Staff')
+    StaffSearchIndex = apps.get_model('core', 'StaffSearchIndex')
+    StaffSearchIndex.objects.bulk_create(
+        [StaffSearchIndex(staff_id=staff.pk, document=search_document(staff))
+         for staff in Staff.objects.only(*SEARCH_FIELDS).iterator()],
+        batch_size=1000,
+    )
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, document) SELECT staff_id, document FROM core_staffsearchindex"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffSearchIndex',
+            fields=[
+                ('staff', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='core.staff')),
+                ('document', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(create_search_backend, drop_search_backend),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_change_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['status', 'start_date', 'id'], name='contract_status_seek_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['end_date'], name='contract_active_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staff',
+            index=models.Index(fields=['employment_category', 'unique_id'], name='staff_category_seek_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staff',
+            index=models.Index(fields=['employment_status', 'unique_id'], name='staff_status_seek_idx'),
+        ),
+    ]
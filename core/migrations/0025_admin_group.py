@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def create_admin_group(apps, schema_editor):
+    Group = apps.get_model('auth', 'Group')
+    Group.objects.get_or_create(name='Admin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0024_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_admin_group, migrations.RunPython.noop),
+    ]
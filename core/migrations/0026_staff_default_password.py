@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_admin_group'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staff',
+            name='default_password',
+            field=models.BooleanField(blank=True, editable=False, null=True, verbose_name='Default Password'),
+        ),
+    ]
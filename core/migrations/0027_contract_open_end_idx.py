@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_staff_default_password'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(condition=models.Q(('status__in', ['ACTIVE', 'PENDING'])), fields=['end_date'], name='contract_open_end_idx'),
+        ),
+    ]
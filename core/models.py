@@ -35,6 +35,26 @@ class Designation(models.Model):
     def __str__(self):
         return f"{self.name}"
 
+# Staff fields copied to the User account, and everything Staff.save syncs
+STAFF_USER_FIELDS = ('first_name', 'last_name', 'email', 'unique_id')
+STAFF_TRACKED_FIELDS = STAFF_USER_FIELDS + ('is_admin', 'user_id')
+
+_admin_group_id = None
+
+
+def admin_group_id():
+    """Id of the Admin group, looked up once per process (created by migration 0025)"""
+    global _admin_group_id
+    if _admin_group_id is None:
+        _admin_group_id = Group.objects.get_or_create(name='Admin')[0].pk
+    return _admin_group_id
+
+
+def forget_admin_group():
+    global _admin_group_id
+    _admin_group_id = None
+
+
 class Staff(models.Model):
     GENDER_CHOICES = [
         ('M', 'Male'),
@@ -82,58 +102,110 @@ class Staff(models.Model):
     )
     unique_id = models.CharField(max_length=30, unique=True, editable=False, verbose_name=_("Unique ID"))
     is_admin = models.BooleanField(default=False, verbose_name=_("Is Admin"))
+    # Still signing in with the national ID set at provisioning; None until
+    # first checked for accounts created before this was tracked
+    default_password = models.BooleanField(null=True, blank=True, editable=False, verbose_name=_("Default Password"))
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @staticmethod
+    def build_unique_id(national_id, employment_date):
+        clean_national_id = ''.join(c for c in national_id if c.isalnum())
+        return f"MLKH{clean_national_id}{employment_date.year}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance.tracked_values()
+        return instance
+
+    def tracked_values(self):
+        return {field: self.__dict__[field] for field in STAFF_TRACKED_FIELDS if field in self.__dict__}
+
+    def changed_fields(self, update_fields=None):
+        """
+        Tracked fields this save will change, or None when unknown.
+
+        Unknown means a new instance or one not loaded from the database,
+        which get the full user and group sync.
+        """
+        if update_fields is not None:
+            update_fields = {'user_id' if field == 'user' else field for field in update_fields}
+            if not update_fields & set(STAFF_TRACKED_FIELDS):
+                return set()
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return None
+        changed = {field for field, value in loaded.items() if self.__dict__.get(field, value) != value}
+        return changed & update_fields if update_fields is not None else changed
+
     def save(self, *args, **kwargs):
         if not self.unique_id:
             if not self.national_id:
                 raise ValueError("National ID is required to generate unique ID")
             if not self.employment_date:
                 raise ValueError("Employment date is required to generate unique ID")
-            clean_national_id = ''.join(c for c in self.national_id if c.isalnum())
-            self.unique_id = f"MLKH{clean_national_id}{self.employment_date.year}"
+            self.unique_id = self.build_unique_id(self.national_id, self.employment_date)
+
+        changed = self.changed_fields(kwargs.get('update_fields'))
+        if changed is None or not self.user_id and kwargs.get('update_fields') is None:
+            created_user = self.sync_user()
+            self.sync_admin_group(created_user)
+        elif changed:
+            # Only the user account and group membership the edit touched
+            if changed & set(STAFF_USER_FIELDS) or 'user_id' in changed:
+                self.sync_user(validate_unique='unique_id' in changed or 'user_id' in changed)
+            if 'is_admin' in changed or 'user_id' in changed:
+                self.sync_admin_group()
+
+        super().save(*args, **kwargs)
+        self._loaded_values = self.tracked_values()
 
-        # Create or update associated User account
-        if not self.user:
+    def sync_user(self, validate_unique=True):
+        """Create, assign or update the User account; returns True if one was created"""
+        if not self.user_id:
             try:
                 if User.objects.filter(username=self.unique_id).exists():
                     # If username already exists, assign the user instead of creating a new one
                     self.user = User.objects.get(username=self.unique_id)
-                else:
-                    user = User.objects.create_user(
-                        username=self.unique_id,
-                        email=self.email,
-                        password=self.national_id,
-                        first_name=self.first_name,
-                        last_name=self.last_name
-                    )
-                    self.user = user
+                    return False
+                self.user = User.objects.create_user(
+                    username=self.unique_id,
+                    email=self.email,
+                    password=self.national_id,
+                    first_name=self.first_name,
+                    last_name=self.last_name
+                )
+                self.default_password = True
+                return True
             except Exception as e:
                 raise ValueError(f"Failed to create or assign user account: {str(e)}")
-        else:
-            # Update existing user info
-            user = self.user
-            user.first_name = self.first_name
-            user.last_name = self.last_name
-            user.email = self.email
-            user.username = self.unique_id  # Keep username in sync with unique_id
-            try:
-                user.full_clean()
-                user.save()
-            except Exception as e:
-                raise ValueError(f"Failed to update user account: {str(e)}")
 
-        # Manage Admin group membership
-        admin_group, _ = Group.objects.get_or_create(name='Admin')
-        if self.is_admin:
-            if not self.user.groups.filter(name='Admin').exists():
-                self.user.groups.add(admin_group)
-        else:
-            if self.user.groups.filter(name='Admin').exists():
-                self.user.groups.remove(admin_group)
+        # Update existing user info
+        user = self.user
+        user.first_name = self.first_name
+        user.last_name = self.last_name
+        user.email = self.email
+        user.username = self.unique_id  # Keep username in sync with unique_id
+        try:
+            user.full_clean(validate_unique=validate_unique)
+            user.save(update_fields=['first_name', 'last_name', 'email', 'username'])
+        except Exception as e:
+            raise ValueError(f"Failed to update user account: {str(e)}")
+        return False
 
-        super().save(*args, **kwargs)
+    def sync_admin_group(self, created_user=False):
+        """Add the user to or remove them from the Admin group, one query"""
+        from .roles import forget_admin_role
+
+        forget_admin_role(self.user_id)
+        membership = User.groups.through
+        if self.is_admin:
+            membership.objects.bulk_create(
+                [membership(user_id=self.user_id, group_id=admin_group_id())], ignore_conflicts=True
+            )
+        elif not created_user:
+            membership.objects.filter(user_id=self.user_id, group_id=admin_group_id()).delete()
 
     @property
     def full_name(self):
@@ -155,6 +227,12 @@ class Staff(models.Model):
     class Meta:
         ordering = ['unique_id']
         verbose_name_plural = "Staff"
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='staff_updated_seek_idx'),
+            # Category dashboards and status filters, both paged on unique_id
+            models.Index(fields=['employment_category', 'unique_id'], name='staff_category_seek_idx'),
+            models.Index(fields=['employment_status', 'unique_id'], name='staff_status_seek_idx'),
+        ]
 
     @property
     def current_contract(self):
@@ -222,6 +300,18 @@ class Contract(models.Model):
         ordering = ['-start_date']
         verbose_name = _('Contract')
         verbose_name_plural = _('Contracts')
+        indexes = [
+            models.Index(fields=['start_date', 'id'], name='contract_start_seek_idx'),
+            models.Index(fields=['updated_at', 'id'], name='contract_updated_seek_idx'),
+            # Contracts page filtered by status, paged on -start_date
+            models.Index(fields=['status', 'start_date', 'id'], name='contract_status_seek_idx'),
+            # Expiry reminders only ever look at active contracts
+            models.Index(fields=['end_date'], condition=models.Q(status='ACTIVE'), name='contract_active_end_idx'),
+            # The expiry sweep also expires contracts pending renewal
+            models.Index(
+                fields=['end_date'], condition=models.Q(status__in=['ACTIVE', 'PENDING']), name='contract_open_end_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.staff.full_name} - {self.job_title} ({self.start_date})"
@@ -307,4 +397,44 @@ class ContractRenewal(models.Model):
         verbose_name_plural = _('Contract Renewals')
     
     def __str__(self):
-        return f"Renewal of {self.contract} on {self.renewal_date.date()}"
\ No newline at end of file
+        return f"Renewal of {self.contract} on {self.renewal_date.date()}"
+
+class DashboardCounter(models.Model):
+    """Number of Staff, Contract or Payroll rows in one dashboard bucket, kept by core.counters"""
+    key = models.CharField(max_length=200, unique=True)
+    scope = models.CharField(max_length=20)
+    category = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=20, blank=True, default='')
+    department = models.ForeignKey(
+        Department, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    pay_month = models.DateField(null=True, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['scope', 'category', 'status'])]
+
+    def __str__(self):
+        return f"{self.key} = {self.count}"
+
+
+class StaffSearchIndex(models.Model):
+    """Normalized search document for one staff member, maintained by core.search"""
+    staff = models.OneToOneField(Staff, on_delete=models.CASCADE, primary_key=True, related_name='search_index')
+    document = models.TextField()
+
+    def __str__(self):
+        return self.document
+
+
+class Tombstone(models.Model):
+    """Record of a deleted row for the change feeds in core.changes"""
+    feed = models.CharField(max_length=30)
+    object_id = models.CharField(max_length=64)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['feed', 'id'])]
+
+    def __str__(self):
+        return f"{self.feed}:{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
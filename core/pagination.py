@@ -0,0 +1,162 @@
+"""
+Keyset (seek) pagination for the dashboard listings.
+
+Pages are addressed by an opaque cursor holding the ordering values of the
+last (or first) row shown, and the next page is fetched with
+WHERE (key) > (cursor) ORDER BY key LIMIT n, so page 500 costs the same
+index seek as page one. The ordering must end in a unique field (unique_id
+or id) and its fields must be non-null. A page's total (every row the
+filters match) is a separate COUNT, run only when a template asks for it.
+"""
+import base64
+import json
+from functools import cached_property
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.http import urlencode
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+STAFF_ORDERING = ('unique_id',)
+CONTRACT_ORDERING = ('-start_date', '-id')
+PAYROLL_ORDERING = ('-pay_month', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    data = json.dumps([str(v) for v in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor, count):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(values, list) or len(values) != count:
+        raise InvalidCursor('cursor does not match the ordering')
+    return values
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        size = int(request.GET.get('per_page', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, maximum))
+
+
+def seek_filter(ordering, values):
+    """Rows strictly after values in ordering, as (a > x) OR (a = x AND b > y) ..."""
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def reverse_ordering(ordering):
+    return tuple(f[1:] if f.startswith('-') else f'-{f}' for f in ordering)
+
+
+class KeysetPage:
+    """One page of rows plus the cursors and query strings around it"""
+
+    def __init__(self, object_list, ordering, per_page, has_next, has_previous, params, queryset=None):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.params = params
+        self.queryset = queryset
+
+    @cached_property
+    def total(self):
+        """Rows matching the filters across all pages"""
+        if self.queryset is None or not (self.has_next or self.has_previous):
+            return len(self.object_list)
+        return self.queryset.count()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def cursor_for(self, obj):
+        return encode_cursor(getattr(obj, f.lstrip('-')) for f in self.ordering)
+
+    @property
+    def next_cursor(self):
+        return self.cursor_for(self.object_list[-1]) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self.cursor_for(self.object_list[0]) if self.has_previous else None
+
+    def query_string(self, **cursor):
+        params = {k: v for k, v in self.params.items() if k not in ('after', 'before') and v}
+        params.update(cursor)
+        return '?' + urlencode(params)
+
+    @property
+    def first_query(self):
+        return self.query_string()
+
+    @property
+    def next_query(self):
+        return self.query_string(after=self.next_cursor) if self.has_next else None
+
+    @property
+    def previous_query(self):
+        return self.query_string(before=self.previous_cursor) if self.has_previous else None
+
+
+def keyset_paginate(request, queryset, ordering, per_page=None):
+    """
+    Return the KeysetPage selected by the ?after= / ?before= cursor.
+
+    A malformed cursor falls back to the first page.
+    """
+    ordering = tuple(ordering)
+    filtered = queryset
+    per_page = per_page or get_page_size(request)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    params = request.GET.dict()
+
+    try:
+        if before:
+            values = decode_cursor(before, len(ordering))
+            rows = list(
+                queryset.filter(seek_filter(reverse_ordering(ordering), values))
+                .order_by(*reverse_ordering(ordering))[:per_page + 1]
+            )
+            has_previous = len(rows) > per_page
+            rows = rows[:per_page][::-1]
+            return KeysetPage(rows, ordering, per_page, bool(rows), has_previous, params, filtered)
+        if after:
+            values = decode_cursor(after, len(ordering))
+            queryset = queryset.filter(seek_filter(ordering, values))
+    except (InvalidCursor, ValidationError, ValueError):
+        after = None
+        params.pop('after', None)
+        params.pop('before', None)
+
+    rows = list(queryset.order_by(*ordering)[:per_page + 1])
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    return KeysetPage(rows, ordering, per_page, has_next, bool(after and rows), params, filtered)
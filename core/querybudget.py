@@ -0,0 +1,91 @@
+"""
+Per-view query budgets.
+
+@query_budget(n) declares the most queries a view may run, counting
+everything it triggers, template rendering and lazy request.user lookups
+included. QueryBudgetMiddleware applies QUERY_BUDGET_DEFAULT, counted
+over the whole request, to views that did not declare one. Going over the
+budget raises QueryBudgetExceeded when QUERY_BUDGET_STRICT is on (the test
+runner) and logs a warning otherwise, so N+1 regressions fail the suite
+without breaking production pages.
+"""
+import functools
+import logging
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    """Count queries on every database connection inside the block"""
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+
+def check_budget(name, budget, used):
+    if used <= budget:
+        return
+    message = f"{name} ran {used} queries, over its budget of {budget}"
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def view_name(view_func):
+    return f"{view_func.__module__}.{getattr(view_func, '__qualname__', view_func.__class__.__name__)}"
+
+
+def query_budget(max_queries):
+    """Fail (strict) or warn when the decorated view runs more than max_queries"""
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            with count_queries() as counter:
+                response = view_func(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response = response.render()
+            check_budget(view_name(view_func), max_queries, counter.count)
+            return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    """Enforce QUERY_BUDGET_DEFAULT on views without their own @query_budget"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        budget = getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+        if budget is None:
+            return self.get_response(request)
+
+        with count_queries() as counter:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        if match and not hasattr(match.func, 'query_budget'):
+            check_budget(view_name(match.func), budget, counter.count)
+        return response
@@ -0,0 +1,46 @@
+"""
+Cached admin-role check.
+
+is_admin(user) answers "is this user in the Admin group" from the user
+object for the rest of the request. Across requests the answer is kept in
+the Django cache only when that cache is shared by every worker (any
+CACHE_MODE but locmem): Staff.save and group edits drop the cached answer
+(see core.signals), and a revoked role must not outlive that in another
+process's memory. With the per-process locmem cache each request reads
+the membership from the database.
+"""
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+ADMIN_ROLE_KEY = 'core:admin_role:{}'
+ADMIN_ROLE_TIMEOUT = 300
+
+
+def shared_cache():
+    """False when the default cache lives in this process only"""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def is_admin(user):
+    if not user.is_authenticated:
+        return False
+    cached = getattr(user, '_is_admin', None)
+    if cached is None:
+        key = ADMIN_ROLE_KEY.format(user.pk)
+        shared = shared_cache()
+        cached = cache.get(key) if shared else None
+        if cached is None:
+            cached = user.groups.filter(name='Admin').exists()
+            if shared:
+                cache.set(key, cached, ADMIN_ROLE_TIMEOUT)
+        user._is_admin = cached
+    return cached
+
+
+def forget_admin_role(user_id):
+    """Drop the cached answer for user_id now and again once the current transaction commits"""
+    key = ADMIN_ROLE_KEY.format(user_id)
+    cache.delete(key)
+    # A request that read the old membership before the commit may have cached it again
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,224 @@
+"""
+Staff search index.
+
+Every Staff row has a StaffSearchIndex row holding one normalized document
+(lower-cased, accents folded) built from the name, unique_id and email
+fields. It is kept current from post_save/post_delete in core.signals and
+can be rebuilt with the rebuild_search_index command.
+
+Lookups go through one interface, search_filter() for filtering any
+queryset that points at Staff and ranked_staff_ids() for best-first
+matches, backed by whatever the database offers:
+
+- SQLite: an FTS5 table with the trigram tokenizer (core_staff_fts), which
+  answers substring matches from its index and ranks with bm25.
+- PostgreSQL: a pg_trgm GIN index on the document column, ranked by
+  similarity().
+- Anything else: icontains over the single document column.
+
+Terms shorter than three characters cannot use a trigram index and fall
+back to the document column scan.
+"""
+import unicodedata
+
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import StaffSearchIndex
+
+SEARCH_FIELDS = ('first_name', 'middle_name', 'last_name', 'unique_id', 'email')
+FTS_TABLE = 'core_staff_fts'
+MIN_TRIGRAM_LENGTH = 3
+
+
+def normalize(text):
+    """Lower-case and strip accents so 'Zoë' and 'zoe' match"""
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def search_document(staff):
+    return ' '.join(normalize(getattr(staff, field)) for field in SEARCH_FIELDS if getattr(staff, field))
+
+
+def search_terms(query):
+    return normalize(query).split()
+
+
+class LikeBackend:
+    """Portable fallback: icontains on the document column"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def index(self, staff_id, document):
+        pass
+
+    def remove(self, staff_id):
+        pass
+
+    def index_many(self, documents):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def document_filter(self, terms):
+        condition = Q()
+        for term in terms:
+            condition &= Q(document__contains=term)
+        return condition
+
+    def staff_ids(self, terms):
+        return StaffSearchIndex.objects.filter(self.document_filter(terms)).values('staff_id')
+
+    def ranked(self, terms, limit):
+        return list(
+            StaffSearchIndex.objects.filter(self.document_filter(terms))
+            .order_by('document').values_list('staff_id', flat=True)[:limit]
+        )
+
+
+class SQLiteFTSBackend(LikeBackend):
+    """FTS5 trigram index kept alongside the document table"""
+
+    def index(self, staff_id, document):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [staff_id])
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)", [staff_id, document])
+
+    def remove(self, staff_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [staff_id])
+
+    def index_many(self, documents):
+        """Add (staff_id, document) pairs for staff not indexed yet"""
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)", documents)
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, document) "
+                f"SELECT staff_id, document FROM {StaffSearchIndex._meta.db_table}"
+            )
+
+    def match(self, terms):
+        # Quoted terms are matched as substrings, all of them required
+        return ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+
+    def staff_ids(self, terms):
+        if min(map(len, terms)) < MIN_TRIGRAM_LENGTH:
+            return super().staff_ids(terms)
+        return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [self.match(terms)])
+
+    def ranked(self, terms, limit):
+        if min(map(len, terms)) < MIN_TRIGRAM_LENGTH:
+            return super().ranked(terms, limit)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+                [self.match(terms), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresTrigramBackend(LikeBackend):
+    """pg_trgm GIN index on the document column; icontains lookups use it directly"""
+
+    def ranked(self, terms, limit):
+        if min(map(len, terms)) < MIN_TRIGRAM_LENGTH:
+            return super().ranked(terms, limit)
+        table = StaffSearchIndex._meta.db_table
+        where = ' AND '.join(['document LIKE %s'] * len(terms))
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT staff_id FROM {table} WHERE {where} "
+                f"ORDER BY similarity(document, %s) DESC, staff_id LIMIT %s",
+                [f'%{term}%' for term in terms] + [' '.join(terms), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def has_fts_table(connection):
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+_backends = {}
+
+
+def get_backend(using='default'):
+    backend = _backends.get(using)
+    if backend is None:
+        connection = connections[using]
+        if connection.vendor == 'sqlite' and has_fts_table(connection):
+            backend = SQLiteFTSBackend(connection)
+        elif connection.vendor == 'postgresql':
+            backend = PostgresTrigramBackend(connection)
+        else:
+            backend = LikeBackend(connection)
+        _backends[using] = backend
+    return backend
+
+
+def search_filter(query, field='pk'):
+    """
+    Q matching rows whose Staff (reached through field) matches every term.
+
+    Use field='pk' on Staff querysets and e.g. field='staff_id' on Contract
+    or Payroll. An empty query matches everything.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return Q()
+    return Q(**{f'{field}__in': get_backend().staff_ids(terms)})
+
+
+def ranked_staff_ids(query, limit=20):
+    """Ids of the best matching staff, best first"""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    return get_backend().ranked(terms, limit)
+
+
+def index_staff(staff):
+    document = search_document(staff)
+    StaffSearchIndex.objects.update_or_create(staff_id=staff.pk, defaults={'document': document})
+    get_backend().index(staff.pk, document)
+
+
+def index_new_staff(staff_list):
+    """index_staff() for freshly bulk-created staff, in two statements"""
+    documents = [(staff.pk, search_document(staff)) for staff in staff_list]
+    StaffSearchIndex.objects.bulk_create(
+        [StaffSearchIndex(staff_id=staff_id, document=document) for staff_id, document in documents]
+    )
+    get_backend().index_many(documents)
+
+
+def unindex_staff(staff_id):
+    # The document row goes with the Staff row (CASCADE)
+    get_backend().remove(staff_id)
+
+
+def rebuild_search_index(batch_size=1000):
+    """Rebuild every document from the Staff table; returns the number indexed"""
+    from .models import Staff
+
+    count = 0
+    with transaction.atomic():
+        StaffSearchIndex.objects.all().delete()
+        batch = []
+        for staff in Staff.objects.only(*SEARCH_FIELDS).iterator(chunk_size=batch_size):
+            batch.append(StaffSearchIndex(staff_id=staff.pk, document=search_document(staff)))
+            if len(batch) >= batch_size:
+                StaffSearchIndex.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        StaffSearchIndex.objects.bulk_create(batch)
+        count += len(batch)
+        get_backend().rebuild()
+    return count
@@ -1,29 +1,108 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_init, pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Contract
+from django.contrib.auth.models import Group, User
+from .models import Department, Designation, Staff, Contract, forget_admin_group
+from .changes import record_deletion
+from .caching import refresh_version
+from .counters import STAFF_COUNTER, CONTRACT_COUNTER
+from .employment import defer_status_recompute
+from .roles import forget_admin_role
+from .search import SEARCH_FIELDS, index_staff, unindex_staff
+from .typeahead import TYPEAHEAD_FIELDS, invalidate_typeahead
 
-ACTIVE_STATUSES = {'ACTIVE', 'PERMANENT'}  # adjust to your enum/choices
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def on_contract_changed(sender, instance, raw=False, using=None, **kwargs):
+    # Recomputed once per staff member when the transaction commits, see core.employment
+    if not raw:
+        defer_status_recompute(instance.staff_id, using)
 
-def sync_staff_employment_status(staff):
-    if not staff:
-        return
-    # If any active contract exists -> ACTIVE
-    if staff.contracts.filter(status__in=ACTIVE_STATUSES).exists():
-        staff.employment_status = 'ACTIVE'
-    else:
-        # none active: if the last/only contract is casual and expired -> INACTIVE
-        casual_expired = staff.contracts.filter(
-            contract_type='CASUAL', status='EXPIRED'
-        ).exists()
-        staff.employment_status = 'INACTIVE' if casual_expired else 'EXPIRED'  # adjust if you have other states
-    staff.save(update_fields=['employment_status'])
 
+# Dashboard counters follow every Staff/Contract save and delete; the
+# bulk status updates in core.employment adjust them directly.
+COUNTED_MODELS = {Staff: STAFF_COUNTER, Contract: CONTRACT_COUNTER}
 
+@receiver(post_init, sender=Staff)
+@receiver(post_init, sender=Contract)
+def remember_counter_bucket(sender, instance, **kwargs):
+    COUNTED_MODELS[sender].remember(instance)
+
+@receiver(pre_save, sender=Staff)
+@receiver(pre_save, sender=Contract)
+def prepare_counter_bucket(sender, instance, raw=False, **kwargs):
+    if not raw:
+        COUNTED_MODELS[sender].prepare(instance)
+
+@receiver(post_save, sender=Staff)
 @receiver(post_save, sender=Contract)
-def on_contract_saved(sender, instance, **kwargs):
-    sync_staff_employment_status(instance.staff)
+def update_counter_bucket(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        COUNTED_MODELS[sender].saved(instance, created, update_fields)
+
+@receiver(post_delete, sender=Staff)
+@receiver(post_delete, sender=Contract)
+def release_counter_bucket(sender, instance, **kwargs):
+    COUNTED_MODELS[sender].deleted(instance)
+
+
+@receiver(post_save, sender=Staff)
+def index_staff_for_search(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Status-only saves leave the document alone
+    if raw or (update_fields and not set(update_fields) & set(SEARCH_FIELDS)):
+        return
+    index_staff(instance)
+
+@receiver(post_delete, sender=Staff)
+def unindex_staff_for_search(sender, instance, **kwargs):
+    unindex_staff(instance.pk)
 
+
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def refresh_typeahead(sender, instance, update_fields=None, **kwargs):
+    if sender is Staff and update_fields and not {f.removesuffix('_id') for f in update_fields} & set(TYPEAHEAD_FIELDS):
+        return
+    # Only once committed, so a rolled-back edit never lands in a rebuilt index
+    transaction.on_commit(invalidate_typeahead)
+
+
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Designation)
+@receiver(post_delete, sender=Designation)
+def refresh_cached_dropdowns(sender, instance, raw=False, update_fields=None, using=None, **kwargs):
+    # Staff only show up in the dropdowns as per-department counts
+    if raw or sender is Staff and update_fields and not {'department', 'department_id', 'employment_category'} & set(update_fields):
+        return
+    refresh_version(sender, using)
+
+
+@receiver(post_delete, sender=Staff)
 @receiver(post_delete, sender=Contract)
-def on_contract_deleted(sender, instance, **kwargs):
-    # If you ever delete/replace contracts, keep staff correct too
-    sync_staff_employment_status(instance.staff)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Designation)
+def leave_tombstone(sender, instance, **kwargs):
+    record_deletion(instance)
+
+
+@receiver(post_delete, sender=Group)
+def drop_admin_group_id(sender, instance, **kwargs):
+    if instance.name == 'Admin':
+        forget_admin_group()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def drop_cached_admin_role(sender, instance, action, reverse, pk_set, **kwargs):
+    # Group edits made outside Staff.save, e.g. in the Django admin
+    if action == 'pre_clear' and reverse:
+        # A group's members are cleared: pk_set is None, so read them first
+        for user_id in instance.user_set.values_list('pk', flat=True):
+            forget_admin_role(user_id)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        for user_id in (pk_set or ()) if reverse else [instance.pk]:
+            forget_admin_role(user_id)
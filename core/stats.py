@@ -0,0 +1,66 @@
+"""
+Dashboard card figures.
+
+The counts come from the materialized DashboardCounter buckets (see
+core.counters), so each helper is one small query over a handful of
+counter rows whatever the headcount. Every count also gets a
+"<name>_pct" share of the total, ready for the templates (percentages are
+rounded the same way as {% widthratio %}).
+"""
+from .counters import status_counts, department_counts
+
+
+def percentage(part, total):
+    return round(part * 100 / total) if total else 0
+
+
+def with_percentages(counts):
+    stats = dict(counts)
+    total = stats.get('total', 0)
+    for name, value in counts.items():
+        if name != 'total':
+            stats[f'{name}_pct'] = percentage(value, total)
+    return stats
+
+
+def group_counts(by_status, **groups):
+    """Total plus one count per keyword, each summing the listed statuses"""
+    counts = {'total': sum(by_status.values())}
+    for name, statuses in groups.items():
+        counts[name] = sum(by_status.get(status, 0) for status in statuses)
+    return with_percentages(counts)
+
+
+def staff_stats(category=None):
+    return group_counts(
+        status_counts('staff', category=category),
+        active=['ACTIVE'],
+        inactive=['INACTIVE'],
+        pending=['PENDING'],
+    )
+
+
+def contract_stats():
+    return group_counts(
+        status_counts('contract'),
+        active=['ACTIVE'],
+        inactive=['INACTIVE', 'EXPIRED'],
+        pending=['PENDING'],
+    )
+
+
+def payroll_stats(pay_month=None):
+    return group_counts(
+        status_counts('payroll', pay_month=pay_month),
+        pending=['PENDING'],
+        approved=['APPROVED'],
+        rejected=['REJECTED'],
+    )
+
+
+def with_staff_counts(departments, category=None):
+    """Set staff_count on each department from the counters"""
+    counts = department_counts('staff', category=category)
+    for department in departments:
+        department.staff_count = counts.get(department.pk, 0)
+    return departments
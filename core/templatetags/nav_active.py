@@ -8,3 +8,9 @@ def active(request, pattern):
     if request.path.startswith(pattern):
         return "active bg-gradient-dark text-white"
     return ""
+
+@register.filter
+def nav_section(path):
+    """First segment of a path ('/casuals/' for '/casuals/12/'), all the sidebar's active links look at."""
+    segment = path.strip('/').split('/', 1)[0]
+    return f"/{segment}/" if segment else "/"
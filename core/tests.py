@@ -1,3 +1,574 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from payroll.models import Payroll
+from .counters import CONTRACT_COUNTER, STAFF_COUNTER, rebuild_counters, status_counts, update_counted
+from .caching import departments_with_counts
+from .employment import expire_contracts, recompute_staff_ids
+from .forms import StaffForm
+from .imports import ImportFileError, import_staff
+from .indexplan import full_scans
+from .models import Department, Designation, Staff, Contract, DashboardCounter
+from .querybudget import query_budget, QueryBudgetExceeded
+from .roles import is_admin
+from .search import ranked_staff_ids, rebuild_search_index, search_filter
+from .typeahead import get_index, invalidate_typeahead
+from .stats import staff_stats, contract_stats, payroll_stats
+
+
+class DashboardFixturesMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Pharmacy', code='PHA')
+        cls.designation = Designation.objects.create(name='Pharmacist')
+        cls.admin = cls.make_staff('Admin', 'LOCUM', is_admin=True)
+        cls.locum = cls.make_staff('Locum', 'LOCUM')
+        cls.casual = cls.make_staff('Casual', 'CASUAL')
+        with cls.captureOnCommitCallbacks(execute=True):  # staff status is recomputed on commit
+            cls.contract = Contract.objects.create(
+                staff=cls.locum, contract_type='LOCUM', start_date=date(2024, 1, 1),
+                end_date=date(2099, 12, 31), salary=Decimal('50000.00'), job_title='Pharmacist',
+                department=cls.department,
+            )
+        cls.payroll = Payroll.objects.create(
+            staff=cls.locum, contract=cls.contract, pay_month=date(2025, 10, 1),
+            gross_salary=Decimal('50000.00'), bank_name='KCB', bank_branch='Nairobi Main',
+            bank_branch_code='011', account_no='1234567890',
+        )
+
+    @classmethod
+    def make_staff(cls, name, category, **kwargs):
+        index = Staff.objects.count() + 1
+        return Staff.objects.create(
+            first_name=name, last_name='Test', email=f'{name.lower()}@example.com', phone='0700000000',
+            gender='F', date_of_birth=date(1990, 1, 1), national_id=f'1000000{index}', address='Nairobi',
+            department=cls.department, designation=cls.designation,
+            employment_date=date(2024, 1, 1), employment_category=category, **kwargs
+        )
+
+    def setUp(self):
+        cache.clear()  # versioned entries and tokens cached by earlier, rolled-back tests
+        self.client.force_login(self.admin.user)
+
+
+class DashboardStatsTests(DashboardFixturesMixin, TestCase):
+    def test_staff_stats(self):
+        stats = staff_stats('LOCUM')
+        self.assertEqual(stats['total'], 2)
+        self.assertEqual(stats['active'], 1)
+        self.assertEqual(stats['active_pct'], 50)
+
+    def test_stats_use_one_query_each(self):
+        with self.assertNumQueries(1):
+            staff_stats()
+        with self.assertNumQueries(1):
+            contract_stats()
+        with self.assertNumQueries(1):
+            payroll_stats()
+
+
+class DashboardCounterTests(DashboardFixturesMixin, TestCase):
+    def test_counters_follow_status_changes(self):
+        self.assertEqual(status_counts('staff', category='LOCUM'), {'ACTIVE': 1, 'AWAITING CONTRACT': 1})
+        self.assertEqual(status_counts('payroll'), {'PENDING': 1})
+
+        self.payroll.approve(self.admin.user)
+        self.assertEqual(status_counts('payroll'), {'PENDING': 0, 'APPROVED': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contract.delete()
+        self.assertEqual(status_counts('contract').get('ACTIVE'), 0)
+        self.assertEqual(status_counts('staff', category='LOCUM').get('ACTIVE'), 0)
+        self.assertEqual(rebuild_counters(), 0)
+
+    def test_rebuild_fixes_drift(self):
+        DashboardCounter.objects.filter(scope='staff').update(count=0)
+        Staff.objects.filter(pk=self.casual.pk).update(employment_status='PENDING')
+        self.assertGreater(rebuild_counters(), 0)
+        self.assertEqual(staff_stats('CASUAL')['pending'], 1)
+        self.assertEqual(rebuild_counters(), 0)
+
+
+class ContractExpiryTests(DashboardFixturesMixin, TestCase):
+    def test_sweep_expires_contracts_and_recomputes_staff(self):
+        Contract.objects.create(
+            staff=self.casual, contract_type='CASUAL', start_date=date(2024, 1, 1),
+            end_date=date(2099, 12, 31), salary=Decimal('1000.00'), job_title='Casual',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Contract.objects.create(
+                staff=self.admin, contract_type='LOCUM', start_date=date(2024, 1, 1), status='RENEWED',
+                end_date=date(2099, 12, 31), salary=Decimal('1000.00'), job_title='Admin',
+            )
+        update_counted(STAFF_COUNTER, Staff.objects.filter(pk=self.admin.pk), employment_status='PENDING')
+        update_counted(CONTRACT_COUNTER, Contract.objects.filter(pk=self.contract.pk), status='PENDING')
+        self.assertEqual(expire_contracts(date(2100, 1, 1)), (2, 2))  # pending renewal expires too
+
+        statuses = dict(Staff.objects.values_list('pk', 'employment_status'))
+        self.assertEqual(statuses[self.locum.pk], 'EXPIRED')
+        self.assertEqual(statuses[self.casual.pk], 'INACTIVE')
+        self.assertEqual(statuses[self.admin.pk], 'PENDING')  # renewed contract not swept, left alone
+        self.assertEqual(status_counts('contract'), {'ACTIVE': 0, 'PENDING': 0, 'EXPIRED': 2, 'RENEWED': 1})
+        self.assertEqual(expire_contracts(date(2100, 1, 1)), (0, 0))
+        self.assertEqual(rebuild_counters(), 0)
+
+    def test_command_reports(self):
+        out = StringIO()
+        call_command('check_contract_expiry', stdout=out)
+        self.assertIn('0 marked as expired', out.getvalue())
+
+
+class DeferredStatusRecomputeTests(DashboardFixturesMixin, TestCase):
+    def test_recomputed_once_per_staff_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for i in range(5):
+                Contract.objects.create(
+                    staff=self.casual, contract_type='CASUAL', start_date=date(2024, 1, 1),
+                    end_date=date(2099, 12, 31), salary=Decimal('1000.00'), job_title=f'Shift {i}',
+                )
+            self.contract.status = 'TERMINATED'
+            self.contract.save()
+        self.assertEqual(Staff.objects.get(pk=self.casual.pk).employment_status, 'AWAITING CONTRACT')
+
+        # six callbacks, but one annotated read and one UPDATE per new status
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        staff_queries = [q['sql'].split(' ', 1)[0] for q in queries if '"core_staff" SET' in q['sql'] or 'AS "has_active"' in q['sql']]
+        self.assertEqual(staff_queries, ['SELECT', 'UPDATE', 'UPDATE'])
+        statuses = dict(Staff.objects.values_list('pk', 'employment_status'))
+        self.assertEqual(statuses[self.casual.pk], 'ACTIVE')
+        self.assertEqual(statuses[self.locum.pk], 'EXPIRED')
+        self.assertEqual(rebuild_counters(), 0)
+
+    def test_unchanged_staff_are_not_written(self):
+        self.assertEqual(recompute_staff_ids([self.locum.pk, self.admin.pk]), 1)  # admin has no contract
+        self.assertEqual(recompute_staff_ids([self.locum.pk, self.admin.pk]), 0)
+
+
+class StaffImportTests(DashboardFixturesMixin, TestCase):
+    CSV = (
+        "First Name,Last Name,Email,Phone,Gender,Date of Birth,National ID,Address,Department,"
+        "Designation,Employment Date,Employment Category,Is Admin\n"
+        "Amina,Import,amina@example.com,0711111111,F,1992-05-01,22-334455,Mombasa,pha,"
+        "pharmacist,2025-02-01,CASUAL,yes\n"
+        "Baraka,Import,baraka@example.com,12,M,1991-01-01,22334466,Kisumu,PHA,Surgeon,2025-02-01,LOCUM,\n"
+        "Chege,Import,locum@example.com,0722222222,M,1990-01-01,22334477,Nakuru,Pharmacy,"
+        "Pharmacist,2025-02-01,LOCUM,\n"
+        "Dama,Import,dama@example.com,0733333333,F,1993-03-03,22.334455,Nyeri,PHA,Pharmacist,2025-06-01,LOCUM,\n"
+    )
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        report = import_staff(io.BytesIO(self.CSV.encode()), 'staff.csv', workers=0)
+
+        self.assertEqual(report.created, 1)
+        self.assertEqual(sorted({(line, field) for line, field, _ in report.errors}), [
+            (3, 'designation'), (3, 'phone'), (4, 'email'), (5, 'unique_id'),
+        ])
+        staff = Staff.objects.select_related('user').get(email='amina@example.com')
+        self.assertEqual(staff.unique_id, 'MLKH223344552025')
+        self.assertTrue(staff.user.check_password('22-334455'))
+        self.assertTrue(staff.user.groups.filter(name='Admin').exists())
+        self.assertEqual(ranked_staff_ids('amina'), [staff.pk])
+        self.assertEqual(rebuild_counters(), 0)
+
+    def test_dry_run_and_bad_files(self):
+        report = import_staff(io.BytesIO(self.CSV.encode()), 'staff.csv', dry_run=True)
+        self.assertEqual(report.created, 1)
+        self.assertFalse(Staff.objects.filter(email='amina@example.com').exists())
+        with self.assertRaises(ImportFileError):
+            import_staff(io.BytesIO(b'first_name,email\nA,a@example.com\n'), 'staff.csv')
+        with self.assertRaises(ImportFileError):
+            import_staff(io.BytesIO(b''), 'staff.txt')
+
+    def test_admin_upload(self):
+        self.admin.user.is_staff = self.admin.user.is_superuser = True
+        self.admin.user.save()
+        upload = SimpleUploadedFile('staff.csv', self.CSV.encode(), content_type='text/csv')
+        with mock.patch('core.imports.ProcessPoolExecutor') as pool:
+            response = self.client.post(reverse('admin:core_staff_import'), {'file': upload})
+        pool.assert_not_called()  # no worker processes inside a web request
+        self.assertContains(response, 'Imported 1 staff (3 rows rejected)')
+        self.assertContains(response, 'Unknown designation')
+
+
+class StaffSaveTests(DashboardFixturesMixin, TestCase):
+    def test_status_only_save_is_one_update(self):
+        staff = Staff.objects.get(pk=self.casual.pk)
+        staff.employment_status = 'PENDING'
+        with CaptureQueriesContext(connection) as queries:
+            staff.save(update_fields=['employment_status'])
+        self.assertEqual([q['sql'].split(' ', 1)[0] for q in queries if 'core_staff"' in q['sql']], ['UPDATE'])
+        self.assertFalse([q for q in queries if 'auth_' in q['sql']])
+
+    def test_user_and_group_follow_changes(self):
+        staff = Staff.objects.get(pk=self.casual.pk)
+        staff.last_name = 'Renamed'
+        staff.is_admin = True
+        staff.save()
+        user = staff.user
+        user.refresh_from_db()
+        self.assertEqual(user.last_name, 'Renamed')
+        self.assertTrue(user.groups.filter(name='Admin').exists())
+
+        staff.phone = '0799999999'
+        with CaptureQueriesContext(connection) as queries:
+            staff.save()
+        self.assertFalse([q for q in queries if 'auth_' in q['sql']])
+
+        staff.is_admin = False
+        staff.save()
+        self.assertFalse(user.groups.filter(name='Admin').exists())
+
+
+class AdminRoleTests(DashboardFixturesMixin, TestCase):
+    def test_per_process_cache_is_not_trusted_across_requests(self):
+        user = User.objects.get(pk=self.casual.user_id)
+        self.assertFalse(is_admin(user))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_admin(user))  # on the user object for the rest of the request
+        with self.assertNumQueries(1):
+            self.assertFalse(is_admin(User(pk=self.casual.user_id)))  # a new request asks the database
+
+    def test_role_is_cached_in_a_shared_cache_and_dropped_on_change(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+        with override_settings(CACHES=shared):
+            user = User.objects.get(pk=self.casual.user_id)
+            self.assertFalse(is_admin(user))
+            with self.assertNumQueries(0):
+                self.assertFalse(is_admin(User(pk=self.casual.user_id)))  # from the cache
+
+            staff = Staff.objects.get(pk=self.casual.pk)
+            staff.is_admin = True
+            staff.save()
+            self.assertTrue(is_admin(User.objects.get(pk=self.casual.user_id)))
+
+            user.groups.clear()
+            self.assertFalse(is_admin(User.objects.get(pk=self.casual.user_id)))
+
+            admins = Group.objects.get(name='Admin')
+            user.groups.add(admins)
+            self.assertTrue(is_admin(User.objects.get(pk=self.casual.user_id)))
+            admins.user_set.clear()
+            self.assertFalse(is_admin(User.objects.get(pk=self.casual.user_id)))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        self.client.logout()
+        response = self.client.post(reverse('accounts:signin'), {'staff_id': self.admin.unique_id, 'password': self.admin.national_id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get(reverse('core:staff_list')).status_code, 200)
+
+
+class CachedDropdownTests(DashboardFixturesMixin, TestCase):
+    def test_departments_cached_until_a_change_commits(self):
+        self.assertEqual([d.staff_count for d in departments_with_counts()], [3])
+        with self.assertNumQueries(0):
+            self.assertEqual([d.staff_count for d in departments_with_counts()], [3])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_staff('Extra', 'CASUAL')
+            Department.objects.create(name='Accounts', code='ACC')
+        self.assertEqual([(d.code, d.staff_count) for d in departments_with_counts()], [('ACC', 0), ('PHA', 4)])
+
+    def test_form_choices_follow_designations(self):
+        self.assertEqual(list(StaffForm().fields['designation'].choices)[1:], [(self.designation.pk, 'Pharmacist')])
+        with self.captureOnCommitCallbacks(execute=True):
+            nurse = Designation.objects.create(name='Nurse')
+        choices = list(StaffForm().fields['designation'].choices)
+        self.assertIn((nurse.pk, 'Nurse'), choices)
+
+        form = StaffForm({'department': self.department.pk, 'designation': 0})
+        form.is_valid()
+        self.assertIn('designation', form.errors)  # the queryset still validates
+
+    def test_sidebar_fragment_varies_on_role(self):
+        contracts_link = reverse('core:contracts')
+        self.assertContains(self.client.get(reverse('core:billing')), contracts_link)
+        self.client.force_login(self.casual.user)
+        self.assertNotContains(self.client.get(reverse('core:billing')), contracts_link)
+
+
+class KeysetPaginationTests(DashboardFixturesMixin, TestCase):
+    def test_cursors_walk_every_row_once(self):
+        for i in range(4):
+            self.make_staff(f'Extra{i}', 'LOCUM')
+        expected = list(Staff.objects.order_by('unique_id').values_list('unique_id', flat=True))
+
+        seen, query = [], '?per_page=2'
+        while query:
+            response = self.client.get(reverse('core:staff_list') + query)
+            page = response.context['staff_list']
+            seen.extend(s.unique_id for s in page)
+            query = page.next_query
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(reverse('core:staff_list') + page.previous_query)
+        self.assertEqual([s.unique_id for s in response.context['staff_list']], expected[-3:-1])
+
+    def test_header_shows_the_filtered_total(self):
+        for i in range(3):
+            self.make_staff(f'Extra{i}', 'LOCUM')
+        response = self.client.get(reverse('core:locumdash'), {'per_page': 2})
+        self.assertEqual(len(response.context['staff_list']), 2)
+        self.assertContains(response, '5</span> Locumers')
+        response = self.client.get(reverse('core:locumdash'), {'per_page': 2, 'search': 'extra1'})
+        self.assertContains(response, '1</span> Locumers')
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('core:contracts'), {'after': 'not-a-cursor'})
+        self.assertEqual(list(response.context['contracts']), [self.contract])
+
+
+class StaffSearchTests(DashboardFixturesMixin, TestCase):
+    def search(self, query, field='pk', queryset=None):
+        queryset = Staff.objects.all() if queryset is None else queryset
+        return set(queryset.filter(search_filter(query, field)))
+
+    def test_matches_names_ids_and_email(self):
+        self.assertEqual(self.search('casual'), {self.casual})
+        self.assertEqual(self.search('LOCUM test'), {self.locum})
+        self.assertEqual(self.search(self.admin.unique_id.lower()), {self.admin})
+        self.assertEqual(self.search('@example.com'), {self.admin, self.locum, self.casual})
+        self.assertEqual(self.search('zz'), set())
+
+    def test_index_follows_saves_and_rebuild(self):
+        self.casual.first_name = 'Zoë'
+        self.casual.save()
+        self.assertEqual(self.search('zoe'), {self.casual})
+        self.assertEqual(self.search('ZOË'), {self.casual})
+        self.assertEqual(rebuild_search_index(), 3)
+        self.assertEqual(ranked_staff_ids('zoe'), [self.casual.pk])
+
+    def test_related_querysets_and_dashboard(self):
+        self.assertEqual(self.search('locum', 'staff_id', Contract.objects.all()), {self.contract})
+        response = self.client.get(reverse('core:contracts'), {'search': 'locum'})
+        self.assertEqual(list(response.context['contracts']), [self.contract])
+        response = self.client.get(reverse('payroll:payroll_dash'), {'search': 'casual'})
+        self.assertEqual(list(response.context['payroll']), [])
+
+
+class StaffTypeaheadTests(DashboardFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        invalidate_typeahead()  # the process-wide index outlives each test's rollback
+
+    def search(self, query):
+        response = self.client.get(reverse('core:staff_search_api'), {'q': query})
+        return [r['unique_id'] for r in response.json()['results']]
+
+    def test_prefix_matches(self):
+        self.assertEqual(self.search('cas'), [self.casual.unique_id])
+        self.assertEqual(self.search('test lo'), [self.locum.unique_id])
+        self.assertEqual(self.search(self.admin.national_id[:6]), sorted(
+            s.unique_id for s in (self.admin, self.locum, self.casual)
+        ))
+        self.assertEqual(self.search('asual'), [])
+        result = self.client.get(reverse('core:staff_search_api'), {'q': 'cas'}).json()['results'][0]
+        self.assertEqual(result, {'unique_id': self.casual.unique_id, 'full_name': 'Casual Test', 'department': 'Pharmacy'})
+
+    def test_index_refreshes_on_save_and_caches_results(self):
+        self.assertEqual(self.search('cas'), [self.casual.unique_id])
+        index = get_index()
+        self.assertIn(('cas', 10), index.results)
+
+        self.casual.first_name = 'Wanjiru'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.casual.save()
+        self.assertEqual(self.search('wanj'), [self.casual.unique_id])
+        self.assertIsNot(get_index(), index)
+
+    def test_other_processes_pick_up_changes_once_their_token_expires(self):
+        self.assertEqual(self.search('cas'), [self.casual.unique_id])
+        # Written elsewhere: no signal here, only the watermark moves
+        Staff.objects.filter(pk=self.casual.pk).update(first_name='Wanjiru', updated_at=timezone.now())
+        self.assertEqual(self.search('wanj'), [])
+        cache.clear()  # the version tokens expire
+        self.assertEqual(self.search('wanj'), [self.casual.unique_id])
+
+        # Status-only saves keep the built index
+        index = get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Contract.objects.create(
+                staff=self.casual, contract_type='CASUAL', start_date=date(2024, 1, 1),
+                end_date=date(2099, 12, 31), salary=Decimal('1000.00'), job_title='Porter',
+            )
+        self.assertIs(get_index(), index)
+
+
+class StaffApiV2Tests(DashboardFixturesMixin, TestCase):
+    def get(self, **params):
+        response = self.client.get(reverse('core:staff_api_v2'), params)
+        body = b''.join(response.streaming_content).decode() if response.streaming else response.content.decode()
+        return response, body
+
+    def test_ndjson_pages_cover_every_staff_once(self):
+        seen, params = [], {'limit': 2, 'fields': 'id,name,designation'}
+        while True:
+            response, body = self.get(**params)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            seen.extend(json.loads(line) for line in body.splitlines())
+            if 'X-Next-Cursor' not in response:
+                break
+            params['after'] = response['X-Next-Cursor']
+        self.assertEqual([r['id'] for r in seen], sorted(s.unique_id for s in Staff.objects.all()))
+        self.assertEqual(seen[0]['designation'], 'Pharmacist')
+        self.assertEqual(set(seen[0]), {'id', 'name', 'designation'})
+
+    def test_json_format_and_filters(self):
+        response, body = self.get(format='json', category='CASUAL', updated_since='2000-01-01')
+        data = json.loads(body)
+        self.assertEqual([r['id'] for r in data['results']], [self.casual.unique_id])
+        self.assertIsNone(data['next'])
+
+    def test_admins_only(self):
+        self.client.force_login(self.casual.user)
+        self.assertEqual(self.get(fields='id,phone,email')[0].status_code, 302)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get(fields='id,kra_pin')[0].status_code, 400)
+        self.assertEqual(self.get(updated_since='yesterday')[0].status_code, 400)
+        self.assertEqual(self.get(after='@@')[0].status_code, 400)
+
+
+class ChangeFeedTests(DashboardFixturesMixin, TestCase):
+    def poll(self, feed='staff', **params):
+        response = self.client.get(reverse('core:change_feed', args=[feed]), params)
+        return response, (json.loads(response.content) if response.status_code == 200 else None)
+
+    def test_watermark_returns_only_later_changes(self):
+        seen, params = [], {'limit': 2}
+        while True:
+            response, data = self.poll(**params)
+            seen.extend(row['unique_id'] for row in data['changes'])
+            params['since'] = data['watermark']
+            if not data['has_more']:
+                break
+        self.assertCountEqual(seen, Staff.objects.values_list('unique_id', flat=True))
+
+        self.assertEqual(self.poll(**params)[1]['changes'], [])
+        self.casual.first_name = 'Renamed'
+        self.casual.save()
+        data = self.poll(**params)[1]
+        self.assertEqual([row['first_name'] for row in data['changes']], ['Renamed'])
+
+    def test_deletes_leave_tombstones(self):
+        since = self.poll('contracts')[1]['watermark']
+        contract_id = self.contract.pk
+        self.contract.delete()
+        data = self.poll('contracts', since=since)[1]
+        self.assertEqual(data['deleted'], [str(contract_id)])
+        self.assertEqual(self.poll('contracts', since=data['watermark'])[1]['deleted'], [])
+
+    def test_etag_and_errors(self):
+        response, _ = self.poll()
+        again = self.client.get(reverse('core:change_feed', args=['staff']), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.assertEqual(self.poll('payslips')[0].status_code, 404)
+        self.assertEqual(self.poll(since='@@')[0].status_code, 400)
+
+    def test_admins_only_and_no_credentials(self):
+        row = self.poll()[1]['changes'][0]
+        for field in ('national_id', 'default_password', 'user_id'):
+            self.assertNotIn(field, row)
+        self.client.force_login(self.casual.user)
+        self.assertEqual(self.poll()[0].status_code, 302)
+
+
+class IndexPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn('queries use an index', out.getvalue())
+
+    def test_full_scan_detection(self):
+        self.assertEqual(full_scans('2 0 0 SCAN core_staff\n5 0 0 SCAN CONSTANT ROW', 'sqlite'), ['core_staff'])
+        self.assertEqual(full_scans('SEARCH core_staff USING INDEX staff_status_seek_idx (employment_status=?)', 'sqlite'), [])
+        self.assertEqual(full_scans('Seq Scan on core_contract  (cost=0.00..1.01 rows=1)', 'postgresql'), ['core_contract'])
+
+
+class DashboardQueryCountTests(DashboardFixturesMixin, TestCase):
+    """Row loops must not add queries: every page is checked with several rows of each kind"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(3):
+            staff = cls.make_staff(f'Row{i}', 'LOCUM' if i % 2 else 'CASUAL')
+            contract = Contract.objects.create(
+                staff=staff, contract_type=staff.employment_category, start_date=date(2024, 1, 1),
+                end_date=date(2099, 12, 31), salary=Decimal('40000.00'), job_title='Pharmacist',
+                department=cls.department,
+            )
+            Payroll.objects.create(
+                staff=staff, contract=contract, pay_month=date(2025, 10, 1),
+                gross_salary=Decimal('40000.00'), bank_name='KCB', bank_branch='Nairobi Main',
+                bank_branch_code='011', account_no=f'12345678{i}',
+            )
+
+    def assertPageQueries(self, num, url):
+        self.client.get(url)  # counted warm: the first request fills the cached dropdowns
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_staff_list(self):
+        self.assertPageQueries(5, reverse('core:staff_list'))
+
+    def test_locum_dashboard(self):
+        self.assertPageQueries(5, reverse('core:locumdash'))
+
+    def test_casual_dashboard(self):
+        self.assertPageQueries(5, reverse('core:casuals'))
+
+    def test_contracts(self):
+        self.assertPageQueries(5, reverse('core:contracts'))
+
+    def test_payroll_dashboard(self):
+        self.assertPageQueries(5, reverse('payroll:payroll_dash'))
+
+    def test_department_staff(self):
+        self.assertPageQueries(4, reverse('core:department_staff', args=[self.department.pk]))
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        @query_budget(1)
+        def view(request):
+            list(Department.objects.all())
+            list(Designation.objects.all())
+            return HttpResponse()
+
+        self.view = view
+        self.request = RequestFactory().get('/')
+
+    def test_over_budget_fails_when_strict(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.view(self.request)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_over_budget_logs_otherwise(self):
+        with self.assertLogs('core.querybudget', 'WARNING') as logs:
+            self.view(self.request)
+        self.assertIn('ran 2 queries, over its budget of 1', logs.output[0])
@@ -0,0 +1,141 @@
+"""
+In-memory prefix index for the staff typeahead.
+
+Each process keeps a sorted array of (token, staff id) pairs built from the
+normalized name parts and unique_id of every staff member, and answers a
+prefix with a bisect plus a forward scan. The index is built lazily on the
+first lookup and tagged with the Staff and Department version tokens of
+core.caching, which fall back to a database watermark and expire after
+VERSION_TIMEOUT. Once a Staff or Department change commits (see
+core.signals) this process drops its index and replaces the tokens; other
+processes rebuild when the shared cache carries the new tokens, or at the
+latest once their own tokens expire. Results are memoized per normalized
+query in a bounded LRU that lives and dies with the index it was computed
+from.
+"""
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from .caching import model_versions, refresh_version
+from .models import Department, Staff
+from .search import normalize, search_terms
+
+TYPEAHEAD_FIELDS = ('first_name', 'middle_name', 'last_name', 'unique_id', 'department')
+ID_PREFIX = 'mlkh'  # unique_id = MLKH + national id + year
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+RESULT_CACHE_SIZE = 512
+
+_lock = threading.Lock()
+_index = None
+
+
+def entry_tokens(entry):
+    tokens = set(normalize(entry['full_name']).split())
+    unique_id = normalize(entry['unique_id'])
+    tokens.add(unique_id)
+    if unique_id.startswith(ID_PREFIX):
+        tokens.add(unique_id[len(ID_PREFIX):])  # so typing the national id works too
+    return tokens
+
+
+class PrefixIndex:
+    """Sorted token array over every staff member plus an LRU of recent answers"""
+
+    def __init__(self, entries, version):
+        self.entries = entries  # staff id -> result dict
+        self.entry_tokens = {staff_id: entry_tokens(entry) for staff_id, entry in entries.items()}
+        pairs = sorted((token, staff_id) for staff_id, tokens in self.entry_tokens.items() for token in tokens)
+        self.tokens = [token for token, _ in pairs]
+        self.staff_ids = [staff_id for _, staff_id in pairs]
+        self.version = version
+        self.results = OrderedDict()
+        self.results_lock = threading.Lock()
+
+    def prefix_ids(self, prefix):
+        """Staff ids with a token starting with prefix, in token order"""
+        i = bisect_left(self.tokens, prefix)
+        while i < len(self.tokens) and self.tokens[i].startswith(prefix):
+            yield self.staff_ids[i]
+            i += 1
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        key = (' '.join(terms), limit)
+        with self.results_lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                return self.results[key]
+
+        # Scan the longest (most selective) term; every other term has to
+        # prefix one of the candidate's own tokens
+        driver = max(terms, key=len)
+        others = list(terms)
+        others.remove(driver)
+        matches = []
+        seen = set()
+        for staff_id in self.prefix_ids(driver):
+            if staff_id in seen or not all(
+                any(token.startswith(term) for token in self.entry_tokens[staff_id]) for term in others
+            ):
+                continue
+            seen.add(staff_id)
+            matches.append(self.entries[staff_id])
+            if len(matches) >= limit:
+                break
+
+        with self.results_lock:
+            self.results[key] = matches
+            if len(self.results) > RESULT_CACHE_SIZE:
+                self.results.popitem(last=False)
+        return matches
+
+
+def get_index_version():
+    return ':'.join(model_versions(Staff, Department))
+
+
+def invalidate_typeahead():
+    """Drop this process's index and move the version tokens on for the others"""
+    global _index
+    with _lock:
+        _index = None
+    refresh_version(Staff)
+    refresh_version(Department)
+
+
+def build_index(version):
+    rows = Staff.objects.values_list(
+        'pk', 'unique_id', 'first_name', 'middle_name', 'last_name', 'department__name'
+    ).order_by()
+    entries = {}
+    for pk, unique_id, first_name, middle_name, last_name, department in rows:
+        entries[pk] = {
+            'unique_id': unique_id,
+            'full_name': ' '.join(part for part in (first_name, middle_name, last_name) if part),
+            'department': department,
+        }
+    return PrefixIndex(entries, version)
+
+
+def get_index():
+    """Return the process's prefix index, rebuilding it if the version has moved on"""
+    global _index
+
+    version = get_index_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = build_index(version)
+        return _index
+
+
+def search_typeahead(query, limit=DEFAULT_LIMIT):
+    limit = max(1, min(limit, MAX_LIMIT))
+    return get_index().search(query, limit)
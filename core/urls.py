@@ -13,6 +13,9 @@ urlpatterns = [
     path('<str:unique_id>/update/', views.staff_update, name='staff_update'),
     path('department/<int:dept_id>/', views.department_staff, name='department_staff'),
     path('api/staff/', views.staff_api, name='staff_api'),
+    path('api/staff/search/', views.staff_search_api, name='staff_search_api'),
+    path('api/v2/staff/', views.staff_api_v2, name='staff_api_v2'),
+    path('api/changes/<str:feed>/', views.change_feed, name='change_feed'),
     path('staff/<str:unique_id>/delete/', views.delete_staff, name='delete_staff'),
     path('staff/<str:unique_id>/contract/create/', views.contract_create, name='contract_create'),
     path('contracts/', views.contracts, name='contracts'),
@@ -1,10 +1,18 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from .models import Staff, Department, Contract, ContractRenewal
 from payroll.models import Payroll
 from .forms import StaffForm, ContractForm
+from .stats import staff_stats, contract_stats
+from .caching import department_list, departments_with_counts
+from .pagination import keyset_paginate, STAFF_ORDERING, CONTRACT_ORDERING
+from .querybudget import query_budget
+from .roles import is_admin
+from .search import search_filter
+from .typeahead import search_typeahead, DEFAULT_LIMIT
+from .api import parse_fields, parse_limit, filter_staff, next_cursor, staff_rows, stream_json, stream_ndjson
+from . import changes
 from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
@@ -18,9 +26,8 @@ from django.views.decorators.http import require_http_methods
 from django.views.generic import CreateView, UpdateView
 from django.urls import reverse_lazy
 
-def is_admin(user):
-    return user.groups.filter(name='Admin').exists()
 
+@query_budget(10)
 def lcdash(request):
     # Get query parameters
     search_query = request.GET.get('search', '')
@@ -28,21 +35,11 @@ def lcdash(request):
     status = request.GET.get('status', '')
 
     # Base queryset
-    staff = Staff.objects.filter(employment_category='LOCUM')
-    total = staff
-    present = staff.filter(employment_status='ACTIVE')
-    on_leave = staff.filter(employment_status='INACTIVE')
+    staff = Staff.objects.filter(employment_category='LOCUM').select_related('department', 'designation')
 
-    # Apply search filter (Name, ID, Email, KRA PIN)
+    # Apply search filter (Name, ID, Email)
     if search_query:
-        staff = staff.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(middle_name__icontains=search_query) |
-            Q(unique_id__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(kra_pin__icontains=search_query)
-        )
+        staff = staff.filter(search_filter(search_query))
 
     # Apply department filter
     if department_id:
@@ -53,20 +50,19 @@ def lcdash(request):
         staff = staff.filter(employment_status=status)
 
     # Get departments with staff count for filter dropdown
-    departments = Department.objects.annotate(staff_count=Count('staff_members'))
+    departments = departments_with_counts()
 
     context = {
-        'staff_list': staff,
-        'total': total,
+        'staff_list': keyset_paginate(request, staff, STAFF_ORDERING),
+        'stats': staff_stats('LOCUM'),
         'departments': departments,
         'search_query': search_query,
         'current_dept': department_id,
         'current_status': status,
-        'leave': on_leave,
-        'present': present,
     }
     return render(request, 'dashboard.html', context)
 
+@query_budget(10)
 def cdash(request):
     # Get query parameters
     search_query = request.GET.get('search', '')
@@ -74,21 +70,11 @@ def cdash(request):
     status = request.GET.get('status', '')
 
     # Base queryset
-    staff = Staff.objects.filter(employment_category='CASUAL')
-    total = staff
-    present = staff.filter(employment_status='ACTIVE')
-    on_leave = staff.filter(employment_status='INACTIVE')
+    staff = Staff.objects.filter(employment_category='CASUAL').select_related('department', 'designation')
 
-    # Apply search filter (Name, ID, Email, KRA PIN)
+    # Apply search filter (Name, ID, Email)
     if search_query:
-        staff = staff.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(middle_name__icontains=search_query) |
-            Q(unique_id__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(kra_pin__icontains=search_query)
-        )
+        staff = staff.filter(search_filter(search_query))
 
     # Apply department filter
     if department_id:
@@ -99,20 +85,19 @@ def cdash(request):
         staff = staff.filter(employment_status=status)
 
     # Get departments with staff count for filter dropdown
-    departments = Department.objects.annotate(staff_count=Count('staff_members'))
+    departments = departments_with_counts()
 
     context = {
-        'staff_list': staff,
-        'total': total,
+        'staff_list': keyset_paginate(request, staff, STAFF_ORDERING),
+        'stats': staff_stats('CASUAL'),
         'departments': departments,
         'search_query': search_query,
         'current_dept': department_id,
         'current_status': status,
-        'leave': on_leave,
-        'present': present,
     }
     return render(request, 'casualdash.html', context)
 
+@query_budget(10)
 def contracts(request):
     # Get filter parameters
     search_query = request.GET.get('search', '')
@@ -120,18 +105,11 @@ def contracts(request):
     status = request.GET.get('status', '')
 
     # Start with all contracts
-    contracts = Contract.objects.all().order_by('-start_date')
+    contracts = Contract.objects.select_related('staff').order_by('-start_date')
 
     # Apply search filter
     if search_query:
-        contracts = contracts.filter(
-            Q(staff__first_name__icontains=search_query) |
-            Q(staff__middle_name__icontains=search_query) |
-            Q(staff__last_name__icontains=search_query) |
-            Q(staff__unique_id__icontains=search_query) |
-            Q(staff__email__icontains=search_query) |
-            Q(staff__kra_pin__icontains=search_query)
-        )
+        contracts = contracts.filter(search_filter(search_query, 'staff_id'))
 
     # Apply department filter
     if department_id:
@@ -141,45 +119,30 @@ def contracts(request):
     if status:
         contracts = contracts.filter(status=status)
 
-    # Dashboard card querysets (unfiltered)
-    active = Contract.objects.filter(status='ACTIVE')
-    inactive = Contract.objects.filter(status__in=['INACTIVE', 'EXPIRED'])
-    pending_renewal = Contract.objects.filter(status='PENDING')
-
     # Get all departments for dropdown
-    departments = Department.objects.all()
+    departments = department_list()
 
     context = {
-        'contracts': contracts,
+        'contracts': keyset_paginate(request, contracts, CONTRACT_ORDERING),
+        'stats': contract_stats(),  # Dashboard cards (unfiltered)
         'departments': departments,
         'search_query': search_query,
         'current_dept': department_id,
         'current_status': status,
-        'active': active,
-        'inactive': inactive,
-        'pending_renewal': pending_renewal,
     }
     return render(request, 'contracts.html', context)
 
+@query_budget(10)
 @login_required
 def staff_list(request):
     search_query = request.GET.get('search', '')
     department_id = request.GET.get('department', '')
     status = request.GET.get('status', '')
 
-    staff = Staff.objects.all()
-    active = staff.filter(employment_status='ACTIVE')
-    inactive = staff.filter(employment_status='INACTIVE')
+    staff = Staff.objects.select_related('department', 'designation')
 
     if search_query:
-        staff = staff.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(middle_name__icontains=search_query) |
-            Q(unique_id__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(kra_pin__icontains=search_query)
-        )
+        staff = staff.filter(search_filter(search_query))
 
     if department_id:
         staff = staff.filter(department__id=department_id)
@@ -187,12 +150,11 @@ def staff_list(request):
     if status:
         staff = staff.filter(employment_status=status)
 
-    departments = Department.objects.annotate(staff_count=Count('staff_members'))
+    departments = departments_with_counts()
 
     context = {
-        'staff_list': staff,
-        'active': active,
-        'inactive': inactive,
+        'staff_list': keyset_paginate(request, staff, STAFF_ORDERING),
+        'stats': staff_stats(),
         'departments': departments,
         'search_query': search_query,
         'current_dept': department_id,
@@ -244,6 +206,7 @@ def staff_update(request, unique_id):
         'title': f'Update {staff.full_name}'
     })
 
+@query_budget(10)
 @login_required
 def department_staff(request, dept_id):
     department = get_object_or_404(Department, id=dept_id)
@@ -251,24 +214,96 @@ def department_staff(request, dept_id):
     
     return render(request, 'department_staff.html', {
         'department': department,
-        'staff_list': staff_list
+        'staff_list': keyset_paginate(request, staff_list, STAFF_ORDERING)
     })
 
 @login_required
 def staff_api(request):
     if request.method == 'GET':
         staff_data = []
-        for staff in Staff.objects.select_related('department'):
+        for staff in Staff.objects.select_related('department', 'designation'):
             staff_data.append({
                 'id': staff.unique_id,
                 'name': staff.full_name,
                 'department': staff.department.name,
-                'designation': staff.designation,
+                'designation': staff.designation.name,
                 'status': staff.employment_status,
                 'employment_date': staff.employment_date.strftime('%Y-%m-%d')
             })
         return JsonResponse({'staff': staff_data})
 
+@query_budget(5)
+@login_required
+@user_passes_test(is_admin)
+def staff_api_v2(request):
+    """
+    Streamed staff export, one page per request, for admins.
+
+    ?fields=id,name,... picks the columns, department/status/category/
+    updated_since filter, limit sets the page size and after= takes the
+    cursor from the previous page's X-Next-Cursor header (or "next" in
+    format=json). The default format is NDJSON.
+    """
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        limit = parse_limit(request.GET.get('limit'))
+        staff = filter_staff(Staff.objects.all(), request.GET)
+        cursor = next_cursor(staff, limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    rows = staff_rows(staff, fields, limit)
+    if request.GET.get('format') == 'json':
+        response = StreamingHttpResponse(stream_json(rows, cursor), content_type='application/json')
+    else:
+        response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+    if cursor:
+        query = request.GET.copy()
+        query['after'] = cursor
+        response['X-Next-Cursor'] = cursor
+        response['Link'] = f'<{request.path}?{query.urlencode()}>; rel="next"'
+    return response
+
+@query_budget(5)
+@login_required
+def staff_search_api(request):
+    """Typeahead matches for ?q= from the in-memory prefix index"""
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    return JsonResponse({'query': query, 'results': search_typeahead(query, limit)})
+
+@query_budget(5)
+@login_required
+@user_passes_test(is_admin)
+def change_feed(request, feed):
+    """
+    Delta sync: rows changed and ids deleted since ?since=, the watermark
+    returned by the previous poll (omit it for a full sync). Keep polling
+    while has_more is true. Sends a strong ETag and answers a matching
+    If-None-Match with 304.
+    """
+    if feed not in changes.CHANGE_FEEDS:
+        return JsonResponse({'error': f'Unknown feed: {feed}'}, status=404)
+    try:
+        limit = int(request.GET.get('limit', changes.DEFAULT_LIMIT))
+        data = changes.read_feed(feed, request.GET.get('since'), limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    body = changes.feed_body(data)
+    etag = changes.strong_etag(body)
+    if changes.etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['X-Watermark'] = data['watermark']
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 @login_required
 @user_passes_test(is_admin)
 @require_POST
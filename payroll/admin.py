@@ -1,19 +1,32 @@
 from django.contrib import admin, messages
 from django.shortcuts import redirect
-from .models import Deduction, ContractDeduction, Payroll
+from .models import Deduction, ContractDeduction, Payroll, PayrollLine
 from django.utils.html import format_html
 
 # Register your models here.
+class PayrollLineInline(admin.TabularInline):
+    """Deduction lines as computed when the payslip was saved; not editable"""
+    model = PayrollLine
+    extra = 0
+    fields = ['kind', 'name', 'basis', 'rate', 'amount']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Payroll)
 class PayrollAdmin(admin.ModelAdmin):
+    inlines = [PayrollLineInline]
     list_display = [
         'staff_name', 'pay_period_start', 'pay_period_end', 'id', 'pay_month',
         'gross_salary', 'total_deductions', 'net_salary', 'generated_at',
-        'staff_national_id', 'staff_unique_id', 'status', 'approved_by', "approved_at"
+        'staff_national_id', 'staff_unique_id', 'status', 'approved_by', "approved_at", 'pdf_status'
     ]
-    list_filter = ['pay_period_start', 'pay_period_end']
+    list_filter = ['pay_period_start', 'pay_period_end', 'pdf_status']
     search_fields = ['staff__full_name', 'contract__job_title']
-    readonly_fields = ['total_deductions', 'net_salary', 'generated_at', 'pay_period_start', 'pay_period_end']
+    readonly_fields = ['total_deductions', 'net_salary', 'generated_at', 'pay_period_start', 'pay_period_end', 'pdf_status', 'pdf_error']
 
     def approve_btn(self, obj):
         if obj.status != "APPROVED":
@@ -0,0 +1,130 @@
+"""
+Whole-month payslip bundles, as a ZIP archive or one merged PDF.
+
+Both formats are built from the pdf_file blobs already in storage, one
+payslip at a time. The ZIP is yielded in chunks as it is written, so it
+never sits in memory in full. The merged PDF is not that lean: pypdf's
+writer keeps the parsed pages of every payslip until the file is written
+(one small page per payslip, a few tens of KB each), so the web view only
+merges up to MAX_MERGED_PAYSLIPS and larger months go through the ZIP or
+the export_payslips command.
+
+Payslips without a current PDF are queued on the render_payslip_pdf task
+from a request (queue_missing_renders), and rendered in a bounded process
+pool by the export command (ensure_rendered).
+"""
+import tempfile
+import zipfile
+
+from django.conf import settings
+
+from .models import Payroll
+from .rendering import render_payslips
+from .tasks import queue_payslip_pdf
+
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_RENDER_WORKERS = getattr(settings, 'PAYSLIP_BUNDLE_RENDER_WORKERS', 2)
+MAX_MERGED_PAYSLIPS = getattr(settings, 'PAYSLIP_BUNDLE_MAX_MERGED', 500)
+
+
+def get_bundle_payslips(pay_month, department=None, status=None):
+    payslips = Payroll.objects.filter(pay_month=pay_month).select_related('staff').order_by('staff__unique_id')
+    if department:
+        payslips = payslips.filter(staff__department_id=department)
+    if status:
+        payslips = payslips.filter(status=status)
+    return payslips
+
+
+def is_rendered(payroll):
+    return bool(payroll.pdf_file) and payroll.pdf_status == 'READY'
+
+
+def queue_missing_renders(payslips):
+    """Queue a render for every payslip without a ready PDF; returns those payslips"""
+    missing = [p for p in payslips if not is_rendered(p)]
+    for payroll in missing:
+        queue_payslip_pdf(payroll)  # no-op when this version is already queued
+    return missing
+
+
+def ensure_rendered(payslips, workers=DEFAULT_RENDER_WORKERS):
+    """Render any payslip without a ready PDF in a process pool, then return the refreshed list"""
+    missing = [p.pk for p in payslips if not is_rendered(p)]
+    if missing:
+        render_payslips(missing, workers=workers)
+        payslips = payslips.all()  # re-evaluate to pick up the new files
+    return [p for p in payslips if p.pdf_file]
+
+
+def bundle_filename(payroll):
+    return f"payslip_{payroll.staff.unique_id}_{payroll.pay_month:%Y_%m}.pdf"
+
+
+def iter_file(fileobj, chunk_size=STREAM_CHUNK_SIZE):
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class StreamBuffer:
+    """Write-only sink for zipfile whose contents are drained after every write"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(payslips, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a ZIP archive of the payslip PDFs, one chunk at a time"""
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for payroll in payslips:
+            with payroll.pdf_file.open('rb') as source, archive.open(bundle_filename(payroll), 'w') as entry:
+                for chunk in iter_file(source, chunk_size):
+                    entry.write(chunk)
+                    yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def write_merged_pdf(payslips, output):
+    """
+    Append every payslip's pages to output, reading one source file at a time.
+
+    The pages are held by the writer until the end, see the module docstring.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for payroll in payslips:
+        with payroll.pdf_file.open('rb') as source:
+            reader = PdfReader(source)
+            writer.append(reader, outline_item=payroll.staff.full_name)
+    writer.write(output)
+
+
+def stream_merged_pdf(payslips, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield one merged multi-page PDF, spooled to a temporary file first"""
+    with tempfile.TemporaryFile() as output:
+        write_merged_pdf(payslips, output)
+        output.seek(0)
+        yield from iter_file(output, chunk_size)
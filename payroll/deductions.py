@@ -0,0 +1,98 @@
+"""
+Compiled snapshot of the active mandatory deduction rules.
+
+The rules are read from the Deduction table once and cached per process,
+tagged with the Deduction version token of core.caching, so a lookup is a
+cache read and saving a payslip makes no Deduction query. Once a
+Deduction save or delete commits (see payroll.signals) this process drops
+its snapshot and replaces the token; other processes, such as the payroll
+worker, rebuild when the shared cache carries the new token, or at the
+latest once their own token expires (VERSION_TIMEOUT).
+"""
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
+
+_lock = threading.Lock()
+_compiled = None
+
+
+@dataclass(frozen=True)
+class DeductionRule:
+    id: int
+    name: str
+    percentage: Decimal
+    min_salary_threshold: Decimal
+    max_amount: Decimal = None
+
+    def calculate_amount(self, salary):
+        """Same result as Deduction.calculate_amount for an active rule"""
+        if salary < self.min_salary_threshold:
+            return Decimal('0.00')
+
+        amount = salary * self.percentage / 100
+        if self.max_amount:
+            return min(amount, self.max_amount)
+        return amount
+
+
+class CompiledDeductionRules:
+    """Immutable set of mandatory rules tagged with the version it was built for"""
+
+    def __init__(self, rules, version):
+        self.rules = tuple(rules)
+        self.version = version
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def calculate_total(self, salary):
+        total = Decimal('0.00')
+        for rule in self.rules:
+            total += rule.calculate_amount(salary)
+        return total
+
+
+def get_rules_version():
+    from core.caching import model_versions
+    from .models import Deduction
+
+    return model_versions(Deduction)[0]
+
+
+def invalidate_deduction_rules():
+    """Drop this process's snapshot and move the version token on for the others"""
+    from core.caching import refresh_version
+    from .models import Deduction
+
+    global _compiled
+    with _lock:
+        _compiled = None
+    refresh_version(Deduction)
+
+
+def compile_deduction_rules(version):
+    from .models import Deduction
+
+    rows = Deduction.objects.filter(deduction_type='MANDATORY', is_active=True).values_list(
+        'id', 'name', 'percentage', 'min_salary_threshold', 'max_amount'
+    )
+    return CompiledDeductionRules([DeductionRule(*row) for row in rows], version)
+
+
+def get_deduction_rules():
+    """Return the cached rule set, rebuilding it if the version has moved on"""
+    global _compiled
+
+    version = get_rules_version()
+    compiled = _compiled
+    if compiled is not None and compiled.version == version:
+        return compiled
+
+    with _lock:
+        if _compiled is None or _compiled.version != version:
+            _compiled = compile_deduction_rules(version)
+        return _compiled
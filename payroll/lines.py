@@ -0,0 +1,58 @@
+"""
+Deduction lines persisted with each payslip.
+
+build_lines() applies the mandatory rules (payroll.deductions) and a
+contract's active overrides to a gross salary and returns unsaved
+PayrollLine rows, one per non-zero deduction, mandatory rules first, each
+rounded to the cent (half-even) as PayrollLine.amount stores it.
+Payroll.save and run_monthly_payroll store them next to the totals they
+add up to, so the payslip page, the PDF and the bundles print the figures
+the payslip was computed with rather than today's rates, and read them
+with one prefetch of 'lines'.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from .models import PayrollLine
+
+CENT = Decimal('0.01')
+
+
+def to_cent(amount):
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_EVEN)
+
+
+def build_lines(gross, rules, contract_deductions):
+    """Unsaved lines for gross; contract_deductions need their deduction loaded"""
+    lines = []
+    for rule in rules:
+        amount = to_cent(rule.calculate_amount(gross))
+        if amount > 0:
+            lines.append(PayrollLine(
+                kind='MANDATORY', name=rule.name,
+                basis='PERCENTAGE', rate=rule.percentage, amount=amount,
+            ))
+    for cd in contract_deductions:
+        amount = to_cent(cd.calculate_amount(gross))
+        if amount > 0:
+            basis, rate = ('PERCENTAGE', cd.custom_percentage) if cd.custom_percentage is not None else ('FIXED', cd.fixed_amount)
+            lines.append(PayrollLine(
+                kind='CONTRACT', name=cd.deduction.name,
+                basis=basis, rate=rate, amount=amount,
+            ))
+    for position, line in enumerate(lines):
+        line.position = position
+    return lines
+
+
+def lines_total(lines):
+    return sum((line.amount for line in lines), Decimal('0.00'))
+
+
+def replace_lines(payroll, lines, existing=True):
+    """Swap the stored lines of a saved payroll for lines (existing=False: it has none yet)"""
+    if existing:
+        payroll.lines.all().delete()
+    for line in lines:
+        line.payroll = payroll
+    PayrollLine.objects.bulk_create(lines)
+    getattr(payroll, '_prefetched_objects_cache', {}).pop('lines', None)
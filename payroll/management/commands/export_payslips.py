@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from payroll.bundles import (
+    get_bundle_payslips, ensure_rendered, stream_zip, write_merged_pdf, DEFAULT_RENDER_WORKERS,
+)
+
+class Command(BaseCommand):
+    help = 'Export a month of payslips as one merged PDF or a ZIP archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', help='Pay month as YYYY-MM')
+        parser.add_argument('output', help='File to write the bundle to')
+        parser.add_argument('--format', choices=['zip', 'pdf'], default='zip')
+        parser.add_argument('--department', type=int, help='Only payslips for this department id')
+        parser.add_argument('--status', help='Only payslips with this payroll status, e.g. APPROVED')
+        parser.add_argument('--workers', type=int, default=DEFAULT_RENDER_WORKERS,
+                            help='Worker processes for rendering missing PDFs')
+
+    def handle(self, *args, **options):
+        try:
+            pay_month = datetime.strptime(options['month'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError('Month must be in YYYY-MM format')
+
+        payslips = ensure_rendered(
+            get_bundle_payslips(pay_month, options['department'], options['status']),
+            workers=options['workers'],
+        )
+        if not payslips:
+            raise CommandError(f"No payslips found for {pay_month:%B %Y}")
+
+        with open(options['output'], 'wb') as output:
+            if options['format'] == 'pdf':
+                write_merged_pdf(payslips, output)
+            else:
+                for chunk in stream_zip(payslips):
+                    output.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(payslips)} payslips for {pay_month:%B %Y} to {options['output']}"
+        ))
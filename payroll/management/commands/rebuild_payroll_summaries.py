@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from payroll.summaries import rebuild_summaries, DEFAULT_CHUNK_MONTHS
+
+class Command(BaseCommand):
+    help = 'Recompute the monthly payroll cost summaries from the payslips'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild pay months from YYYY-MM on')
+        parser.add_argument('--chunk-months', type=int, default=DEFAULT_CHUNK_MONTHS,
+                            help='Pay months rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--since must be in YYYY-MM format')
+        if options['chunk_months'] < 1:
+            raise CommandError('--chunk-months must be at least 1')
+
+        months = rows = 0
+        for chunk, written in rebuild_summaries(since, options['chunk_months']):
+            months += len(chunk)
+            rows += written
+            self.stdout.write(f"{chunk[0]:%Y-%m} to {chunk[-1]:%Y-%m}: {written} summary rows")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} summary rows for {months} pay months"))
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from payroll.models import Payroll
+from payroll.rendering import render_payslips, DEFAULT_CHUNK_SIZE
+
+class Command(BaseCommand):
+    help = 'Render payslip PDFs for a month in parallel worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', help='Pay month as YYYY-MM')
+        parser.add_argument('--department', type=int, help='Only payslips for this department id')
+        parser.add_argument('--status', help='Only payslips with this payroll status, e.g. APPROVED')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: number of CPU cores)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Payslips per task')
+        parser.add_argument('--force', action='store_true', help='Re-render even when the PDF fingerprint is unchanged')
+
+    def handle(self, *args, **options):
+        try:
+            pay_month = datetime.strptime(options['month'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError('Month must be in YYYY-MM format')
+
+        payslips = Payroll.objects.filter(pay_month=pay_month)
+        if options['department']:
+            payslips = payslips.filter(staff__department_id=options['department'])
+        if options['status']:
+            payslips = payslips.filter(status=options['status'])
+
+        payroll_ids = list(payslips.values_list('id', flat=True))
+        self.stdout.write(f"Rendering {len(payroll_ids)} payslips for {pay_month:%B %Y}")
+
+        stats = render_payslips(
+            payroll_ids,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            force=options['force'],
+        )
+
+        for line in stats.worker_lines():
+            self.stdout.write(f"  {line}")
+        for payroll_id, error in stats.failures:
+            self.stderr.write(f"  {payroll_id}: {error}")
+
+        style = self.style.SUCCESS if not stats.failed else self.style.WARNING
+        self.stdout.write(style(str(stats)))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:29
+
+from django.db import migrations, models
+
+
+def mark_rendered_payslips(apps, schema_editor):
+    Payroll = apps.get_model('payroll', 'Payroll')
+    Payroll.objects.exclude(pdf_file__isnull=True).exclude(pdf_file='').update(pdf_status='READY')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0003_force_reload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='pdf_error',
+            field=models.TextField(blank=True, default='', verbose_name='PDF Error'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='pdf_render_key',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Payroll id and content hash of the last queued render', max_length=100, verbose_name='PDF Render Key'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='pdf_status',
+            field=models.CharField(choices=[('PENDING', 'Not Rendered'), ('QUEUED', 'Queued'), ('RENDERING', 'Rendering'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='PENDING', max_length=10, verbose_name='PDF Status'),
+        ),
+        migrations.RunPython(mark_rendered_payslips, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0004_payroll_pdf_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='pdf_fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash of every input the stored PDF was rendered from', max_length=64, verbose_name='PDF Fingerprint'),
+        ),
+    ]
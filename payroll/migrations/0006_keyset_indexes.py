@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_keyset_indexes'),
+        ('payroll', '0005_payroll_pdf_fingerprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payroll',
+            index=models.Index(fields=['pay_month', 'id'], name='payroll_month_seek_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_hot_filter_indexes'),
+        ('payroll', '0006_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deduction',
+            index=models.Index(fields=['deduction_type', 'is_active'], name='deduction_type_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payroll',
+            index=models.Index(fields=['pay_month', 'status'], name='payroll_month_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payroll',
+            index=models.Index(fields=['status', 'pay_month', 'id'], name='payroll_status_seek_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:16
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def rule_amount(gross, percentage, threshold, cap):
+    if gross < threshold:
+        return 0
+    amount = gross * percentage / 100
+    return min(amount, cap) if cap else amount
+
+
+def backfill_lines(apps, schema_editor):
+    """Lines for existing payslips, from the rates on file now (the only record there is)"""
+    Deduction = apps.get_model('payroll', 'Deduction')
+    ContractDeduction = apps.get_model('payroll', 'ContractDeduction')
+    Payroll = apps.get_model('payroll', 'Payroll')
+    PayrollLine = apps.get_model('payroll', 'PayrollLine')
+
+    rules = list(
+        Deduction.objects.filter(deduction_type='MANDATORY', is_active=True)
+        .values_list('name', 'percentage', 'min_salary_threshold', 'max_amount')
+    )
+    overrides = defaultdict(list)
+    rows = ContractDeduction.objects.filter(is_active=True).values_list(
+        'contract_id', 'deduction__name', 'custom_percentage', 'fixed_amount'
+    )
+    for contract_id, *override in rows:
+        overrides[contract_id].append(override)
+
+    batch = []
+    for payroll_id, contract_id, gross in Payroll.objects.values_list('id', 'contract_id', 'gross_salary').iterator():
+        lines = []
+        for name, percentage, threshold, cap in rules:
+            amount = rule_amount(gross, percentage, threshold, cap)
+            if amount > 0:
+                lines.append(('MANDATORY', name, 'PERCENTAGE', percentage, amount))
+        for name, percentage, fixed in overrides[contract_id]:
+            if percentage is not None:
+                basis, rate, amount = 'PERCENTAGE', percentage, gross * percentage / 100
+            else:
+                basis, rate, amount = 'FIXED', fixed, fixed or 0
+            if amount > 0:
+                lines.append(('CONTRACT', name, basis, rate, amount))
+        batch.extend(
+            PayrollLine(
+                payroll_id=payroll_id, kind=kind, name=name,
+                basis=basis, rate=rate, amount=amount, position=position,
+            )
+            for position, (kind, name, basis, rate, amount) in enumerate(lines)
+        )
+        if len(batch) >= BATCH_SIZE:
+            PayrollLine.objects.bulk_create(batch)
+            batch = []
+    PayrollLine.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('MANDATORY', 'Mandatory'), ('CONTRACT', 'Contract Override')], max_length=10, verbose_name='Kind')),
+                ('name', models.CharField(max_length=100, verbose_name='Deduction Name')),
+                ('basis', models.CharField(choices=[('PERCENTAGE', 'Percentage'), ('FIXED', 'Fixed Amount')], max_length=10, verbose_name='Basis')),
+                ('rate', models.DecimalField(decimal_places=2, help_text='Percentage for percentage lines, KSh for fixed amounts', max_digits=12, verbose_name='Rate')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Amount')),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('payroll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='payroll.payroll')),
+            ],
+            options={
+                'verbose_name': 'Payroll Line',
+                'verbose_name_plural': 'Payroll Lines',
+                'ordering': ['payroll_id', 'position'],
+            },
+        ),
+        migrations.RunPython(backfill_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+TOTALS = ('gross_salary', 'total_deductions', 'net_salary')
+
+
+def backfill_summaries(apps, schema_editor):
+    """Roll up the existing payslips (rebuild_payroll_summaries does the same in chunks)"""
+    Payroll = apps.get_model('payroll', 'Payroll')
+    PayrollMonthlySummary = apps.get_model('payroll', 'PayrollMonthlySummary')
+    rows = (
+        Payroll.objects.values('pay_month', 'status', 'staff__department_id', 'contract__contract_type')
+        .annotate(headcount=Count('pk'), **{field: Sum(field) for field in TOTALS})
+        .order_by()
+    )
+    summaries = []
+    for row in rows:
+        department_id, category = row['staff__department_id'], row['contract__contract_type'] or ''
+        summaries.append(PayrollMonthlySummary(
+            key=f"{row['pay_month'].isoformat()}|{department_id or ''}|{category}|{row['status']}",
+            pay_month=row['pay_month'], department_id=department_id, category=category, status=row['status'],
+            headcount=row['headcount'], **{field: row[field] for field in TOTALS},
+        ))
+    PayrollMonthlySummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_staff_default_password'),
+        ('payroll', '0008_payroll_lines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('pay_month', models.DateField(verbose_name='Pay Month')),
+                ('category', models.CharField(blank=True, default='', help_text='Contract type', max_length=20)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending Approval'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected')], max_length=10)),
+                ('headcount', models.IntegerField(default=0)),
+                ('gross_salary', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_deductions', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net_salary', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('department', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.department')),
+            ],
+            options={
+                'verbose_name': 'Payroll Monthly Summary',
+                'verbose_name_plural': 'Payroll Monthly Summaries',
+                'indexes': [models.Index(fields=['pay_month', 'department'], name='payroll_summary_month_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -4,10 +4,11 @@ from decimal import Decimal
 from core.models import Contract, Staff
 from django.utils.translation import gettext_lazy as _
 from django_weasyprint import WeasyTemplateResponseMixin
-from django.template.loader import render_to_string
 from django.core.files.base import ContentFile
+import hashlib
+import json
 import uuid
-from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 # Create your models here.
@@ -30,6 +31,20 @@ PAYROLL_STATUS_CHOICES = [
     ("REJECTED", _("Rejected")),
 ]
 
+# Fields whose change recomputes the deduction lines, the ones approve()/reject() save
+# and the ones the render task writes; neither of the last two is printed on the PDF
+FIGURE_FIELDS = {'gross_salary', 'contract', 'contract_id'}
+STATUS_FIELDS = ['status', 'approved_by', 'approved_at']
+PDF_FIELDS = {'pdf_file', 'pdf_status', 'pdf_render_key', 'pdf_error', 'pdf_fingerprint'}
+
+PDF_STATUS_CHOICES = [
+    ("PENDING", _("Not Rendered")),
+    ("QUEUED", _("Queued")),
+    ("RENDERING", _("Rendering")),
+    ("READY", _("Ready")),
+    ("FAILED", _("Failed")),
+]
+
 
 
 class Payroll(models.Model):
@@ -102,12 +117,41 @@ class Payroll(models.Model):
         null=True,
         verbose_name=_("Payslip PDF")
     )
+    pdf_status = models.CharField(
+        max_length=10,
+        choices=PDF_STATUS_CHOICES,
+        default="PENDING",
+        verbose_name=_("PDF Status")
+    )
+    pdf_render_key = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name=_("PDF Render Key"),
+        help_text=_("Payroll id and content hash of the last queued render")
+    )
+    pdf_error = models.TextField(blank=True, default='', verbose_name=_("PDF Error"))
+    pdf_fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name=_("PDF Fingerprint"),
+        help_text=_("Hash of every input the stored PDF was rendered from")
+    )
 
     class Meta:
         ordering = ['-pay_month']
         verbose_name = _('Payroll')
         verbose_name_plural = _('Payrolls')
         unique_together = ['staff', 'pay_month']
+        indexes = [
+            models.Index(fields=['pay_month', 'id'], name='payroll_month_seek_idx'),
+            models.Index(fields=['pay_month', 'status'], name='payroll_month_status_idx'),
+            # Payroll page filtered by status, paged on -pay_month
+            models.Index(fields=['status', 'pay_month', 'id'], name='payroll_status_seek_idx'),
+        ]
 
     def __str__(self):
         return f"{self.staff_name} – {self.pay_month:%b %Y}"
@@ -137,72 +181,107 @@ class Payroll(models.Model):
         """Fetch expiry date from Contract"""
         return self.contract.end_date if self.contract else None
 
+    def build_deduction_lines(self):
+        """Unsaved deduction lines for the current rules and this contract's overrides"""
+        from .deductions import get_deduction_rules
+        from .lines import build_lines
+
+        contract_deductions = ContractDeduction.objects.filter(
+            contract_id=self.contract_id, is_active=True
+        ).select_related('deduction')
+        return build_lines(self.gross_salary, get_deduction_rules(), contract_deductions)
+
     def calculate_deductions(self):
         """Calculate total deductions based on global and contract-specific deductions"""
-        total = Decimal('0.00')
-        
-        # Mandatory deductions (global)
-        mandatory_deductions = Deduction.objects.filter(
-            deduction_type='MANDATORY',
-            is_active=True
-        )
-        for deduction in mandatory_deductions:
-            total += deduction.calculate_amount(self.gross_salary)
-
-        # Optional deductions (contract-specific overrides)
-        contract_deductions = ContractDeduction.objects.filter(
-            contract=self.contract,
-            is_active=True
-        )
-        for cd in contract_deductions:
-            total += cd.calculate_amount(self.gross_salary)
+        from .lines import lines_total
 
-        return total
-    
-    def get_mandatory_deductions(self):
-        salary = self.gross_salary
-        deductions = []
-        for d in Deduction.objects.filter(deduction_type='MANDATORY', is_active=True):
-            amt = d.calculate_amount(salary)
-            if amt > 0:
-                deductions.append({'name': d.name, 'amount': amt})
-        return deductions
-
-    def get_contract_deductions(self):
-        salary = self.gross_salary
-        deductions = []
-        for cd in ContractDeduction.objects.filter(contract=self.contract, is_active=True):
-            amt = cd.calculate_amount(salary)
-            if amt > 0:
-                deductions.append({
-                    'deduction': cd.deduction,
-                    'custom_percentage': cd.custom_percentage,
-                    'fixed_amount': cd.fixed_amount,
-                    'amount': amt
-                })
-        return deductions
-    
-    def generate_pdf(self):
-        """Generate PDF payslip and save to pdf_file"""        
+        return lines_total(self.build_deduction_lines())
+
+    def deduction_lines(self):
+        """The stored deduction lines, in payslip order; prefetch 'lines' to avoid the query"""
+        return list(self.lines.all())
+
+    def pdf_inputs(self, lines=None):
+        """
+        Staff and contract details, figures, bank details, deduction lines and
+        the template/stylesheet version that payroll_pdf.html prints. lines
+        stands in for the stored deduction lines before they are written.
+        """
+        from .rendering import template_version
+
+        def money(amount):
+            return f"{Decimal(amount or 0):.2f}"
+
+        staff, contract = self.staff, self.contract
+        return {
+            'template': template_version(),
+            'staff': [staff.full_name, staff.unique_id, staff.national_id],
+            'contract': [contract.job_title, contract.start_date, contract.end_date],
+            'payslip': [
+                self.pay_period_start, self.pay_period_end,
+                money(self.gross_salary), money(self.total_deductions), money(self.net_salary),
+                self.bank_name, self.bank_branch, self.bank_branch_code, self.account_no, self.kra_pin,
+            ],
+            'deductions': [
+                [line.kind, line.name, line.basis, money(line.rate), money(line.amount)]
+                for line in (self.deduction_lines() if lines is None else lines)
+            ],
+        }
+
+    def compute_pdf_fingerprint(self):
+        """Deterministic hash of everything payroll_pdf.html prints: pdf_inputs and the generation time"""
+        payload = self.pdf_inputs()
+        payload['payslip'].append(self.generated_at.strftime('%Y-%m-%d %H:%M') if self.generated_at else None)
+        return hashlib.sha256(json.dumps(payload, default=str, sort_keys=True).encode()).hexdigest()
+
+    def pdf_task_key(self, lines=None):
+        """
+        Idempotency key for rendering this version of the payslip, from the
+        same inputs as the fingerprint. generated_at is left out: it is set
+        by the insert and never changes afterwards.
+        """
+        digest = hashlib.sha256(json.dumps(self.pdf_inputs(lines), default=str, sort_keys=True).encode())
+        return f"{self.pk}-{digest.hexdigest()[:16]}"
+
+    def generate_pdf(self, force=False):
+        """
+        Generate the PDF payslip into pdf_file if its inputs have changed.
+
+        Files are named after the fingerprint, so an identical render that is
+        already in storage is reused instead of rendered again. Returns True
+        when WeasyPrint actually ran. Nothing is written to the row here.
+        """
+        fingerprint = self.compute_pdf_fingerprint()
+        if self.pdf_file and self.pdf_fingerprint == fingerprint and not force:
+            return False  # Up to date
 
-        if self.pdf_file:
-            return  # Already exists
+        from .rendering import get_renderer
 
-        # Render the same detail template as HTML string
-        html_string = render_to_string('payroll_pdf.html', {
-            'payroll': self,
-            'mandatory_deductions': self.get_mandatory_deductions(),
-            'contract_deductions': self.get_contract_deductions(),
-            'staff': self.staff,
-        })
+        storage = self.pdf_file.storage
+        filename = f"payslip_{self.staff.unique_id}_{self.pay_period_start.strftime('%m')}_{fingerprint[:16]}.pdf"
+        name = self.pdf_file.field.generate_filename(self, filename)
 
-        # Convert HTML to PDF
-        from weasyprint import HTML
-        pdf_file = HTML(string=html_string, base_url=settings.MEDIA_ROOT).write_pdf()
+        rendered = force or not storage.exists(name)
+        if rendered:
+            pdf_file = get_renderer().render(self)
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(pdf_file))
 
-        # Save to model
-        filename = f"payslip_{self.staff.unique_id}_{self.staff.full_name}_{self.pay_period_start.strftime('%m')}.pdf"
-        self.pdf_file.save(filename, ContentFile(pdf_file), save=False)
+        # The previous render stays until the new name is stored, see delete_replaced_pdf()
+        self.pdf_file.name = name
+        self.pdf_fingerprint = fingerprint
+        return rendered
+
+    def delete_replaced_pdf(self, previous):
+        """
+        Delete previous, the file this payslip pointed at before generate_pdf,
+        once the transaction that stored the new name commits. Call it only
+        after that write actually matched the row.
+        """
+        storage = self.pdf_file.storage
+        if previous and previous != self.pdf_file.name:
+            transaction.on_commit(lambda: storage.exists(previous) and storage.delete(previous))
 
     def clean(self):
         from dateutil.relativedelta import relativedelta
@@ -216,23 +295,41 @@ class Payroll(models.Model):
             self.pay_period_end   = self.pay_month.replace(day=last_day)
 
     def save(self, *args, **kwargs):
-        # Auto-calculate totals (existing logic)
+        # Totals and deduction lines are recomputed on full saves only; status
+        # saves (approve/reject) keep the figures the payslip was approved with.
+        # The PDF is rendered by the render_payslip_pdf task, queued once the
+        # new lines are known.
+        from .lines import lines_total, replace_lines
+        from .tasks import queue_payslip_pdf
+
         self.clean()
-        self.total_deductions = self.calculate_deductions()
-        self.net_salary = self.gross_salary - self.total_deductions
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        lines = None
+        if update_fields is None or set(update_fields) & FIGURE_FIELDS:
+            lines = self.build_deduction_lines()
+            self.total_deductions = lines_total(lines)
+            self.net_salary = self.gross_salary - self.total_deductions
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'total_deductions', 'net_salary'}
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if lines is not None:
+                replace_lines(self, lines, existing=not adding)
+            if update_fields is None or not set(update_fields) <= PDF_FIELDS | set(STATUS_FIELDS):
+                queue_payslip_pdf(self, lines)
 
     def approve(self, user):
         self.status = "APPROVED"
         self.approved_by = user
         self.approved_at = timezone.now()
-        self.save()
+        self.save(update_fields=STATUS_FIELDS)
 
     def reject(self, user):
         self.status = "REJECTED"
         self.approved_by = user
         self.approved_at = timezone.now()
-        self.save()
+        self.save(update_fields=STATUS_FIELDS)
 
 class Deduction(models.Model):
     DEDUCTION_TYPES = (
@@ -289,6 +386,7 @@ class Deduction(models.Model):
         verbose_name = ('Deduction')
         verbose_name_plural = ('Deductions')
         unique_together = ['name', 'percentage']  # Prevent duplicate deductions
+        indexes = [models.Index(fields=['deduction_type', 'is_active'], name='deduction_type_active_idx')]
     
     def __str__(self):
         return f"{self.name} ({self.percentage}%)"
@@ -401,4 +499,61 @@ class ContractDeduction(models.Model):
             return 'FIXED'
         return None
     
-    
\ No newline at end of file
+    
+
+
+class PayrollLine(models.Model):
+    """One deduction on a payslip, as computed when the payslip was saved"""
+
+    LINE_KINDS = (
+        ('MANDATORY', 'Mandatory'),
+        ('CONTRACT', 'Contract Override'),
+    )
+    BASES = (
+        ('PERCENTAGE', 'Percentage'),
+        ('FIXED', 'Fixed Amount'),
+    )
+
+    payroll = models.ForeignKey(Payroll, on_delete=models.CASCADE, related_name='lines')
+    kind = models.CharField(max_length=10, choices=LINE_KINDS, verbose_name=("Kind"))
+    name = models.CharField(max_length=100, verbose_name=("Deduction Name"))
+    basis = models.CharField(max_length=10, choices=BASES, verbose_name=("Basis"))
+    rate = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name=("Rate"),
+        help_text=("Percentage for percentage lines, KSh for fixed amounts")
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name=("Amount"))
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['payroll_id', 'position']
+        verbose_name = ('Payroll Line')
+        verbose_name_plural = ('Payroll Lines')
+
+    def __str__(self):
+        return f"{self.name}: KSh {self.amount}"
+
+
+class PayrollMonthlySummary(models.Model):
+    """Payroll totals for one (month, department, category, status) bucket, kept by payroll.summaries"""
+    key = models.CharField(max_length=100, unique=True)
+    pay_month = models.DateField(verbose_name=_("Pay Month"))
+    department = models.ForeignKey(
+        'core.Department', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    category = models.CharField(max_length=20, blank=True, default='', help_text=_("Contract type"))
+    status = models.CharField(max_length=10, choices=PAYROLL_STATUS_CHOICES)
+    headcount = models.IntegerField(default=0)
+    gross_salary = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_deductions = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_salary = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('Payroll Monthly Summary')
+        verbose_name_plural = _('Payroll Monthly Summaries')
+        indexes = [models.Index(fields=['pay_month', 'department'], name='payroll_summary_month_idx')]
+
+    def __str__(self):
+        return f"{self.key}: {self.headcount} payslips, KSh {self.gross_salary}"
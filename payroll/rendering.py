@@ -0,0 +1,198 @@
+"""
+Payslip PDF rendering.
+
+PayslipRenderer compiles payroll_pdf.html, parses the payslip stylesheet and
+builds the WeasyPrint font configuration once, and is cached per process so
+the web process, Celery workers and render_payslips pool workers each pay
+that cost a single time. render_payslips fans a batch of payslips out over
+a ProcessPoolExecutor.
+"""
+import hashlib
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+PAYSLIP_TEMPLATE = 'payroll_pdf.html'
+PAYSLIP_STYLESHEET = 'css/payslip.css'
+DEFAULT_CHUNK_SIZE = 25
+
+_renderer = None
+_template_version = None
+
+
+def template_version():
+    """Short hash of the payslip template and stylesheet sources"""
+    global _template_version
+    if _template_version is None:
+        digest = hashlib.sha256(get_template(PAYSLIP_TEMPLATE).template.source.encode())
+        stylesheet = finders.find(PAYSLIP_STYLESHEET)
+        if stylesheet:
+            with open(stylesheet, 'rb') as f:
+                digest.update(f.read())
+        _template_version = digest.hexdigest()[:12]
+    return _template_version
+
+
+class PayslipRenderer:
+    """Holds the parsed template, stylesheet and fonts for payslip renders"""
+
+    def __init__(self):
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.template = get_template(PAYSLIP_TEMPLATE)
+        self.font_config = FontConfiguration()
+        stylesheet = finders.find(PAYSLIP_STYLESHEET)
+        self.stylesheets = [CSS(filename=stylesheet, font_config=self.font_config)] if stylesheet else []
+
+    def render_html(self, payroll):
+        return self.template.render({
+            'payroll': payroll,
+            'deduction_lines': payroll.deduction_lines(),
+            'staff': payroll.staff,
+        })
+
+    def render(self, payroll):
+        """Return the payslip PDF as bytes"""
+        from weasyprint import HTML
+
+        return HTML(string=self.render_html(payroll), base_url=settings.MEDIA_ROOT).write_pdf(
+            stylesheets=self.stylesheets, font_config=self.font_config
+        )
+
+
+def get_renderer():
+    global _renderer
+    if _renderer is None:
+        _renderer = PayslipRenderer()
+    return _renderer
+
+
+class RenderStats:
+    """Per-worker and overall throughput of a render_payslips batch"""
+
+    def __init__(self):
+        self.workers = defaultdict(lambda: {'rendered': 0, 'unchanged': 0, 'failed': 0, 'seconds': 0.0})
+        self.failures = []  # (payroll_id, error)
+        self.elapsed = 0.0
+
+    def add(self, chunk_result):
+        worker = self.workers[chunk_result['pid']]
+        worker['rendered'] += chunk_result['rendered']
+        worker['unchanged'] += chunk_result['unchanged']
+        worker['failed'] += len(chunk_result['failures'])
+        worker['seconds'] += chunk_result['seconds']
+        self.failures.extend(chunk_result['failures'])
+
+    @property
+    def rendered(self):
+        return sum(w['rendered'] for w in self.workers.values())
+
+    @property
+    def unchanged(self):
+        return sum(w['unchanged'] for w in self.workers.values())
+
+    @property
+    def failed(self):
+        return len(self.failures)
+
+    def worker_lines(self):
+        for pid, w in sorted(self.workers.items()):
+            rate = w['rendered'] / w['seconds'] if w['seconds'] else 0
+            yield (
+                f"worker {pid}: {w['rendered']} rendered, {w['unchanged']} unchanged, "
+                f"{w['failed']} failed, {rate:.1f} payslips/s"
+            )
+
+    def __str__(self):
+        rate = self.rendered / self.elapsed if self.elapsed else 0
+        return (
+            f"Rendered {self.rendered} payslips ({self.unchanged} unchanged, {self.failed} failed) in {self.elapsed:.1f}s "
+            f"across {len(self.workers)} workers, {rate:.1f} payslips/s"
+        )
+
+
+def init_render_worker():
+    """Pool initializer: set up Django and warm the renderer once per process"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    get_renderer()
+
+
+def render_chunk(payroll_ids, force=False):
+    """Render and store one chunk of payslips inside a worker process"""
+    from .models import Payroll
+
+    started = time.perf_counter()
+    rendered, unchanged, failures = 0, 0, []
+    payslips = Payroll.objects.filter(pk__in=payroll_ids).select_related('staff', 'contract').prefetch_related('lines')
+    for payroll in payslips:
+        previous = payroll.pdf_file.name
+        try:
+            did_render = payroll.generate_pdf(force=force)
+        except Exception as e:
+            failures.append((str(payroll.pk), str(e)))
+            Payroll.objects.filter(pk=payroll.pk).update(pdf_status='FAILED', pdf_error=str(e))
+            continue
+        if Payroll.objects.filter(pk=payroll.pk).update(
+            pdf_file=payroll.pdf_file.name,
+            pdf_fingerprint=payroll.pdf_fingerprint,
+            pdf_status='READY',
+            pdf_render_key=payroll.pdf_task_key(),
+            pdf_error='',
+        ):
+            payroll.delete_replaced_pdf(previous)
+        if did_render:
+            rendered += 1
+        else:
+            unchanged += 1
+
+    return {
+        'pid': os.getpid(),
+        'rendered': rendered,
+        'unchanged': unchanged,
+        'failures': failures,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def render_payslips(payroll_ids, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, force=False):
+    """
+    Render the given payslips in parallel and write them to storage.
+
+    Work is split into chunks of chunk_size ids and spread across a process
+    pool sized to the machine's cores unless workers is given.
+    """
+    from django.db import connections
+
+    payroll_ids = [str(pk) for pk in payroll_ids]
+    stats = RenderStats()
+    if not payroll_ids:
+        return stats
+
+    chunks = [payroll_ids[i:i + chunk_size] for i in range(0, len(payroll_ids), chunk_size)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chunks)))
+
+    # Forked workers must open their own connections
+    connections.close_all()
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_render_worker) as pool:
+        futures = [pool.submit(render_chunk, chunk, force) for chunk in chunks]
+        for future in as_completed(futures):
+            stats.add(future.result())
+    stats.elapsed = time.perf_counter() - started
+
+    logger.info(str(stats))
+    return stats
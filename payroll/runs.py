@@ -0,0 +1,180 @@
+import calendar
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from core.counters import PAYROLL_COUNTER, adjust_counters
+from core.models import Contract, Staff
+from .deductions import get_deduction_rules
+from .lines import build_lines, lines_total
+from .models import Payroll, PayrollLine, ContractDeduction
+from .summaries import add_payrolls
+from .tasks import enqueue_payslip_pdf
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+BANK_FIELDS = ('bank_name', 'bank_branch', 'bank_branch_code', 'account_no')
+
+
+class PayrollRunReport:
+    """Outcome of a monthly payroll run"""
+
+    def __init__(self, pay_month):
+        self.pay_month = pay_month
+        self.created = []   # Payroll ids
+        self.skipped = []   # (contract_id, reason)
+        self.failed = []    # (contract_id, reason)
+
+    def skip(self, contract, reason):
+        self.skipped.append((contract.id, reason))
+
+    def fail(self, contract, reason):
+        logger.warning(f"Payroll run {self.pay_month:%B %Y}: contract {contract.id} failed - {reason}")
+        self.failed.append((contract.id, reason))
+
+    def __str__(self):
+        return (
+            f"Created {len(self.created)} payslips for {self.pay_month:%B %Y} "
+            f"({len(self.skipped)} skipped, {len(self.failed)} failed)"
+        )
+
+
+def get_run_contracts(pay_month):
+    """Contracts that are active at some point during the given month"""
+    month_end = pay_month + relativedelta(months=1) - relativedelta(days=1)
+    return Contract.objects.filter(
+        Q(end_date__gte=pay_month) | Q(end_date__isnull=True),
+        start_date__lte=month_end,
+        status='ACTIVE',
+    ).order_by('staff_id', '-start_date')
+
+
+def get_latest_bank_details(staff_ids):
+    """Map staff id -> bank details from that staff member's most recent payslip"""
+    # One index seek on (staff, pay_month) per staff member, not every past payslip
+    latest = Payroll.objects.filter(staff_id=OuterRef('pk')).order_by('-pay_month').values('pk')[:1]
+    latest_ids = Staff.objects.filter(pk__in=staff_ids).annotate(latest_payslip=Subquery(latest)).values('latest_payslip')
+    rows = Payroll.objects.filter(pk__in=latest_ids).values_list('staff_id', *BANK_FIELDS)
+    return {staff_id: dict(zip(BANK_FIELDS, values)) for staff_id, *values in rows}
+
+
+def get_contract_overrides(contract_ids):
+    """Map contract id -> active contract deduction overrides"""
+    overrides = defaultdict(list)
+    rows = ContractDeduction.objects.filter(contract_id__in=contract_ids, is_active=True).select_related('deduction')
+    for cd in rows:
+        overrides[cd.contract_id].append(cd)
+    return overrides
+
+
+def run_monthly_payroll(pay_month, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create the payslips for every active contract in pay_month.
+
+    Existing payslips, bank details and deduction rules are loaded up front,
+    all figures and deduction lines are computed in memory and the new rows
+    are written with bulk_create in chunks inside a single transaction.
+    Bulk inserts do not call Payroll.save or fire post_save, so the
+    dashboard counters and the monthly cost summaries are bumped here and
+    the PDF renders are queued explicitly once the transaction commits.
+    """
+    pay_month = pay_month.replace(day=1)
+    _, last_day = calendar.monthrange(pay_month.year, pay_month.month)
+    pay_period_end = pay_month.replace(day=last_day)
+    report = PayrollRunReport(pay_month)
+
+    contracts = list(get_run_contracts(pay_month).select_related('staff'))  # printed on the PDFs
+    staff_ids = {c.staff_id for c in contracts}
+    existing = set(
+        Payroll.objects.filter(pay_month=pay_month, staff_id__in=staff_ids)
+        .values_list('staff_id', flat=True)
+    )
+    bank_details = get_latest_bank_details(staff_ids)
+    rules = get_deduction_rules()
+    overrides = get_contract_overrides([c.id for c in contracts])
+
+    logger.info(f"Payroll run {pay_month:%B %Y}: {len(contracts)} active contracts")
+
+    payslips = []
+    payslip_lines = []
+    seen = set()
+    for contract in contracts:
+        if contract.staff_id in existing:
+            report.skip(contract, "payslip already exists")
+            continue
+        if contract.staff_id in seen:
+            # Contracts are ordered newest first per staff member
+            report.skip(contract, "staff member has a newer active contract")
+            continue
+        seen.add(contract.staff_id)
+
+        gross = contract.salary or Decimal('0.00')
+        if gross <= 0:
+            report.skip(contract, "contract has no salary")
+            continue
+
+        bank = bank_details.get(contract.staff_id)
+        if not bank:
+            report.fail(contract, "no bank details on file")
+            continue
+
+        try:
+            # Same lines and arithmetic as Payroll.save, on preloaded rules
+            lines = build_lines(gross, rules, overrides.get(contract.id, []))
+            total_deductions = lines_total(lines)
+        except Exception as e:
+            report.fail(contract, f"deduction calculation failed: {e}")
+            continue
+
+        # kra_pin is unique per payslip, so it cannot be carried over
+        payslip = Payroll(
+            staff=contract.staff,
+            contract=contract,
+            pay_month=pay_month,
+            pay_period_start=pay_month,
+            pay_period_end=pay_period_end,
+            gross_salary=gross,
+            total_deductions=total_deductions,
+            net_salary=gross - total_deductions,
+            pdf_status='QUEUED',
+            **bank,
+        )
+        payslip.pdf_render_key = payslip.pdf_task_key(lines)
+        payslips.append(payslip)
+        for line in lines:
+            line.payroll = payslip
+        payslip_lines.extend(lines)
+
+    with transaction.atomic():
+        for start in range(0, len(payslips), chunk_size):
+            chunk = Payroll.objects.bulk_create(payslips[start:start + chunk_size])
+            report.created.extend(p.id for p in chunk)
+            for payslip in chunk:
+                enqueue_payslip_pdf(payslip.pk, payslip.pdf_render_key)
+        PayrollLine.objects.bulk_create(payslip_lines, batch_size=chunk_size)
+        adjust_counters(PAYROLL_COUNTER.bucket_for(p) for p in payslips)
+        add_payrolls(payslips)
+
+    logger.info(str(report))
+    return report
+
+
+def preview_monthly_payroll(pay_month):
+    """
+    Projected deductions for every active contract in pay_month.
+
+    Nothing is written. Returns the contract ids alongside the
+    BatchDeductionResult rows, in the same order.
+    """
+    from .batch import calculate_batch_deductions
+
+    rows = list(get_run_contracts(pay_month.replace(day=1)).values_list('id', 'salary'))
+    contract_ids = [contract_id for contract_id, _ in rows]
+    result = calculate_batch_deductions([salary for _, salary in rows], contract_ids)
+    return contract_ids, result
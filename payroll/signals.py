@@ -1,10 +1,105 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Payroll
+from .models import Payroll, Deduction, ContractDeduction
+from . import summaries
+from .deductions import invalidate_deduction_rules
+from .tasks import queue_payslip_pdfs
+from core.changes import record_deletion
+from core.counters import PAYROLL_COUNTER
+from core.models import Contract, Staff
+
+# Staff and contract details printed on the payslips. Payroll.save queues
+# its own render; edits to these queue a new one for every payslip showing them.
+PRINTED_FIELDS = {
+    Staff: ('first_name', 'middle_name', 'last_name', 'unique_id', 'national_id'),
+    Contract: ('job_title', 'start_date', 'end_date'),
+}
+
+def printed_values(instance):
+    return tuple(instance.__dict__.get(field) for field in PRINTED_FIELDS[type(instance)])
+
+@receiver(post_init, sender=Staff)
+@receiver(post_init, sender=Contract)
+def remember_printed_values(sender, instance, **kwargs):
+    instance._printed_values = printed_values(instance)
+
+@receiver(post_save, sender=Staff)
+@receiver(post_save, sender=Contract)
+def rerender_payslips(sender, instance, created, raw=False, **kwargs):
+    old, instance._printed_values = getattr(instance, '_printed_values', None), printed_values(instance)
+    if created or raw or old == instance._printed_values:
+        return
+    payslips = Payroll.objects.filter(**{'staff' if sender is Staff else 'contract': instance})
+    queue_payslip_pdfs(payslips)  # only those whose printed inputs really changed
+
+@receiver(post_save, sender=Deduction)
+@receiver(post_delete, sender=Deduction)
+def on_deduction_changed(sender, instance, **kwargs):
+    # Drops the snapshot now and replaces the version token once the change commits
+    invalidate_deduction_rules()
+
+# Dashboard counters by status and pay month; see core.counters
+@receiver(post_init, sender=Payroll)
+def remember_payroll_bucket(sender, instance, **kwargs):
+    PAYROLL_COUNTER.remember(instance)
+
+@receiver(pre_save, sender=Payroll)
+def prepare_payroll_bucket(sender, instance, raw=False, **kwargs):
+    if not raw:
+        PAYROLL_COUNTER.prepare(instance)
+
+@receiver(post_save, sender=Payroll)
+def update_payroll_bucket(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Covers approve()/reject(), which save the new status
+    if not raw:
+        PAYROLL_COUNTER.saved(instance, created, update_fields)
+
+@receiver(post_delete, sender=Payroll)
+def release_payroll_bucket(sender, instance, **kwargs):
+    PAYROLL_COUNTER.deleted(instance)
+
+
+# Monthly cost roll-up by department and category; see payroll.summaries
+@receiver(post_init, sender=Payroll)
+def remember_payroll_summary(sender, instance, **kwargs):
+    summaries.remember(instance)
+
+@receiver(pre_save, sender=Payroll)
+def prepare_payroll_summary(sender, instance, raw=False, **kwargs):
+    if not raw:
+        summaries.prepare(instance)
 
 @receiver(post_save, sender=Payroll)
-def generate_payroll_pdf(sender, instance, created, **kwargs):
-    if created or not instance.pdf_file:
-        instance.generate_pdf()
-        
-        instance.save(update_fields=['pdf_file'])
\ No newline at end of file
+def update_payroll_summary(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        summaries.saved(instance, created, update_fields)
+
+@receiver(post_delete, sender=Payroll)
+def release_payroll_summary(sender, instance, **kwargs):
+    summaries.deleted(instance)
+
+@receiver(post_init, sender=Staff)
+def remember_staff_summary(sender, instance, **kwargs):
+    summaries.remember_staff(instance)
+
+@receiver(post_save, sender=Staff)
+def move_staff_summaries(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Payslips are counted under the staff member's department, as on the dashboard
+    if not raw:
+        summaries.staff_saved(instance, created, update_fields)
+
+@receiver(post_init, sender=Contract)
+def remember_contract_summary(sender, instance, **kwargs):
+    summaries.remember_contract(instance)
+
+@receiver(post_save, sender=Contract)
+def move_contract_summaries(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        summaries.contract_saved(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Deduction)
+@receiver(post_delete, sender=ContractDeduction)
+def leave_tombstone(sender, instance, **kwargs):
+    # Deletions for the change feeds, see core.changes
+    record_deletion(instance)
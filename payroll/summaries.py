@@ -0,0 +1,295 @@
+"""
+Monthly payroll cost roll-up.
+
+PayrollMonthlySummary keeps one row per (pay month, department, category,
+status) bucket with the headcount and the gross, deduction and net totals
+of the payslips in it. The department is the staff member's, as on the
+payroll dashboard and in the bundles, and the category is the contract
+type. The receivers in payroll.signals move a payslip's figures between
+buckets as it is created, edited, approved, rejected or deleted, and move
+a staff member's or contract's payslips when the staff member changes
+department or the contract changes type, inside the same transaction as
+the write. The payroll charts then read at most a few hundred summary
+rows a year instead of grouping the Payroll table.
+
+run_monthly_payroll bulk-creates payslips without signals and calls
+add_payrolls() itself. The rebuild_payroll_summaries command recomputes
+history from the Payroll table, a few months at a time.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from core.models import Contract, Staff
+from .models import Payroll, PayrollMonthlySummary
+
+TRACKED_FIELDS = (
+    'pay_month', 'status', 'staff_id', 'contract_id', 'gross_salary', 'total_deductions', 'net_salary',
+)
+TOTALS = ('headcount', 'gross_salary', 'total_deductions', 'net_salary')
+DEFAULT_CHUNK_MONTHS = 12
+EXCLUDED_BY_DEFAULT = ('REJECTED',)  # rejected payslips are not a cost
+
+
+def summary_key(bucket):
+    pay_month, department_id, category, status = bucket
+    return f"{pay_month.isoformat()}|{department_id or ''}|{category}|{status}"
+
+
+def totals_of(values, sign=1):
+    return [sign, *(sign * (values[field] or 0) for field in TOTALS[1:])]
+
+
+def adjust_summary(bucket, totals):
+    """Add totals (headcount, gross, deductions, net) to one bucket"""
+    key = summary_key(bucket)
+    changes = {field: F(field) + delta for field, delta in zip(TOTALS, totals)}
+    if PayrollMonthlySummary.objects.filter(key=key).update(**changes):
+        return
+    pay_month, department_id, category, status = bucket
+    _, created = PayrollMonthlySummary.objects.get_or_create(key=key, defaults={
+        'pay_month': pay_month,
+        'department_id': department_id,
+        'category': category,
+        'status': status,
+        **dict(zip(TOTALS, totals)),
+    })
+    if not created:
+        PayrollMonthlySummary.objects.filter(key=key).update(**changes)
+
+
+def apply_deltas(deltas):
+    """Write {bucket: totals}, skipping buckets whose changes cancel out"""
+    for bucket, totals in deltas.items():
+        if any(totals):
+            adjust_summary(bucket, totals)
+
+
+def add_to(deltas, bucket, totals):
+    current = deltas.setdefault(bucket, [0, Decimal('0.00'), Decimal('0.00'), Decimal('0.00')])
+    for i, value in enumerate(totals):
+        current[i] += value
+
+
+class Dimensions:
+    """Staff department and contract type for a set of payslips, one query each"""
+
+    def __init__(self, payslip_values):
+        staff_ids = {values['staff_id'] for values in payslip_values}
+        contract_ids = {values['contract_id'] for values in payslip_values}
+        self.departments = dict(Staff.objects.filter(pk__in=staff_ids).values_list('pk', 'department_id'))
+        self.categories = dict(Contract.objects.filter(pk__in=contract_ids).values_list('pk', 'contract_type'))
+
+    def bucket(self, values):
+        return (
+            values['pay_month'],
+            self.departments.get(values['staff_id']),
+            self.categories.get(values['contract_id']) or '',
+            values['status'],
+        )
+
+
+def loaded_values(instance):
+    return {f: instance.__dict__[f] for f in TRACKED_FIELDS if f in instance.__dict__}
+
+
+def remember(instance):
+    """post_init: note the figures a freshly loaded payslip is counted with"""
+    values = loaded_values(instance)
+    instance._summary_values = values if len(values) == len(TRACKED_FIELDS) else None
+
+
+def prepare(instance):
+    """pre_save: read the stored figures for payslips loaded with deferred fields"""
+    if instance._state.adding or getattr(instance, '_summary_values', None) is not None:
+        return
+    instance._summary_values = Payroll.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first()
+
+
+def saved(instance, created, update_fields=None):
+    """post_save: move the payslip's figures to its new bucket"""
+    old = None if created else getattr(instance, '_summary_values', None)
+    loaded = loaded_values(instance)
+    if old is None:
+        new = loaded
+    else:
+        # Only the saved fields reached the database
+        new = dict(old)
+        for field, value in loaded.items():
+            if update_fields is None or field in update_fields or field.removesuffix('_id') in update_fields:
+                new[field] = value
+    if new == old:
+        return
+
+    dims = Dimensions([new] + ([old] if old else []))
+    deltas = {}
+    if old is not None:
+        add_to(deltas, dims.bucket(old), totals_of(old, -1))
+    add_to(deltas, dims.bucket(new), totals_of(new))
+    apply_deltas(deltas)
+    instance._summary_values = new
+
+
+def deleted(instance):
+    """post_delete: take the payslip out of its bucket"""
+    values = getattr(instance, '_summary_values', None) or loaded_values(instance)
+    if len(values) == len(TRACKED_FIELDS):
+        apply_deltas({Dimensions([values]).bucket(values): totals_of(values, -1)})
+
+
+def add_payrolls(payrolls):
+    """Count payslips written with bulk_create"""
+    payslip_values = [loaded_values(payroll) for payroll in payrolls]
+    dims = Dimensions(payslip_values)
+    deltas = {}
+    for values in payslip_values:
+        add_to(deltas, dims.bucket(values), totals_of(values))
+    apply_deltas(deltas)
+
+
+def move_payslips(payslips, old, new, dimension):
+    """
+    Move payslips from their old to their new department or category.
+
+    dimension is the payslip field giving the bucket part that stays put,
+    the contract type when a staff member moves department and the staff
+    department when a contract changes type.
+    """
+    rows = (
+        payslips.values('pay_month', 'status', dimension)
+        .annotate(headcount=Count('pk'), **{field: Sum(field) for field in TOTALS[1:]})
+        .order_by()
+    )
+    deltas = {}
+    for row in rows:
+        totals = [row[field] for field in TOTALS]
+        for moved, sign in ((old, -1), (new, 1)):
+            if dimension == 'contract__contract_type':
+                department_id, category = moved, row[dimension] or ''
+            else:
+                department_id, category = row[dimension], moved or ''
+            add_to(deltas, (row['pay_month'], department_id, category, row['status']), [sign * v for v in totals])
+    apply_deltas(deltas)
+
+
+def remember_staff(staff):
+    """post_init on Staff: note the department its payslips are counted under"""
+    staff._summary_department = staff.__dict__.get('department_id')
+
+
+def staff_saved(staff, created, update_fields=None):
+    """post_save on Staff: move their payslips if they changed department"""
+    old, new = getattr(staff, '_summary_department', None), staff.department_id
+    staff._summary_department = new
+    if created or old is None or old == new:
+        return
+    if update_fields is not None and not {'department', 'department_id'} & set(update_fields):
+        return
+    move_payslips(Payroll.objects.filter(staff_id=staff.pk), old, new, 'contract__contract_type')
+
+
+def remember_contract(contract):
+    """post_init on Contract: note the type its payslips are counted under"""
+    contract._summary_category = contract.__dict__.get('contract_type')
+
+
+def contract_saved(contract, created, update_fields=None):
+    """post_save on Contract: move its payslips if it changed type"""
+    old, new = getattr(contract, '_summary_category', None), contract.contract_type
+    contract._summary_category = new
+    if created or old is None or old == new:
+        return
+    if update_fields is not None and 'contract_type' not in update_fields:
+        return
+    move_payslips(Payroll.objects.filter(contract_id=contract.pk), old, new, 'staff__department_id')
+
+
+def summarize_months(months):
+    """Fresh summary rows for the given pay months, grouped from the Payroll table"""
+    rows = (
+        Payroll.objects.filter(pay_month__in=months)
+        .values('pay_month', 'status', 'staff__department_id', 'contract__contract_type')
+        .annotate(headcount=Count('pk'), **{field: Sum(field) for field in TOTALS[1:]})
+        .order_by()
+    )
+    summaries = []
+    for row in rows:
+        summary_bucket = (
+            row['pay_month'], row['staff__department_id'], row['contract__contract_type'] or '', row['status']
+        )
+        summaries.append(PayrollMonthlySummary(
+            key=summary_key(summary_bucket),
+            pay_month=row['pay_month'],
+            department_id=row['staff__department_id'],
+            category=row['contract__contract_type'] or '',
+            status=row['status'],
+            **{field: row[field] for field in TOTALS},
+        ))
+    return summaries
+
+
+def rebuild_summaries(since=None, chunk_months=DEFAULT_CHUNK_MONTHS):
+    """
+    Recompute the roll-up from the Payroll table, chunk_months at a time.
+
+    Each chunk is replaced in its own transaction, so a long history never
+    holds one big lock. Yields (months in the chunk, summary rows written).
+    """
+    months = Payroll.objects.order_by('pay_month').values_list('pay_month', flat=True).distinct()
+    if since:
+        months = months.filter(pay_month__gte=since)
+    months = list(months)
+    stale = PayrollMonthlySummary.objects.exclude(pay_month__in=months)
+    if since:
+        stale = stale.filter(pay_month__gte=since)
+    stale.delete()  # months that no longer have any payslips
+
+    for start in range(0, len(months), chunk_months):
+        chunk = months[start:start + chunk_months]
+        with transaction.atomic():
+            PayrollMonthlySummary.objects.filter(pay_month__in=chunk).delete()
+            written = PayrollMonthlySummary.objects.bulk_create(summarize_months(chunk))
+        yield chunk, len(written)
+
+
+def monthly_totals(year, department=None, category=None, status=None):
+    """
+    Twelve months of payroll cost for the charts.
+
+    Returns the months, the totals per month and the same series per
+    department. Rejected payslips are left out unless status asks for them.
+    """
+    first = date(year, 1, 1)
+    months = [first + relativedelta(months=i) for i in range(12)]
+    summaries = PayrollMonthlySummary.objects.filter(pay_month__gte=first, pay_month__lt=first + relativedelta(years=1))
+    if department:
+        summaries = summaries.filter(department_id=department)
+    if category:
+        summaries = summaries.filter(category=category)
+    summaries = summaries.filter(status=status) if status else summaries.exclude(status__in=EXCLUDED_BY_DEFAULT)
+    rows = (
+        summaries.values('pay_month', 'department_id')
+        .annotate(**{field: Sum(field) for field in TOTALS})
+        .order_by()
+    )
+
+    def empty_series():
+        return {field: [0] * 12 for field in TOTALS}
+
+    overall = empty_series()
+    by_department = defaultdict(empty_series)
+    for row in rows:
+        index = row['pay_month'].month - 1
+        for field in TOTALS:
+            overall[field][index] += row[field]
+            by_department[row['department_id']][field][index] += row[field]
+    return {
+        'year': year,
+        'months': [month.strftime('%Y-%m') for month in months],
+        'totals': overall,
+        'departments': by_department,
+    }
@@ -1,58 +1,100 @@
 from celery import shared_task
+from django.db import transaction
 from django.utils import timezone
-from dateutil.relativedelta import relativedelta
-from .models import Payroll, Contract
-from decimal import Decimal
-from django.shortcuts import render, get_object_or_404, redirect
+import logging
+
+logger = logging.getLogger(__name__)
+
+PDF_RETRY_BACKOFF = 30       # seconds, doubled on every retry
+PDF_RETRY_BACKOFF_MAX = 900
 
 @shared_task
 def create_monthly_payslips():
-    from django.utils import timezone
-    from dateutil.relativedelta import relativedelta
-    from .models import Payroll, Contract
-    from decimal import Decimal
-    import logging
-
-    logger = logging.getLogger(__name__)
-    today = timezone.localdate()
-    target_month = today.replace(day=1)
-    month_end = target_month + relativedelta(months=1) - relativedelta(days=1)
+    from .runs import run_monthly_payroll
 
+    target_month = timezone.localdate().replace(day=1)
     logger.info(f"Generating payslips for {target_month:%B %Y}")
 
-    active_contracts = Contract.objects.filter(
-        start_date__lte=month_end,
-        end_date__gte=target_month,
-        status='ACTIVE'
-    ).select_related('staff')
-
-    logger.info(f"Found {active_contracts.count()} active contracts")
-
-    created = 0
-    for contract in active_contracts:
-        staff = contract.staff
-        if Payroll.objects.filter(staff=staff, pay_month=target_month).exists():
-            continue
-
-        gross = getattr(contract, 'salary', Decimal('0.00'))
-        if gross <= 0:
-            logger.warning(f"Contract {contract.id} has no salary, skipping")
-            continue
-
-        payroll = get_object_or_404(Payroll, staff=staff)
-
-        Payroll.objects.create(
-            staff=staff,
-            contract=contract,
-            pay_month=target_month,
-            gross_salary=gross,
-            bank_name=payroll.bank_name,
-            bank_branch=payroll.bank_branch,
-            kra_pin=payroll.kra_pin,
-            account_no=payroll.account_no,
-            # copy bank details, etc.
-        )
-        created += 1
-
-    logger.info(f"Created {created} payslips")
-    return f"Created {created} payslips for {target_month:%B %Y}"
\ No newline at end of file
+    report = run_monthly_payroll(target_month)
+    return str(report)
+
+
+def enqueue_payslip_pdf(payroll_id, render_key):
+    """
+    Send the render task once the current transaction has committed.
+
+    A broker outage is logged rather than raised, the payslip then stays
+    QUEUED until render_payslips picks it up.
+    """
+    transaction.on_commit(lambda: render_payslip_pdf.apply_async(
+        args=[str(payroll_id), render_key],
+        task_id=f"payslip-pdf-{render_key}",
+    ), robust=True)
+
+
+def queue_payslip_pdf(payroll, lines=None):
+    """
+    Queue a PDF render for this version of the payslip.
+
+    Does nothing if the same content is already queued, rendering or
+    rendered, so repeated saves do not pile up duplicate renders. lines are
+    the payslip's deduction lines when they are not stored yet.
+    """
+    from .models import Payroll
+
+    render_key = payroll.pdf_task_key(lines)
+    if payroll.pdf_render_key == render_key and payroll.pdf_status in ('QUEUED', 'RENDERING', 'READY'):
+        return False
+
+    Payroll.objects.filter(pk=payroll.pk).update(pdf_status='QUEUED', pdf_render_key=render_key, pdf_error='')
+    payroll.pdf_status = 'QUEUED'
+    payroll.pdf_render_key = render_key
+    payroll.pdf_error = ''
+    enqueue_payslip_pdf(payroll.pk, render_key)
+    return True
+
+
+def queue_payslip_pdfs(payslips):
+    """queue_payslip_pdf for every payslip in a queryset, e.g. those of an edited staff member"""
+    return sum(
+        queue_payslip_pdf(payroll)
+        for payroll in payslips.select_related('staff', 'contract').prefetch_related('lines')
+    )
+
+
+@shared_task(bind=True, max_retries=5, acks_late=True)
+def render_payslip_pdf(self, payroll_id, render_key):
+    from .models import Payroll
+
+    payroll = Payroll.objects.select_related('staff', 'contract').prefetch_related('lines').filter(pk=payroll_id).first()
+    if payroll is None:
+        return f"Payslip {payroll_id} no longer exists"
+    if payroll.pdf_render_key != render_key:
+        return f"Skipped superseded render {render_key}"
+
+    # Only touch the row while it still belongs to this render
+    current = Payroll.objects.filter(pk=payroll.pk, pdf_render_key=render_key)
+    current.update(pdf_status='RENDERING')
+
+    previous = payroll.pdf_file.name
+    try:
+        rendered = payroll.generate_pdf()
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            logger.error(f"Rendering payslip {payroll_id} failed: {exc}", exc_info=True)
+            current.update(pdf_status='FAILED', pdf_error=str(exc))
+            raise
+        countdown = min(PDF_RETRY_BACKOFF * 2 ** self.request.retries, PDF_RETRY_BACKOFF_MAX)
+        current.update(pdf_status='QUEUED', pdf_error=str(exc))
+        raise self.retry(exc=exc, countdown=countdown)
+
+    stored = current.update(
+        pdf_file=payroll.pdf_file.name,
+        pdf_fingerprint=payroll.pdf_fingerprint,
+        pdf_status='READY',
+        pdf_error='',
+    )
+    if not stored:
+        return f"Superseded while rendering {render_key}"  # the row may still use the old file
+    payroll.delete_replaced_pdf(previous)
+    return f"{'Rendered' if rendered else 'Reused unchanged'} payslip {payroll_id}"
@@ -1,3 +1,638 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import date
+from decimal import Decimal, ROUND_HALF_EVEN
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Department, Designation, Staff, Contract
+from .batch import calculate_batch_deductions
+from .bundles import get_bundle_payslips, stream_merged_pdf, stream_zip
+from .deductions import get_deduction_rules, invalidate_deduction_rules
+from .models import ContractDeduction, Deduction, Payroll, PayrollMonthlySummary
+from .runs import get_latest_bank_details, run_monthly_payroll
+from .summaries import rebuild_summaries
+from .rendering import render_chunk, render_payslips
+from .tasks import render_payslip_pdf
+
+
+def fake_generate_pdf(payroll, force=False):
+    payroll.pdf_file.name = f"payslips/test/{payroll.pk}.pdf"
+
+
+def blank_pdf():
+    from pypdf import PdfWriter
+
+    writer, output = PdfWriter(), io.BytesIO()
+    writer.add_blank_page(width=200, height=200)
+    writer.write(output)
+    return output.getvalue()
+
+
+class PayrollFixturesMixin:
+    def setUp(self):
+        self.department = Department.objects.create(name='Pharmacy', code='PHA')
+        self.designation = Designation.objects.create(name='Pharmacist')
+        self.staff = Staff.objects.create(
+            first_name='Jane', last_name='Wanjiru', email='jane@example.com', phone='0700000000',
+            gender='F', date_of_birth=date(1990, 1, 1), national_id='12345678', address='Nairobi',
+            department=self.department, designation=self.designation,
+            employment_date=date(2024, 1, 1), employment_category='LOCUM',
+        )
+        self.contract = Contract.objects.create(
+            staff=self.staff, contract_type='LOCUM', start_date=date(2024, 1, 1),
+            end_date=date(2099, 12, 31), salary=Decimal('50000.00'), job_title='Pharmacist',
+            department=self.department,
+        )
+
+    def make_staff(self, first_name, national_id):
+        return Staff.objects.create(
+            first_name=first_name, last_name='Test', email=f'{first_name.lower()}@example.com',
+            phone='0711111111', gender='M', date_of_birth=date(1991, 1, 1), national_id=national_id,
+            address='Nairobi', department=self.department, designation=self.designation,
+            employment_date=date(2024, 1, 1), employment_category='LOCUM',
+        )
+
+    def make_payroll(self, **kwargs):
+        fields = {
+            'staff': self.staff, 'contract': self.contract, 'pay_month': date(2025, 10, 1),
+            'gross_salary': Decimal('50000.00'), 'bank_name': 'KCB', 'bank_branch': 'Nairobi Main',
+            'bank_branch_code': '011', 'account_no': '1234567890',
+        }
+        fields.update(kwargs)
+        return Payroll.objects.create(**fields)
+
+
+@mock.patch.object(Payroll, 'generate_pdf', autospec=True, side_effect=fake_generate_pdf)
+class PayslipPdfQueueTests(PayrollFixturesMixin, TestCase):
+    def test_create_does_not_render_inline(self, generate_pdf):
+        payroll = self.make_payroll()
+        generate_pdf.assert_not_called()
+        payroll.refresh_from_db()
+        self.assertEqual(payroll.pdf_status, 'QUEUED')
+        self.assertEqual(payroll.pdf_render_key, payroll.pdf_task_key())
+
+    def test_task_renders_after_commit(self, generate_pdf):
+        with self.captureOnCommitCallbacks(execute=True):
+            payroll = self.make_payroll()
+        payroll.refresh_from_db()
+        self.assertEqual(generate_pdf.call_count, 1)
+        self.assertEqual(payroll.pdf_status, 'READY')
+        self.assertTrue(payroll.pdf_file)
+
+    def test_unchanged_save_is_not_requeued(self, generate_pdf):
+        with self.captureOnCommitCallbacks(execute=True):
+            payroll = self.make_payroll()
+        payroll.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            payroll.approve(None)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(generate_pdf.call_count, 1)
+
+    def test_printed_staff_and_contract_edits_queue_a_render(self, generate_pdf):
+        with self.captureOnCommitCallbacks(execute=True):
+            payroll = self.make_payroll()
+        staff = Staff.objects.get(pk=self.staff.pk)
+        staff.phone = '0722222222'  # not on the payslip
+        staff.save()
+        payroll.refresh_from_db()
+        self.assertEqual(payroll.pdf_status, 'READY')
+
+        for instance, field, value in [(staff, 'first_name', 'Janet'), (self.contract, 'job_title', 'Chief Pharmacist')]:
+            with self.subTest(field=field):
+                with self.captureOnCommitCallbacks(execute=True):
+                    setattr(instance, field, value)
+                    instance.save()
+                before = payroll.pdf_render_key
+                payroll.refresh_from_db()
+                self.assertNotEqual(payroll.pdf_render_key, before)
+                self.assertEqual(payroll.pdf_status, 'READY')
+        self.assertEqual(generate_pdf.call_count, 3)
+
+    def test_detail_page_polls_only_while_a_render_is_queued(self, generate_pdf):
+        payroll = self.make_payroll()
+        self.client.force_login(self.staff.user)
+        url = reverse('payroll:payroll_detail', args=[payroll.pk])
+        self.assertContains(self.client.get(url), 'id="pdf-status"')
+        Payroll.objects.filter(pk=payroll.pk).update(pdf_status='PENDING')  # never queued
+        response = self.client.get(url)
+        self.assertNotContains(response, 'id="pdf-status"')
+        self.assertContains(response, 'PDF not generated')
+
+    def test_superseded_render_is_skipped(self, generate_pdf):
+        payroll = self.make_payroll()
+        result = render_payslip_pdf.delay(str(payroll.pk), 'stale-key').get()
+        self.assertIn('superseded', result)
+        generate_pdf.assert_not_called()
+
+
+class PayslipFingerprintTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        patcher = mock.patch('payroll.rendering.get_renderer')
+        self.renderer = patcher.start().return_value
+        self.renderer.render.return_value = b'%PDF-1.7 test'
+        self.addCleanup(patcher.stop)
+
+        self.payroll = self.make_payroll()
+
+    def test_unchanged_inputs_are_not_rendered_again(self):
+        self.assertTrue(self.payroll.generate_pdf())
+        self.assertFalse(self.payroll.generate_pdf())
+        self.assertEqual(self.renderer.render.call_count, 1)
+        self.assertEqual(self.payroll.pdf_fingerprint, self.payroll.compute_pdf_fingerprint())
+
+    def store_first_render(self):
+        self.payroll.generate_pdf()
+        Payroll.objects.filter(pk=self.payroll.pk).update(
+            pdf_file=self.payroll.pdf_file.name, pdf_fingerprint=self.payroll.pdf_fingerprint, pdf_status='READY',
+        )
+        return self.payroll.pdf_file.name
+
+    def test_changed_figures_render_a_new_file(self):
+        first = self.store_first_render()
+        self.payroll.refresh_from_db()
+        self.payroll.gross_salary = Decimal('60000.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.payroll.save()  # queues and runs the render task
+        self.payroll.refresh_from_db()
+        self.assertEqual(self.payroll.pdf_status, 'READY')
+        self.assertNotEqual(self.payroll.pdf_file.name, first)
+        self.assertFalse(self.payroll.pdf_file.storage.exists(first))
+
+    def test_superseded_render_keeps_the_stored_file(self):
+        first = self.store_first_render()
+        Payroll.objects.filter(pk=self.payroll.pk).update(gross_salary=Decimal('60000.00'))
+        generate_pdf = Payroll.generate_pdf
+
+        def superseded(payroll, force=False):
+            rendered = generate_pdf(payroll, force)
+            Payroll.objects.filter(pk=payroll.pk).update(pdf_render_key='newer')  # queued meanwhile
+            return rendered
+
+        with mock.patch.object(Payroll, 'generate_pdf', autospec=True, side_effect=superseded):
+            with self.captureOnCommitCallbacks(execute=True):
+                result = render_payslip_pdf.delay(str(self.payroll.pk), self.payroll.pdf_render_key).get()
+        self.assertIn('Superseded', result)
+        self.payroll.refresh_from_db()
+        self.assertEqual(self.payroll.pdf_file.name, first)
+        self.assertTrue(self.payroll.pdf_file.storage.exists(first))
+
+    def test_identical_render_in_storage_is_reused(self):
+        self.payroll.generate_pdf()
+        name = self.payroll.pdf_file.name
+
+        self.payroll.pdf_file = None
+        self.payroll.pdf_fingerprint = ''
+        self.assertFalse(self.payroll.generate_pdf())
+        self.assertEqual(self.payroll.pdf_file.name, name)
+        self.assertEqual(self.renderer.render.call_count, 1)
+
+
+@mock.patch.object(Payroll, 'generate_pdf', autospec=True, side_effect=fake_generate_pdf)
+class PayrollLineTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()  # version tokens cached by earlier, rolled-back tests
+        self.addCleanup(invalidate_deduction_rules)  # the compiled rules outlive the test's rollback
+        self.nhif = Deduction.objects.create(name='NHIF', percentage=Decimal('2.50'), description='Health')
+        self.loan = Deduction.objects.create(
+            name='Staff Loan', percentage=Decimal('0'), description='Loan', deduction_type='LOAN'
+        )
+        ContractDeduction.objects.create(contract=self.contract, deduction=self.loan, fixed_amount=Decimal('3000.00'))
+
+    def lines(self, payroll):
+        return [(line.kind, line.name, line.basis, line.rate, line.amount) for line in payroll.lines.all()]
+
+    def test_lines_are_stored_with_the_totals(self, generate_pdf):
+        payroll = self.make_payroll()
+        self.assertEqual(self.lines(payroll), [
+            ('MANDATORY', 'NHIF', 'PERCENTAGE', Decimal('2.50'), Decimal('1250.00')),
+            ('CONTRACT', 'Staff Loan', 'FIXED', Decimal('3000.00'), Decimal('3000.00')),
+        ])
+        payroll.refresh_from_db()
+        self.assertEqual(payroll.total_deductions, Decimal('4250.00'))
+        self.assertEqual(payroll.net_salary, Decimal('45750.00'))
+
+    def test_half_cent_lines_add_up_to_the_total(self, generate_pdf):
+        ContractDeduction.objects.filter(deduction=self.loan).update(fixed_amount=None, custom_percentage=Decimal('0.50'))
+        payroll = self.make_payroll(gross_salary=Decimal('1001.00'))  # 25.025 and 5.005
+        self.assertEqual([line[4] for line in self.lines(payroll)], [Decimal('25.02'), Decimal('5.00')])
+        payroll.refresh_from_db()
+        self.assertEqual(payroll.total_deductions, Decimal('30.02'))
+        self.assertEqual(payroll.net_salary, Decimal('970.98'))
+
+    def test_approval_keeps_the_figures_it_was_computed_with(self, generate_pdf):
+        payroll = self.make_payroll()
+        self.nhif.percentage = Decimal('5.00')
+        self.nhif.save()
+
+        payroll.approve(None)
+        payroll.refresh_from_db()
+        self.assertEqual(payroll.total_deductions, Decimal('4250.00'))
+        self.assertEqual(self.lines(payroll)[0][3:], (Decimal('2.50'), Decimal('1250.00')))
+
+        payroll.gross_salary = Decimal('60000.00')
+        payroll.save()  # an edit recomputes from the current rates
+        self.assertEqual(self.lines(payroll)[0][3:], (Decimal('5.00'), Decimal('3000.00')))
+        self.assertEqual(payroll.total_deductions, Decimal('6000.00'))
+
+    def test_rules_follow_changes_made_by_other_processes(self, generate_pdf):
+        self.assertEqual([rule.percentage for rule in get_deduction_rules()], [Decimal('2.50')])
+        # As another process would write it: no signal reaches this one
+        Deduction.objects.filter(pk=self.nhif.pk).update(percentage=Decimal('5.00'), updated_at=timezone.now())
+        self.assertEqual([rule.percentage for rule in get_deduction_rules()], [Decimal('2.50')])
+        cache.clear()  # the version token expires
+        self.assertEqual([rule.percentage for rule in get_deduction_rules()], [Decimal('5.00')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nhif.percentage = Decimal('3.00')
+            self.nhif.save()
+        self.assertEqual([rule.percentage for rule in get_deduction_rules()], [Decimal('3.00')])
+
+    def test_saving_a_payslip_does_not_read_the_rules(self, generate_pdf):
+        payroll = self.make_payroll()
+        payroll.gross_salary = Decimal('60000.00')
+        # overrides, savepoint, update, render queued, summary (staff, contract, bucket), lines
+        # deleted and inserted, release; the rules come from the compiled snapshot
+        with self.assertNumQueries(10) as queries:
+            payroll.save()
+        self.assertFalse([q['sql'] for q in queries.captured_queries if 'FROM "payroll_deduction"' in q['sql']])
+        self.assertEqual(payroll.total_deductions, Decimal('4500.00'))
+
+    def test_monthly_run_writes_lines(self, generate_pdf):
+        self.make_payroll()  # bank details for the run
+        report = run_monthly_payroll(date(2025, 11, 1))
+        payroll = Payroll.objects.get(pk=report.created[0])
+        self.assertEqual(self.lines(payroll), self.lines(Payroll.objects.get(pay_month=date(2025, 10, 1))))
+        self.assertEqual(payroll.total_deductions, Decimal('4250.00'))
+
+    def test_detail_view_reads_the_stored_lines(self, generate_pdf):
+        with self.captureOnCommitCallbacks(execute=True):  # the page links the rendered PDF
+            payroll = self.make_payroll()
+        self.client.force_login(self.staff.user)
+        with self.assertNumQueries(5):  # session, user, sidebar staff, payroll with staff and contract, lines
+            response = self.client.get(reverse('payroll:payroll_detail', args=[payroll.pk]))
+        self.assertContains(response, 'Staff Loan')
+        self.assertContains(response, '(KSh 3000.00)')
+
+    def test_payslip_pages_are_for_the_owner_and_admins(self, generate_pdf):
+        with self.captureOnCommitCallbacks(execute=True):
+            payroll = self.make_payroll()
+        urls = [reverse('payroll:payroll_detail', args=[payroll.pk]),
+                reverse('payroll:payroll_pdf_status', args=[payroll.pk])]
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 302)  # to the login page
+
+        self.client.force_login(User.objects.create_user('viewer'))
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.staff.user)
+        status = self.client.get(urls[1]).json()
+        payroll.refresh_from_db()
+        self.assertEqual((status['status'], status['url']), ('READY', payroll.pdf_file.url))
+
+
+@mock.patch.object(Payroll, 'generate_pdf', autospec=True, side_effect=fake_generate_pdf)
+class PayrollSummaryTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.colleague = self.make_staff('John', '23456789')
+
+    def summaries(self):
+        return {
+            (s.pay_month, s.department_id, s.category, s.status): (s.headcount, s.gross_salary, s.net_salary)
+            for s in PayrollMonthlySummary.objects.all() if s.headcount
+        }
+
+    def test_saves_move_payslips_between_buckets(self, generate_pdf):
+        october = date(2025, 10, 1)
+        payroll = self.make_payroll()
+        self.make_payroll(staff=self.colleague, gross_salary=Decimal('20000.00'))
+        self.assertEqual(self.summaries(), {
+            (october, self.department.pk, 'LOCUM', 'PENDING'): (2, Decimal('70000.00'), Decimal('70000.00')),
+        })
+
+        payroll.approve(None)
+        payroll.gross_salary = Decimal('60000.00')
+        payroll.save()
+        self.assertEqual(self.summaries(), {
+            (october, self.department.pk, 'LOCUM', 'PENDING'): (1, Decimal('20000.00'), Decimal('20000.00')),
+            (october, self.department.pk, 'LOCUM', 'APPROVED'): (1, Decimal('60000.00'), Decimal('60000.00')),
+        })
+
+        pharmacy_annex = Department.objects.create(name='Pharmacy Annex', code='PHX')
+        self.colleague.department = pharmacy_annex
+        self.colleague.save()
+        self.contract.department = pharmacy_annex  # buckets follow the staff department, not the contract's
+        self.contract.contract_type = 'CASUAL'
+        self.contract.save()
+        self.assertEqual(self.summaries(), {
+            (october, self.department.pk, 'CASUAL', 'APPROVED'): (1, Decimal('60000.00'), Decimal('60000.00')),
+            (october, pharmacy_annex.pk, 'CASUAL', 'PENDING'): (1, Decimal('20000.00'), Decimal('20000.00')),
+        })
+        payroll.delete()
+        self.assertEqual(self.summaries(), {
+            (october, pharmacy_annex.pk, 'CASUAL', 'PENDING'): (1, Decimal('20000.00'), Decimal('20000.00')),
+        })
+
+    def test_rebuild_matches_incremental_totals(self, generate_pdf):
+        self.make_payroll(staff=self.colleague, pay_month=date(2025, 9, 1)).reject(None)
+        self.make_payroll()
+        run_monthly_payroll(date(2025, 11, 1))
+        incremental = self.summaries()
+        self.assertEqual(len(incremental), 3)
+
+        PayrollMonthlySummary.objects.update(headcount=0, gross_salary=0)
+        chunks = list(rebuild_summaries(chunk_months=2))
+        self.assertEqual([len(months) for months, _ in chunks], [2, 1])
+        self.assertEqual(self.summaries(), incremental)
+
+    def test_endpoint_serves_the_year(self, generate_pdf):
+        self.make_payroll(pay_month=date(2025, 9, 1)).reject(None)
+        self.make_payroll()
+        url = reverse('payroll:payroll_summary')
+        self.client.force_login(self.staff.user)
+        self.assertEqual(self.client.get(url).status_code, 302)  # admins only
+
+        self.staff.is_admin = True
+        self.staff.save()  # joins the Admin group
+        data = self.client.get(url, {'year': 2025}).json()
+        self.assertEqual(data['months'][0], '2025-01')
+        self.assertEqual(data['totals']['headcount'][8:10], [0, 1])  # the rejected payslip is left out
+        self.assertEqual(data['departments'][0]['name'], 'Pharmacy')
+        self.assertEqual(self.client.get(url, {'year': 'last'}).status_code, 400)
+
+
+class PayslipBundleTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        patcher = mock.patch('payroll.rendering.get_renderer')
+        patcher.start().return_value.render.return_value = blank_pdf()
+        self.addCleanup(patcher.stop)
+
+        self.colleague = self.make_staff('John', '23456789')
+        with self.captureOnCommitCallbacks(execute=True):  # renders through the eager task
+            self.make_payroll()
+            self.make_payroll(staff=self.colleague)
+        self.staff.is_admin = True
+        self.staff.save()
+        self.client.force_login(self.staff.user)
+
+    def payslips(self):
+        return get_bundle_payslips(date(2025, 10, 1))
+
+    def download(self, **params):
+        response = self.client.get(reverse('payroll:payroll_bundle'), {'month': '2025-10', **params})
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_zip_holds_one_file_per_payslip(self):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(stream_zip(self.payslips(), chunk_size=64))))
+        self.assertEqual(archive.namelist(), [
+            f"payslip_{payroll.staff.unique_id}_2025_10.pdf" for payroll in self.payslips()
+        ])
+        self.assertEqual(archive.read(archive.namelist()[0]), blank_pdf())
+
+    def test_merged_pdf_has_every_page(self):
+        from pypdf import PdfReader
+
+        merged = PdfReader(io.BytesIO(b''.join(stream_merged_pdf(self.payslips()))))
+        self.assertEqual(len(merged.pages), 2)
+
+    def test_view_streams_both_formats(self):
+        response, body = self.download()
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(len(zipfile.ZipFile(io.BytesIO(body)).namelist()), 2)
+        response, body = self.download(format='pdf')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="payslips_2025_10.pdf"')
+        self.assertTrue(body.startswith(b'%PDF'))
+
+    def test_view_errors(self):
+        self.assertEqual(self.download(month='10/2025')[0].status_code, 400)
+        self.assertEqual(self.download(format='tar')[0].status_code, 400)
+        self.assertEqual(self.download(month='2025-09')[0].status_code, 404)
+        with mock.patch('payroll.views.MAX_MERGED_PAYSLIPS', 1):
+            self.assertEqual(self.download(format='pdf')[0].status_code, 400)
+        self.client.force_login(self.colleague.user)
+        self.assertEqual(self.download()[0].status_code, 302)
+
+    def test_unrendered_payslips_are_queued_not_rendered_inline(self):
+        payroll = self.payslips().first()
+        payroll.gross_salary = Decimal('60000.00')
+        payroll.save()  # queued again, the render waits for the commit
+        with mock.patch('payroll.bundles.render_payslips') as render_payslips:
+            response, _ = self.download()
+        render_payslips.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+
+class BatchDeductionParityTests(SimpleTestCase):
+    """calculate_batch_deductions against Deduction/ContractDeduction.calculate_amount"""
+
+    CENT = Decimal('0.01')
+    RULES = [
+        Deduction(name='NHIF', percentage=Decimal('2.50'), min_salary_threshold=Decimal('10000.00'),
+                  max_amount=Decimal('1700.00')),
+        Deduction(name='NSSF', percentage=Decimal('6.00'), min_salary_threshold=Decimal('0'),
+                  max_amount=Decimal('0')),  # 0 means no cap
+        Deduction(name='Levy', percentage=Decimal('0.35'), min_salary_threshold=Decimal('0'), max_amount=None),
+    ]
+    OVERRIDES = [
+        (1, 'Pension', Decimal('1.25'), None),
+        (2, 'Staff Loan', None, Decimal('3000.00')),
+        (3, 'Pension', Decimal('5.00'), Decimal('999.00')),  # the percentage wins
+    ]
+    GROSS = ['0.01', '1.43', '9999.99', '10000.00', '50000.00', '68000.00', '68000.01', '123456.78']
+
+    def quantize(self, value):
+        return value.quantize(self.CENT, rounding=ROUND_HALF_EVEN)
+
+    def expected(self, gross, contract_id):
+        """Figures the Decimal path stores: each line quantized, then summed"""
+        total = sum((self.quantize(rule.calculate_amount(gross)) for rule in self.RULES), Decimal('0'))
+        for override_contract, name, custom_percentage, fixed_amount in self.OVERRIDES:
+            if override_contract == contract_id:
+                total += self.quantize(ContractDeduction(
+                    custom_percentage=custom_percentage, fixed_amount=fixed_amount,
+                ).calculate_amount(gross))
+        return total, gross - total
+
+    def test_totals_match_the_decimal_path(self):
+        gross = [Decimal(value) for value in self.GROSS for _ in range(4)]
+        contract_ids = [1, 2, 3, 4] * len(self.GROSS)
+        result = calculate_batch_deductions(gross, contract_ids, rules=self.RULES, overrides=self.OVERRIDES)
+        for i, (salary, contract_id) in enumerate(zip(gross, contract_ids)):
+            with self.subTest(gross=salary, contract=contract_id):
+                row = result.row(i)
+                self.assertEqual(
+                    (row['total_deductions'], row['net_salary']), self.expected(salary, contract_id)
+                )
+
+    def test_per_rule_lines(self):
+        gross = [Decimal('9999.99'), Decimal('10000.00'), Decimal('80000.00')]
+        result = calculate_batch_deductions(gross, [1, 2, 4], rules=self.RULES, overrides=self.OVERRIDES)
+        self.assertEqual(list(result.mandatory['NHIF']), [0, 25000, 170000])  # threshold, rate, cap
+        self.assertEqual(list(result.mandatory['NSSF']), [60000, 60000, 480000])  # 599.9994 rounds up
+        self.assertEqual(list(result.overrides['Pension']), [12500, 0, 0])
+        self.assertEqual(list(result.overrides['Staff Loan']), [0, 300000, 0])
+
+    def test_half_cent_amounts_round_to_even(self):
+        rule = Deduction(name='Half', percentage=Decimal('0.50'), min_salary_threshold=Decimal('0'), max_amount=None)
+        gross = [Decimal('1.00'), Decimal('3.00'), Decimal('5.00'), Decimal('7.00')]  # 0.005, 0.015, 0.025, 0.035
+        result = calculate_batch_deductions(gross, rules=[rule])
+        self.assertEqual(
+            [result.row(i)['total_deductions'] for i in range(len(gross))],
+            [Decimal('0.00'), Decimal('0.02'), Decimal('0.02'), Decimal('0.04')],
+        )
+        self.assertEqual(
+            [result.row(i)['total_deductions'] for i in range(len(gross))],
+            [self.quantize(rule.calculate_amount(g)) for g in gross],
+        )
+        self.assertEqual(
+            [result.row(i)['net_salary'] for i in range(len(gross))],
+            [g - self.quantize(rule.calculate_amount(g)) for g in gross],
+        )
+
+
+@mock.patch.object(Payroll, 'generate_pdf', autospec=True, side_effect=fake_generate_pdf)
+class MonthlyPayrollRunTests(PayrollFixturesMixin, TestCase):
+    def make_staff_with_contract(self, first_name, national_id, salary):
+        staff = self.make_staff(first_name, national_id)
+        contract = Contract.objects.create(
+            staff=staff, contract_type='LOCUM', start_date=date(2024, 1, 1), end_date=date(2099, 12, 31),
+            salary=salary, job_title='Clerk', department=self.department,
+        )
+        return staff, contract
+
+    def test_report(self, generate_pdf):
+        self.make_payroll(pay_month=date(2025, 9, 1), bank_name='Equity')
+        self.make_payroll()  # October, KCB: the latest bank details
+        older = Contract.objects.create(
+            staff=self.staff, contract_type='LOCUM', start_date=date(2023, 1, 1), end_date=date(2099, 12, 31),
+            salary=Decimal('40000.00'), job_title='Pharmacist', department=self.department,
+        )
+        _, unpaid = self.make_staff_with_contract('Unpaid', '23456789', Decimal('0'))
+        _, unbanked = self.make_staff_with_contract('Unbanked', '34567890', Decimal('30000.00'))
+
+        with self.assertLogs('payroll.runs', 'WARNING'):
+            report = run_monthly_payroll(date(2025, 11, 1))
+        payslip = Payroll.objects.get(pk=report.created[0])
+        self.assertEqual((len(report.created), payslip.contract, payslip.bank_name), (1, self.contract, 'KCB'))
+        self.assertCountEqual(report.skipped, [
+            (older.pk, 'staff member has a newer active contract'),
+            (unpaid.pk, 'contract has no salary'),
+        ])
+        self.assertEqual(report.failed, [(unbanked.pk, 'no bank details on file')])
+
+        with self.assertLogs('payroll.runs', 'WARNING'):
+            again = run_monthly_payroll(date(2025, 11, 1))
+        self.assertEqual(again.created, [])
+        self.assertIn((self.contract.pk, 'payslip already exists'), again.skipped)
+
+    def test_latest_bank_details_in_one_query(self, generate_pdf):
+        self.make_payroll(pay_month=date(2025, 9, 1), bank_name='Equity')
+        self.make_payroll(bank_name='KCB')
+        colleague, _ = self.make_staff_with_contract('Colleague', '23456789', Decimal('30000.00'))
+        with self.assertNumQueries(1):
+            details = get_latest_bank_details([self.staff.pk, colleague.pk])
+        self.assertEqual(details, {self.staff.pk: {
+            'bank_name': 'KCB', 'bank_branch': 'Nairobi Main', 'bank_branch_code': '011', 'account_no': '1234567890',
+        }})
+
+
+class InlineExecutor:
+    """Stands in for the ProcessPoolExecutor: runs each chunk in this process as it is submitted"""
+
+    def __init__(self, max_workers, initializer=None):
+        self.max_workers = max_workers
+        self.chunks = []
+        InlineExecutor.last = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, chunk, *args):
+        self.chunks.append(chunk)
+        future = Future()
+        future.set_result(fn(chunk, *args))
+        return future
+
+
+@mock.patch('django.db.connections.close_all')  # would end the test's transaction
+@mock.patch('payroll.rendering.ProcessPoolExecutor', InlineExecutor)
+class PayslipRenderingTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.payslips = [self.make_payroll()] + [
+            self.make_payroll(staff=self.make_staff(name, national_id))
+            for name, national_id in (('John', '23456789'), ('Mary', '34567890'))
+        ]
+        self.broken = self.payslips[1]
+
+    def fake_render(self, payroll, force=False):
+        if payroll.pk == self.broken.pk:
+            raise RuntimeError('font missing')
+        if payroll.pdf_file and not force:
+            return False
+        payroll.pdf_file.name = f"payslips/test/{payroll.pk}.pdf"
+        return True
+
+    def test_render_chunk_marks_ready_and_failed(self, close_all):
+        with mock.patch.object(Payroll, 'generate_pdf', autospec=True, side_effect=self.fake_render):
+            result = render_chunk([p.pk for p in self.payslips])
+            self.assertEqual((result['rendered'], result['unchanged']), (2, 0))
+            self.assertEqual(result['failures'], [(str(self.broken.pk), 'font missing')])
+
+            statuses = {p.pk: (p.pdf_status, p.pdf_error, bool(p.pdf_file)) for p in Payroll.objects.all()}
+            self.assertEqual(statuses[self.broken.pk], ('FAILED', 'font missing', False))
+            self.assertEqual(statuses[self.payslips[0].pk], ('READY', '', True))
+            ready = Payroll.objects.get(pk=self.payslips[0].pk)
+            self.assertEqual(ready.pdf_render_key, ready.pdf_task_key())
+
+            again = render_chunk([self.payslips[0].pk])
+            self.assertEqual((again['rendered'], again['unchanged']), (0, 1))
+
+    def test_render_payslips_chunks_and_counts(self, close_all):
+        with mock.patch.object(Payroll, 'generate_pdf', autospec=True, side_effect=self.fake_render):
+            stats = render_payslips([p.pk for p in self.payslips], workers=8, chunk_size=2)
+        self.assertEqual([len(chunk) for chunk in InlineExecutor.last.chunks], [2, 1])
+        self.assertEqual(InlineExecutor.last.max_workers, 2)  # never more workers than chunks
+        self.assertEqual((stats.rendered, stats.unchanged, stats.failed), (2, 0, 1))
+        self.assertIn('Rendered 2 payslips (0 unchanged, 1 failed)', str(stats))
+        self.assertEqual(render_payslips([]).rendered, 0)
+
+    def test_command_reports_failures(self, close_all):
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch.object(Payroll, 'generate_pdf', autospec=True, side_effect=self.fake_render):
+            call_command('render_payslips', '2025-10', '--chunk-size', '1', stdout=out, stderr=err)
+        self.assertIn('Rendering 3 payslips for October 2025', out.getvalue())
+        self.assertIn('Rendered 2 payslips', out.getvalue())
+        self.assertIn(f"{self.broken.pk}: font missing", err.getvalue())
+        self.assertEqual(len(InlineExecutor.last.chunks), 3)
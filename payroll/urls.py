@@ -6,8 +6,11 @@ app_name = 'payroll'
 
 urlpatterns = [
     path('payslip/<uuid:pk>/', views.payroll_detail_view, name='payroll_detail'),
+    path('payslip/<uuid:pk>/pdf/status/', views.payroll_pdf_status_view, name='payroll_pdf_status'),
     path('staff/<str:unique_id>/create/', views.payroll_create_view, name='payroll_create'),
     path('payslip/update/<uuid:pk>/', views.payroll_update_view, name='payroll_update'),
     path('payrolls/', views.payrolldash, name='payroll_dash'),
+    path('payslips/bundle/', views.payroll_bundle_view, name='payroll_bundle'),
+    path('payrolls/summary/', views.payroll_summary_view, name='payroll_summary'),
     path('payslip/<uuid:pk>/<str:action>/', views.payroll_process_view, name='payroll_process'),
 ]
\ No newline at end of file
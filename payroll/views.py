@@ -1,11 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect, HttpResponse
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.http import Http404
-from core.models import Department
-from .models import Payroll, Staff, ContractDeduction, Deduction
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.utils import timezone
+from core.views import is_admin
+from core.stats import payroll_stats
+from core.caching import department_list, departments_with_counts
+from core.pagination import keyset_paginate, PAYROLL_ORDERING
+from core.querybudget import query_budget
+from core.search import search_filter
+from .models import Payroll, Staff
 from .forms import PayrollForm, ContractDeductionFormSet
-from django.db.models import Q, Count
+from datetime import datetime
+from .bundles import (
+    get_bundle_payslips, queue_missing_renders, is_rendered, stream_zip, stream_merged_pdf, MAX_MERGED_PAYSLIPS,
+)
+from .summaries import monthly_totals
 import uuid
 
 def payroll_create_view(request, unique_id):
@@ -106,38 +118,108 @@ def payroll_process_view(request, pk: uuid.UUID, action):
 
 
 
-def payroll_detail_view(request, pk: uuid.UUID):
-    payroll = get_object_or_404(Payroll, id=pk)
+def can_view_payslip(user, payroll):
+    """Admins see every payslip, staff only their own"""
+    return payroll.staff.user_id == user.pk or is_admin(user)
 
-    salary = payroll.gross_salary
-
-    # Mandatory deductions
-    mandatory = []
-    for d in Deduction.objects.filter(deduction_type='MANDATORY', is_active=True):
-        amt = d.calculate_amount(salary)
-        if amt > 0:
-            mandatory.append({'name': d.name, 'amount': amt})
-
-    # Optional (contract) deductions
-    optional = []
-    for cd in ContractDeduction.objects.filter(contract=payroll.contract, is_active=True):
-        amt = cd.calculate_amount(salary)
-        if amt > 0:
-            optional.append({
-                'deduction': cd.deduction,
-                'custom_percentage': cd.custom_percentage,
-                'fixed_amount': cd.fixed_amount,
-                'amount': amt
-            })
+@login_required
+def payroll_detail_view(request, pk: uuid.UUID):
+    payroll = get_object_or_404(
+        Payroll.objects.select_related('staff', 'contract').prefetch_related('lines'), id=pk
+    )
+    if not can_view_payslip(request.user, payroll):
+        raise PermissionDenied
 
     context = {
         'payroll': payroll,
-        'mandatory_deductions': mandatory,
-        'contract_deductions': optional,
+        'deduction_lines': payroll.deduction_lines(),
         'staff': payroll.staff,
     }
     return render(request, 'payroll_detail.html', context)
 
+@login_required
+def payroll_pdf_status_view(request, pk: uuid.UUID):
+    """Polled by the payslip page while the PDF is being rendered"""
+    payroll = get_object_or_404(
+        Payroll.objects.select_related('staff').only('id', 'pdf_file', 'pdf_status', 'pdf_error', 'staff__user_id'),
+        id=pk,
+    )
+    if not can_view_payslip(request.user, payroll):
+        raise PermissionDenied
+    return JsonResponse({
+        'id': str(payroll.id),
+        'status': payroll.pdf_status,
+        'url': payroll.pdf_file.url if payroll.pdf_file and payroll.pdf_status == 'READY' else None,
+        'error': payroll.pdf_error,
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def payroll_bundle_view(request):
+    """Stream every payslip for a month as one ZIP or one merged PDF"""
+    month = request.GET.get('month', '')
+    department_id = request.GET.get('department', '')
+    status = request.GET.get('status', '')
+    bundle_format = request.GET.get('format', 'zip')
+
+    try:
+        pay_month = datetime.strptime(month, '%Y-%m').date() if month else timezone.localdate().replace(day=1)
+    except ValueError:
+        return HttpResponse("Month must be in YYYY-MM format", status=400)
+    if bundle_format not in ('zip', 'pdf'):
+        return HttpResponse("Format must be zip or pdf", status=400)
+
+    payslips = get_bundle_payslips(pay_month, department_id, status)
+    if not payslips:
+        raise Http404("No payslips found for this month.")
+    if bundle_format == 'pdf' and len(payslips) > MAX_MERGED_PAYSLIPS:
+        return HttpResponse(
+            f"More than {MAX_MERGED_PAYSLIPS} payslips, download them as a ZIP or use export_payslips",
+            status=400,
+        )
+    if queue_missing_renders(payslips):
+        # Eager or quick workers may already be done
+        payslips = payslips.all()
+        pending = sum(1 for payroll in payslips if not is_rendered(payroll))
+        if pending:
+            response = HttpResponse(f"{pending} payslips are still being rendered, try again shortly", status=503)
+            response['Retry-After'] = '30'
+            return response
+
+    if bundle_format == 'pdf':
+        response = StreamingHttpResponse(stream_merged_pdf(payslips), content_type='application/pdf')
+    else:
+        response = StreamingHttpResponse(stream_zip(payslips), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="payslips_{pay_month:%Y_%m}.{bundle_format}"'
+    return response
+
+@query_budget(10)
+@login_required
+@user_passes_test(is_admin)
+def payroll_summary_view(request):
+    """Monthly payroll cost for the dashboard charts, read from the summary table"""
+    year = request.GET.get('year', '')
+    try:
+        year = int(year) if year else timezone.localdate().year
+    except ValueError:
+        return HttpResponse("Year must be a number", status=400)
+
+    summary = monthly_totals(
+        year,
+        department=request.GET.get('department') or None,
+        category=request.GET.get('category') or None,
+        status=request.GET.get('status') or None,
+    )
+    names = {department.pk: department.name for department in department_list()}
+    summary['departments'] = [
+        {'id': department_id, 'name': names.get(department_id, 'No department'), **series}
+        for department_id, series in sorted(
+            summary['departments'].items(), key=lambda item: names.get(item[0], '')
+        )
+    ]
+    return JsonResponse(summary)
+
+@query_budget(10)
 def payrolldash(request):
     # Get query parameters
     search_query = request.GET.get('search', '')
@@ -145,23 +227,11 @@ def payrolldash(request):
     status = request.GET.get('status', '')
 
     # Base queryset
-    payroll = Payroll.objects.all()
-    total = payroll.count()
-    staff = Staff.objects.all()
-    pending = payroll.filter(status="PENDING")
-    approved = payroll.filter(status="APPROVED")
-    rejected = payroll.filter(status="REJECTED")
+    payroll = Payroll.objects.select_related('staff__designation', 'contract')
     
-    # Apply search filter (Name, ID, Email, KRA PIN)
+    # Apply search filter (Name, ID, Email)
     if search_query:
-        staff = staff.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(middle_name__icontains=search_query) |
-            Q(unique_id__icontains=search_query) |
-            Q(email__icontains=search_query)
-        )
-        payroll = payroll.filter(staff__in=staff)
+        payroll = payroll.filter(search_filter(search_query, 'staff_id'))
 
     # Apply department filter
     if department_id:
@@ -172,18 +242,14 @@ def payrolldash(request):
         payroll = payroll.filter(status=status)
 
     # Get departments with staff count for filter dropdown
-    departments = Department.objects.annotate(staff_count=Count('staff_members'))
+    departments = departments_with_counts()
 
     context = {
-        'staff_list': staff,
-        'total': total,
+        'stats': payroll_stats(),
         'departments': departments,
         'search_query': search_query,
         'current_dept': department_id,
         'current_status': status,
-        'payroll': payroll,
-        'pending': pending,
-        'approved': approved,
-        'rejected': rejected,
+        'payroll': keyset_paginate(request, payroll, PAYROLL_ORDERING),
     }
     return render(request, 'payrolls.html', context)
\ No newline at end of file
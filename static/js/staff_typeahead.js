@@ -0,0 +1,64 @@
+// Typeahead suggestions for the dashboard #searchInput, served by core:staff_search_api.
+// Suggestions link straight to the staff page; pressing Enter still submits the filter form.
+(function () {
+    const script = document.currentScript;
+    const searchUrl = script.dataset.searchUrl;
+    const detailUrl = script.dataset.detailUrl;  // contains the UNIQUE_ID placeholder
+
+    document.addEventListener('DOMContentLoaded', function () {
+        const input = document.getElementById('searchInput');
+        if (!input || !searchUrl) {
+            return;
+        }
+
+        const menu = document.createElement('ul');
+        menu.className = 'dropdown-menu w-100';
+        input.parentNode.style.position = 'relative';
+        input.parentNode.appendChild(menu);
+        input.setAttribute('autocomplete', 'off');
+
+        let timer;
+        let controller;
+
+        function hide() {
+            menu.classList.remove('show');
+        }
+
+        function show(results) {
+            menu.innerHTML = '';
+            results.forEach(function (staff) {
+                const item = document.createElement('li');
+                const link = document.createElement('a');
+                link.className = 'dropdown-item border-radius-md';
+                link.href = detailUrl.replace('UNIQUE_ID', encodeURIComponent(staff.unique_id));
+                link.textContent = `${staff.full_name} (${staff.unique_id})` + (staff.department ? ` - ${staff.department}` : '');
+                item.appendChild(link);
+                menu.appendChild(item);
+            });
+            menu.classList.toggle('show', results.length > 0);
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (!query) {
+                hide();
+                return;
+            }
+            timer = setTimeout(function () {
+                if (controller) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+                fetch(`${searchUrl}?q=${encodeURIComponent(query)}`, {signal: controller.signal})
+                    .then(response => response.ok ? response.json() : {results: []})
+                    .then(data => show(data.results))
+                    .catch(() => {});
+            }, 150);
+        });
+
+        input.addEventListener('blur', function () {
+            setTimeout(hide, 200);  // let a click on a suggestion land first
+        });
+    });
+})();